@@ -0,0 +1,36 @@
+"""
+Application read caches (see app/utils/cache.py).
+
+Every cache here must be invalidated on the write paths that change what it holds:
+
+- principal_cache (email -> user row): admin deactivate/delete
+- cook_profile_cache (cook_id -> profile row): cook profile update/delete, user delete
+- menu_item_cache (item_id -> menu item row): menu item update/delete, cook profile delete, user delete,
+  sold-out changes (published by the capacity SQL functions), capacity.rollover
+- admin_stats_cache ("platform" -> stats): not invalidated, short TTL only
+- admin_count_cache (admin list query and arguments -> exact total): not invalidated, short TTL only
+- prep_sheet_cache ("cook_id:YYYY-MM-DD" -> prep sheet): order placement, order update/status
+  changes, admin order delete
+"""
+
+from datetime import datetime, timezone
+
+from app.config import settings
+from app.utils.cache import Cache
+from app.utils.shared_store import get_shared_store
+
+shared_tier = get_shared_store() if settings.cache_backend == "shared" else None
+
+principal_cache = Cache("principal", shared=shared_tier)
+cook_profile_cache = Cache("cook_profile", shared=shared_tier)
+menu_item_cache = Cache("menu_item", shared=shared_tier)
+admin_stats_cache = Cache("admin_stats", ttl=30, max_entries=1, shared=shared_tier, shared_ttl=30)
+admin_count_cache = Cache(
+    "admin_count", ttl=settings.admin_count_cache_ttl, max_entries=1000,
+    shared=shared_tier, shared_ttl=settings.admin_count_cache_ttl
+)
+prep_sheet_cache = Cache("prep_sheet", shared=shared_tier)
+
+def prep_sheet_key(cook_id: int, created_at: datetime) -> str:
+    """Key of the prep sheet an order counts towards: its cook and the UTC day it was placed"""
+    return f"{cook_id}:{created_at.astimezone(timezone.utc).date().isoformat()}"
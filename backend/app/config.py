@@ -11,6 +11,8 @@ load_dotenv(dotenv_path=env_path)
 class Settings(BaseSettings):
     # Database configuration - supports both individual fields and full URL
     database_url: str = os.getenv("DATABASE_URL", "")
+    database_listen_url: str = os.getenv("DATABASE_LISTEN_URL", "")  # session-mode/direct URL for LISTEN/NOTIFY
+    migrations_database_url: str = os.getenv("MIGRATIONS_DATABASE_URL", "")  # session-mode/direct URL for migrate.py
     db_pass: str = os.getenv("DB_PASS", "")
     supabase_url: str = os.getenv("REACT_APP_SUPABASE_URL", "")
     supabase_anon_key: str = os.getenv("REACT_APP_SUPABASE_ANON_KEY", "")
@@ -20,6 +22,122 @@ class Settings(BaseSettings):
     jwt_algorithm: str = os.getenv("JWT_ALGORITHM", "HS256")
     jwt_access_token_expire_minutes: int = int(os.getenv("JWT_ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
     
+    # Database connection pool (one pool per worker process)
+    db_pool_min_size: int = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+    db_pool_max_size: int = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+    db_pool_close_timeout: float = float(os.getenv("DB_POOL_CLOSE_TIMEOUT", "10"))
+    db_pool_acquire_timeout: float = float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT", "10"))  # then 503
+    
+    # Per-query timeout per route class in ms, enforced by asyncpg; 0 = none (see app/utils/timeouts.py)
+    statement_timeout_auth_ms: int = int(os.getenv("STATEMENT_TIMEOUT_AUTH_MS", "2000"))
+    statement_timeout_public_read_ms: int = int(os.getenv("STATEMENT_TIMEOUT_PUBLIC_READ_MS", "2000"))
+    statement_timeout_order_write_ms: int = int(os.getenv("STATEMENT_TIMEOUT_ORDER_WRITE_MS", "5000"))
+    statement_timeout_admin_ms: int = int(os.getenv("STATEMENT_TIMEOUT_ADMIN_MS", "15000"))
+    statement_timeout_read_ms: int = int(os.getenv("STATEMENT_TIMEOUT_READ_MS", "5000"))
+    statement_timeout_write_ms: int = int(os.getenv("STATEMENT_TIMEOUT_WRITE_MS", "5000"))
+    
+    # Production server configuration (used by start.py --production)
+    server_host: str = os.getenv("HOST", "0.0.0.0")
+    server_port: int = int(os.getenv("PORT", "8000"))
+    server_workers: int = int(os.getenv("WEB_CONCURRENCY", "0"))  # 0 = one worker per available CPU
+    server_loop: str = os.getenv("SERVER_LOOP", "uvloop")
+    server_http: str = os.getenv("SERVER_HTTP", "httptools")
+    server_keepalive_timeout: int = int(os.getenv("SERVER_KEEPALIVE_TIMEOUT", "5"))
+    server_backlog: int = int(os.getenv("SERVER_BACKLOG", "2048"))
+    server_graceful_timeout: int = int(os.getenv("SERVER_GRACEFUL_TIMEOUT", "30"))
+    server_worker_timeout: int = int(os.getenv("SERVER_WORKER_TIMEOUT", "60"))
+    server_max_requests: int = int(os.getenv("SERVER_MAX_REQUESTS", "0"))  # 0 = never recycle workers
+    server_max_requests_jitter: int = int(os.getenv("SERVER_MAX_REQUESTS_JITTER", "0"))
+    server_preload_app: bool = os.getenv("SERVER_PRELOAD_APP", "true").lower() == "true"
+    
+    # Admission control per route class (see app/utils/admission.py)
+    admission_enabled: bool = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+    admission_auth_concurrency: int = int(os.getenv("ADMISSION_AUTH_CONCURRENCY", "4"))  # bcrypt runs on the event loop
+    admission_public_read_concurrency: int = int(os.getenv("ADMISSION_PUBLIC_READ_CONCURRENCY", "32"))
+    admission_order_write_concurrency: int = int(os.getenv("ADMISSION_ORDER_WRITE_CONCURRENCY", "16"))
+    admission_admin_concurrency: int = int(os.getenv("ADMISSION_ADMIN_CONCURRENCY", "4"))
+    admission_read_concurrency: int = int(os.getenv("ADMISSION_READ_CONCURRENCY", "32"))
+    admission_write_concurrency: int = int(os.getenv("ADMISSION_WRITE_CONCURRENCY", "16"))
+    admission_queue_size: int = int(os.getenv("ADMISSION_QUEUE_SIZE", "64"))  # waiting requests per class
+    admission_queue_timeout: float = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "2"))  # seconds, then 503
+    admission_max_loop_lag_ms: float = float(os.getenv("ADMISSION_MAX_LOOP_LAG_MS", "100"))  # 0 = ignore
+    admission_max_pool_wait_ms: float = float(os.getenv("ADMISSION_MAX_POOL_WAIT_MS", "250"))  # 0 = ignore
+    
+    # Shared state across workers: "" (none), "local://" (in-process stand-in) or "redis://host:6379/0"
+    shared_store_url: str = os.getenv("SHARED_STORE_URL", "")
+    trust_proxy_headers: bool = os.getenv("TRUST_PROXY_HEADERS", "false").lower() == "true"
+    trusted_proxy_hops: int = int(os.getenv("TRUSTED_PROXY_HOPS", "1"))  # proxies appending to X-Forwarded-For
+    
+    # Rate limiting (token buckets; see app/utils/rate_limit.py)
+    rate_limit_enabled: bool = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    rate_limit_backend: str = os.getenv("RATE_LIMIT_BACKEND", "memory")  # "memory" or "shared"
+    rate_limit_max_keys: int = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+    rate_limit_burst_ratio: float = float(os.getenv("RATE_LIMIT_BURST_RATIO", "0.5"))
+    rate_limit_auth_per_minute: int = int(os.getenv("RATE_LIMIT_AUTH_PER_MINUTE", "10"))
+    rate_limit_public_read_per_minute: int = int(os.getenv("RATE_LIMIT_PUBLIC_READ_PER_MINUTE", "600"))
+    rate_limit_order_write_per_minute: int = int(os.getenv("RATE_LIMIT_ORDER_WRITE_PER_MINUTE", "30"))
+    rate_limit_admin_per_minute: int = int(os.getenv("RATE_LIMIT_ADMIN_PER_MINUTE", "300"))
+    rate_limit_default_per_minute: int = int(os.getenv("RATE_LIMIT_DEFAULT_PER_MINUTE", "300"))
+    rate_limit_ip_per_minute: int = int(os.getenv("RATE_LIMIT_IP_PER_MINUTE", "1200"))
+    
+    # Single-flight coalescing of hot anonymous reads; > 0 also serves results for this long
+    coalesce_cache_ttl_ms: int = int(os.getenv("COALESCE_CACHE_TTL_MS", "0"))
+    
+    # Two-tier read caches (see app/utils/cache.py and app/caches.py)
+    cache_enabled: bool = os.getenv("CACHE_ENABLED", "true").lower() == "true"
+    cache_backend: str = os.getenv("CACHE_BACKEND", "memory")  # "memory" or "shared" (adds the SHARED_STORE_URL tier)
+    cache_max_entries: int = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+    cache_local_ttl: float = float(os.getenv("CACHE_LOCAL_TTL", "30"))
+    cache_shared_ttl: float = float(os.getenv("CACHE_SHARED_TTL", "300"))
+    
+    # POST /batch: sub-requests per call and how many of them run at once
+    batch_max_requests: int = int(os.getenv("BATCH_MAX_REQUESTS", "20"))
+    batch_concurrency: int = int(os.getenv("BATCH_CONCURRENCY", "4"))
+    
+    # Idempotency-Key on order placement (see app/utils/idempotency.py)
+    idempotency_key_ttl_hours: int = int(os.getenv("IDEMPOTENCY_KEY_TTL_HOURS", "24"))
+    
+    # PATCH /orders/status: orders per call
+    orders_bulk_status_max: int = int(os.getenv("ORDERS_BULK_STATUS_MAX", "200"))
+    
+    # Daily portion caps per menu item (see app/utils/capacity.py)
+    capacity_shards: int = int(os.getenv("CAPACITY_SHARDS", "8"))
+    capacity_retention_days: int = int(os.getenv("CAPACITY_RETENTION_DAYS", "7"))
+    
+    # GET /updates/poll long-polling (see app/utils/longpoll.py)
+    longpoll_timeout: float = float(os.getenv("LONGPOLL_TIMEOUT", "25"))  # default wait; clients may ask for less
+    longpoll_max_timeout: float = float(os.getenv("LONGPOLL_MAX_TIMEOUT", "55"))  # keep under proxy idle timeouts
+    longpoll_max_waiters: int = int(os.getenv("LONGPOLL_MAX_WAITERS", "10000"))  # parked polls per worker
+    longpoll_retention: float = float(os.getenv("LONGPOLL_RETENTION", "120"))  # seconds of events kept for the next poll
+    longpoll_max_events_per_user: int = int(os.getenv("LONGPOLL_MAX_EVENTS_PER_USER", "100"))
+    
+    # GET /sync delta sync (see app/routers/sync.py)
+    sync_max_changes: int = int(os.getenv("SYNC_MAX_CHANGES", "500"))  # per kind; more answers resync
+    sync_tombstone_retention_days: int = int(os.getenv("SYNC_TOMBSTONE_RETENTION_DAYS", "7"))
+    
+    # Exact totals of admin lists (with_total=exact; see app/utils/counts.py)
+    admin_count_cache_ttl: float = float(os.getenv("ADMIN_COUNT_CACHE_TTL", "30"))
+    
+    # Background purge of deleted users and cook profiles (see migrations/0014_soft_delete.sql)
+    purge_batch_size: int = int(os.getenv("PURGE_BATCH_SIZE", "500"))  # rows deleted per transaction
+    purge_batch_delay: float = float(os.getenv("PURGE_BATCH_DELAY", "0.1"))  # pause between chunks, in seconds
+    
+    # Background jobs (see app/jobs.py)
+    jobs_run_in_api: bool = os.getenv("JOBS_RUN_IN_API", "false").lower() == "true"
+    jobs_concurrency: int = int(os.getenv("JOBS_CONCURRENCY", "4"))
+    jobs_batch_size: int = int(os.getenv("JOBS_BATCH_SIZE", "10"))
+    jobs_poll_interval: float = float(os.getenv("JOBS_POLL_INTERVAL", "1.0"))
+    jobs_visibility_timeout: int = int(os.getenv("JOBS_VISIBILITY_TIMEOUT", "300"))
+    jobs_max_attempts: int = int(os.getenv("JOBS_MAX_ATTEMPTS", "5"))
+    jobs_backoff_base: float = float(os.getenv("JOBS_BACKOFF_BASE", "5"))
+    jobs_backoff_max: float = float(os.getenv("JOBS_BACKOFF_MAX", "3600"))
+    jobs_retention_hours: int = int(os.getenv("JOBS_RETENTION_HOURS", "168"))
+    
+    # Order/message partitions and archival (see migrations/0005_partition_orders.sql)
+    partitions_premake_months: int = int(os.getenv("PARTITIONS_PREMAKE_MONTHS", "3"))
+    orders_archive_after_days: int = int(os.getenv("ORDERS_ARCHIVE_AFTER_DAYS", "90"))
+    orders_archive_batch_size: int = int(os.getenv("ORDERS_ARCHIVE_BATCH_SIZE", "1000"))
+    
     class Config:
         env_file = str(env_path)
         extra = "ignore"  # Ignore extra fields from environment
@@ -1,18 +1,42 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import Optional
-import asyncpg
-from app.database import get_db
+from app.caches import principal_cache
+from app.database import acquire_connection
 from app.utils.auth import verify_token
 from app.models import User, UserRole
 
 security = HTTPBearer()
 
+async def load_principal(email: str) -> Optional[dict]:
+    """User row for a token subject, cached per email (invalidated on deactivate/delete)"""
+    async def load_user():
+        # Only cache misses borrow a connection
+        async with acquire_connection() as db:
+            user_record = await db.fetchrow(
+                """
+                SELECT id, email, full_name, role, is_active, created_at
+                FROM users WHERE email = $1
+                """,
+                email
+            )
+        return dict(user_record) if user_record else None
+    
+    return await principal_cache.get_or_load(email, load_user)
+
+def batch_principal(request: Request) -> Optional[User]:
+    """User already authenticated by POST /batch for its sub-requests (never set from client input)"""
+    return request.scope.get("state", {}).get("batch_principal")
+
 async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: asyncpg.Connection = Depends(get_db)
+    request: Request,
+    credentials: HTTPAuthorizationCredentials = Depends(security)
 ) -> User:
     """Get current authenticated user"""
+    principal = batch_principal(request)
+    if principal is not None:
+        return principal
+    
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -25,12 +49,7 @@ async def get_current_user(
     if email is None:
         raise credentials_exception
     
-    # Get user from database
-    query = """
-        SELECT id, email, full_name, role, is_active, created_at, hashed_password
-        FROM users WHERE email = $1
-    """
-    user_record = await db.fetchrow(query, email)
+    user_record = await load_principal(email)
     
     if user_record is None:
         raise credentials_exception
@@ -65,10 +84,14 @@ async def require_admin(current_user: User = Depends(get_current_user)) -> User:
     return current_user
 
 async def get_optional_user(
-    credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False)),
-    db: asyncpg.Connection = Depends(get_db)
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False))
 ) -> Optional[User]:
     """Get current user if authenticated, otherwise None"""
+    principal = batch_principal(request)
+    if principal is not None:
+        return principal
+    
     if not credentials:
         return None
     
@@ -78,12 +101,7 @@ async def get_optional_user(
     if email is None:
         return None
     
-    # Get user from database
-    query = """
-        SELECT id, email, full_name, role, is_active, created_at
-        FROM users WHERE email = $1
-    """
-    user_record = await db.fetchrow(query, email)
+    user_record = await load_principal(email)
     
     if user_record is None:
         return None
@@ -0,0 +1,274 @@
+"""
+Durable background jobs stored in Postgres.
+
+Jobs are rows in the `jobs` table (migrations/0003_jobs.sql). `enqueue()` takes the caller's
+connection, so a handler can enqueue inside its own transaction and the job only becomes
+visible if that transaction commits. `JobWorker` claims due jobs in batches with
+FOR UPDATE SKIP LOCKED, runs them concurrently, retries failures with exponential backoff
+and re-queues jobs whose visibility timeout expired because their worker died.
+
+Handlers are registered with `@job_handler("kind")` (see app/tasks.py) and the worker runs
+inside the API process (JOBS_RUN_IN_API=true) or standalone via `python worker.py`.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+import asyncpg
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class JobContext:
+    """What a handler receives: the job and a pooled connection to work with"""
+    id: int
+    kind: str
+    payload: Dict[str, Any]
+    attempt: int
+    conn: asyncpg.Connection
+    worker: "JobWorker"
+
+    async def report_progress(self, **progress: Any):
+        """Record progress on the job row; also extends the visibility timeout"""
+        await self.conn.execute(
+            """
+            UPDATE jobs
+            SET progress = $2::jsonb, locked_until = NOW() + make_interval(secs => $3)
+            WHERE id = $1 AND locked_by = $4
+            """,
+            self.id, json.dumps(progress, default=str), self.worker.visibility_timeout, self.worker.worker_id
+        )
+
+JobHandler = Callable[[JobContext], Awaitable[None]]
+
+# kind -> handler
+JOB_HANDLERS: Dict[str, JobHandler] = {}
+
+# kind -> interval in seconds, enqueued by every running worker (deduplicated by kind)
+PERIODIC_JOBS: Dict[str, float] = {}
+
+def job_handler(kind: str, every: Optional[float] = None):
+    """Register a handler for a job kind, optionally scheduling it every `every` seconds"""
+    def decorator(func: JobHandler) -> JobHandler:
+        JOB_HANDLERS[kind] = func
+        if every:
+            PERIODIC_JOBS[kind] = every
+        return func
+    return decorator
+
+async def enqueue(
+    conn: asyncpg.Connection,
+    kind: str,
+    payload: Optional[Dict[str, Any]] = None,
+    *,
+    priority: int = 0,
+    delay: float = 0,
+    max_attempts: Optional[int] = None,
+    dedupe_key: Optional[str] = None,
+) -> Optional[int]:
+    """Insert a job using the caller's connection (and transaction, if any).
+
+    Returns the job id, or None when a queued/running job with the same dedupe_key exists.
+    """
+    return await conn.fetchval(
+        """
+        INSERT INTO jobs (kind, payload, priority, run_at, max_attempts, dedupe_key)
+        VALUES ($1, $2::jsonb, $3, NOW() + make_interval(secs => $4), $5, $6)
+        ON CONFLICT (dedupe_key) WHERE dedupe_key IS NOT NULL AND status IN ('queued', 'running')
+        DO NOTHING
+        RETURNING id
+        """,
+        kind,
+        json.dumps(payload or {}, default=str),
+        priority,
+        float(delay),
+        max_attempts or settings.jobs_max_attempts,
+        dedupe_key
+    )
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter, capped at jobs_backoff_max seconds"""
+    ceiling = min(settings.jobs_backoff_max, settings.jobs_backoff_base * (2 ** (attempt - 1)))
+    return random.uniform(ceiling / 2, ceiling)
+
+class JobWorker:
+    """Claims and runs jobs until stopped"""
+
+    def __init__(
+        self,
+        pool: asyncpg.Pool,
+        concurrency: int = settings.jobs_concurrency,
+        batch_size: int = settings.jobs_batch_size,
+        poll_interval: float = settings.jobs_poll_interval,
+        visibility_timeout: int = settings.jobs_visibility_timeout,
+        kinds: Optional[List[str]] = None,
+    ):
+        self.pool = pool
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.visibility_timeout = visibility_timeout
+        self.kinds = kinds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{id(self):x}"
+        self._running: Set[asyncio.Task] = set()
+        self._stopping = asyncio.Event()
+        self._slot_free = asyncio.Event()
+        self._next_periodic: Dict[str, float] = {}
+
+    async def run(self):
+        """Main loop: reap expired leases, schedule periodic jobs, claim and dispatch"""
+        logger.info(f"Job worker {self.worker_id} started (concurrency={self.concurrency})")
+        while not self._stopping.is_set():
+            try:
+                await self._reap_expired()
+                await self._schedule_periodic()
+                free_slots = self.concurrency - len(self._running)
+                claimed = await self._claim(min(self.batch_size, free_slots)) if free_slots > 0 else []
+            except (OSError, asyncpg.PostgresError) as e:
+                logger.error(f"Job worker poll failed: {e}")
+                claimed = []
+
+            for job in claimed:
+                task = asyncio.create_task(self._execute(job))
+                self._running.add(task)
+                task.add_done_callback(self._task_done)
+
+            if claimed and len(claimed) == self.batch_size:
+                continue  # there is probably more work waiting
+            await self._wait(self.poll_interval)
+
+    async def stop(self, timeout: float = 30.0):
+        """Stop claiming and wait for running jobs; unfinished jobs are retried after their lease expires"""
+        self._stopping.set()
+        if self._running:
+            await asyncio.wait(list(self._running), timeout=timeout)
+
+    def _task_done(self, task: asyncio.Task):
+        self._running.discard(task)
+        self._slot_free.set()
+        if not task.cancelled() and task.exception() is not None:
+            # Bookkeeping failed (e.g. lost connection); the lease expiry will retry the job
+            logger.error(f"Job worker task failed: {task.exception()!r}")
+
+    async def _wait(self, seconds: float):
+        self._slot_free.clear()
+        stop = asyncio.ensure_future(self._stopping.wait())
+        slot = asyncio.ensure_future(self._slot_free.wait())
+        try:
+            await asyncio.wait([stop, slot], timeout=seconds, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            stop.cancel()
+            slot.cancel()
+
+    async def _reap_expired(self):
+        async with self.pool.acquire() as conn:
+            await conn.execute(
+                """
+                UPDATE jobs
+                SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END,
+                    finished_at = CASE WHEN attempts >= max_attempts THEN NOW() END,
+                    last_error = 'visibility timeout expired',
+                    locked_until = NULL, locked_by = NULL
+                WHERE status = 'running' AND locked_until < NOW()
+                """
+            )
+
+    async def _schedule_periodic(self):
+        now = time.monotonic()
+        due = [kind for kind in PERIODIC_JOBS if self._next_periodic.get(kind, 0) <= now]
+        if not due:
+            return
+        async with self.pool.acquire() as conn:
+            for kind in due:
+                # The dedupe key keeps one pending instance no matter how many workers run
+                await enqueue(conn, kind, dedupe_key=f"periodic:{kind}")
+                self._next_periodic[kind] = now + PERIODIC_JOBS[kind]
+
+    async def _claim(self, limit: int) -> List[asyncpg.Record]:
+        async with self.pool.acquire() as conn:
+            return await conn.fetch(
+                """
+                WITH next_jobs AS (
+                    SELECT id FROM jobs
+                    WHERE status = 'queued' AND run_at <= NOW()
+                      AND ($4::text[] IS NULL OR kind = ANY($4::text[]))
+                    ORDER BY priority DESC, run_at
+                    LIMIT $1
+                    FOR UPDATE SKIP LOCKED
+                )
+                UPDATE jobs j
+                SET status = 'running', attempts = j.attempts + 1,
+                    locked_until = NOW() + make_interval(secs => $2), locked_by = $3
+                FROM next_jobs
+                WHERE j.id = next_jobs.id
+                RETURNING j.id, j.kind, j.payload, j.attempts, j.max_attempts
+                """,
+                limit, self.visibility_timeout, self.worker_id, self.kinds
+            )
+
+    async def _execute(self, job: asyncpg.Record):
+        handler = JOB_HANDLERS.get(job['kind'])
+        async with self.pool.acquire() as conn:
+            try:
+                if handler is None:
+                    raise LookupError(f"No handler registered for job kind '{job['kind']}'")
+                context = JobContext(
+                    id=job['id'],
+                    kind=job['kind'],
+                    payload=json.loads(job['payload']),
+                    attempt=job['attempts'],
+                    conn=conn,
+                    worker=self
+                )
+                await handler(context)
+            except Exception as e:
+                await self._fail(conn, job, e)
+                return
+
+            await conn.execute(
+                """
+                UPDATE jobs SET status = 'done', finished_at = NOW(), locked_until = NULL, last_error = NULL
+                WHERE id = $1 AND locked_by = $2
+                """,
+                job['id'], self.worker_id
+            )
+
+    async def _fail(self, conn: asyncpg.Connection, job: asyncpg.Record, error: Exception):
+        final = job['attempts'] >= job['max_attempts']
+        logger.warning(
+            f"Job {job['id']} ({job['kind']}) failed on attempt {job['attempts']}/{job['max_attempts']}: {error}"
+        )
+        await conn.execute(
+            """
+            UPDATE jobs
+            SET status = $3::varchar, last_error = $4, locked_until = NULL, locked_by = NULL,
+                run_at = CASE WHEN $3::varchar = 'queued' THEN NOW() + make_interval(secs => $5) ELSE run_at END,
+                finished_at = CASE WHEN $3::varchar = 'failed' THEN NOW() END
+            WHERE id = $1 AND locked_by = $2
+            """,
+            job['id'], self.worker_id, 'failed' if final else 'queued', repr(error)[:2000],
+            backoff_delay(job['attempts'])
+        )
+
+@dataclass
+class JobRuntime:
+    """A worker running as a background task (used by the API process and worker.py)"""
+    worker: JobWorker
+    task: asyncio.Task = field(init=False)
+
+    def start(self) -> "JobRuntime":
+        self.task = asyncio.create_task(self.worker.run())
+        return self
+
+    async def stop(self, timeout: float = 30.0):
+        await self.worker.stop(timeout)
+        await self.task
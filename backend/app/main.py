@@ -1,10 +1,24 @@
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+import asyncio
+import asyncpg
 import logging
 
-from app.routers import auth, cooks, menu, orders, messages, admin
+from app.routers import auth, cooks, menu, orders, messages, admin, batch, updates, sync
 from app.config import settings
+from app.database import init_db_pool, close_db_pool, get_db_pool
+from app.jobs import JobRuntime, JobWorker
+from app import tasks  # noqa: F401  (registers job handlers)
+from app.utils.admission import AdmissionMiddleware, get_admission_controller
+from app.utils.cache import CACHE_INVALIDATION_CHANNEL, clear_local_caches, handle_invalidation
+from app.utils.counts import TOTAL_COUNT_ESTIMATED_HEADER, TOTAL_COUNT_HEADER
+from app.utils.longpoll import get_update_waiters
+from app.utils.notify import MESSAGE_CHANGES_CHANNEL, ORDER_CHANGES_CHANNEL, get_notification_hub
+from app.utils.pagination import NEXT_CURSOR_HEADER
+from app.utils.rate_limit import RateLimitMiddleware, InMemoryBackend, SharedBackend
+from app.utils.shared_store import get_shared_store
+from app.utils.timeouts import RequestTimeoutMiddleware
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -19,6 +33,23 @@ app = FastAPI(
     redoc_url="/redoc"
 )
 
+# Per-route-class concurrency limits and load shedding (innermost, so a queued request whose
+# client disconnects is cancelled by RequestTimeoutMiddleware and gives up its place)
+if settings.admission_enabled:
+    app.add_middleware(AdmissionMiddleware)
+
+# Per-route-class query budgets; cancels a request whose client disconnected
+app.add_middleware(RequestTimeoutMiddleware)
+
+# Rate limiting (added before CORS so 429 responses still carry CORS headers)
+if settings.rate_limit_enabled:
+    shared_store = get_shared_store()
+    if settings.rate_limit_backend == "shared" and shared_store is not None:
+        rate_limit_backend = SharedBackend(shared_store)
+    else:
+        rate_limit_backend = InMemoryBackend(max_keys=settings.rate_limit_max_keys)
+    app.add_middleware(RateLimitMiddleware, backend=rate_limit_backend)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -26,6 +57,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER, TOTAL_COUNT_ESTIMATED_HEADER],
 )
 
 # Include routers
@@ -35,6 +67,62 @@ app.include_router(menu.router)
 app.include_router(orders.router)
 app.include_router(messages.router)
 app.include_router(admin.router)
+app.include_router(batch.router)
+app.include_router(updates.router)
+app.include_router(sync.router)
+
+# Connection pool, notification listener and background job lifecycle (runs once per worker process)
+job_runtime = None
+
+@app.on_event("startup")
+async def startup():
+    global job_runtime
+    await init_db_pool()
+    pool = get_db_pool()
+    if pool is not None:
+        # partitions.maintain only runs where jobs do; don't let rows pile up in the DEFAULT partitions meanwhile
+        try:
+            async with pool.acquire() as conn:
+                await tasks.create_upcoming_partitions(conn)
+        except Exception as e:
+            logger.warning(f"Could not create upcoming partitions: {e}")
+    hub = get_notification_hub()
+    if settings.cache_enabled:
+        hub.subscribe(CACHE_INVALIDATION_CHANNEL, handle_invalidation)
+        hub.on_reconnect(clear_local_caches)
+    # Long-polls (GET /updates/poll) are woken from the same LISTEN connection
+    waiters = get_update_waiters()
+    hub.subscribe(ORDER_CHANGES_CHANNEL, waiters.handle_order_change)
+    hub.subscribe(MESSAGE_CHANGES_CHANNEL, waiters.handle_message)
+    hub.on_reconnect(waiters.resync)
+    await hub.start()
+    if settings.admission_enabled:
+        get_admission_controller().start()
+    if settings.jobs_run_in_api:
+        if pool is None:
+            logger.error("JOBS_RUN_IN_API is set but no database pool is available; jobs will not run")
+        else:
+            job_runtime = JobRuntime(JobWorker(pool)).start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    # Runs after the server has drained in-flight requests
+    if job_runtime is not None:
+        await job_runtime.stop(timeout=settings.server_graceful_timeout / 2)
+    await get_notification_hub().stop()
+    await get_admission_controller().stop()
+    await close_db_pool()
+
+# A query ran past its route class's budget (asyncpg's timeout) or a statement_timeout set on
+# the database role, and was cancelled on the server
+@app.exception_handler(asyncio.TimeoutError)
+@app.exception_handler(asyncpg.exceptions.QueryCanceledError)
+async def query_canceled_handler(request: Request, exc: Exception):
+    logger.warning(f"Query cancelled for {request.method} {request.url.path}: {exc}")
+    return JSONResponse(
+        status_code=504,
+        content={"detail": "Request took too long, please retry"}
+    )
 
 # Global exception handler
 @app.exception_handler(Exception)
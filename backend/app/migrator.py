@@ -0,0 +1,368 @@
+"""
+Versioned schema migrations.
+
+Migrations are SQL files in backend/migrations named `NNNN_description.sql` and applied in
+version order. Applied versions are recorded in `schema_migrations`. Header comments
+control how a file runs:
+
+    -- migrate: no-transaction      run statement by statement outside a transaction
+                                    (required for CREATE/DROP INDEX CONCURRENTLY)
+    -- migrate: lock-timeout 2s     override the lock_timeout for this migration
+
+Every statement runs with a lock_timeout, so a migration that cannot get its lock gives up
+quickly instead of queueing behind a long transaction and blocking all traffic behind it.
+Lock timeouts are retried with backoff. No-transaction migrations can fail halfway and are
+re-run from the top, so their statements must be idempotent (IF NOT EXISTS / IF EXISTS).
+
+`plan()` is a dry run: it reports, without touching the database, which tables each pending
+statement locks and in which mode.
+"""
+
+import asyncio
+import hashlib
+import logging
+import re
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = Path(__file__).parent.parent / "migrations"
+MIGRATION_FILE = re.compile(r"^(\d{4})_(\w+)\.sql$")
+DIRECTIVE = re.compile(r"^--[ \t]*migrate:[ \t]*([\w-]+)[ \t]*(.*?)[ \t]*$", re.MULTILINE)
+
+# Any constant works; only one runner may apply migrations at a time
+ADVISORY_LOCK_KEY = 7_271_020_034
+
+CREATE_VERSION_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        checksum VARCHAR(64) NOT NULL,
+        applied_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+        duration_ms INTEGER
+    )
+"""
+
+class MigrationError(Exception):
+    pass
+
+@dataclass
+class Migration:
+    version: int
+    name: str
+    path: Path
+    sql: str
+    checksum: str
+    transactional: bool = True
+    lock_timeout: Optional[str] = None
+    statements: List[str] = field(default_factory=list)
+
+    @property
+    def label(self) -> str:
+        return f"{self.version:04d}_{self.name}"
+
+def split_statements(sql: str) -> List[str]:
+    """Split a script on top-level semicolons, respecting quotes, dollar quotes and comments"""
+    statements = []
+    current = []
+    i = 0
+    length = len(sql)
+    while i < length:
+        char = sql[i]
+        if char == "-" and sql.startswith("--", i):
+            end = sql.find("\n", i)
+            end = length if end == -1 else end
+            current.append(sql[i:end])
+            i = end
+        elif char == "/" and sql.startswith("/*", i):
+            # Block comments nest in Postgres
+            depth, end = 1, i + 2
+            while end < length and depth:
+                if sql.startswith("/*", end):
+                    depth, end = depth + 1, end + 2
+                elif sql.startswith("*/", end):
+                    depth, end = depth - 1, end + 2
+                else:
+                    end += 1
+            current.append(sql[i:end])
+            i = end
+        elif char in ("'", '"'):
+            # E'...' strings take backslash escapes
+            escapes = char == "'" and i > 0 and sql[i - 1] in "Ee" and not _identifier_char(sql, i - 2)
+            end = i + 1
+            while end < length:
+                if escapes and sql[end] == "\\":
+                    end += 2
+                    continue
+                if sql[end] == char:
+                    if end + 1 < length and sql[end + 1] == char:
+                        end += 2  # doubled quote inside the literal
+                        continue
+                    break
+                end += 1
+            current.append(sql[i:end + 1])
+            i = end + 1
+        elif char == "$" and not _identifier_char(sql, i - 1):
+            tag = re.match(r"\$(?:[A-Za-z_]\w*)?\$", sql[i:])
+            if tag:
+                end = sql.find(tag.group(0), i + len(tag.group(0)))
+                end = length if end == -1 else end + len(tag.group(0))
+                current.append(sql[i:end])
+                i = end
+            else:
+                current.append(char)
+                i += 1
+        elif char == ";":
+            statements.append("".join(current))
+            current = []
+            i += 1
+        else:
+            current.append(char)
+            i += 1
+    statements.append("".join(current))
+    return [statement.strip() for statement in statements if strip_comments(statement).strip()]
+
+def _identifier_char(sql: str, index: int) -> bool:
+    """Whether sql[index] continues an identifier (`$` is allowed inside one, so a$b$ is not a dollar quote)"""
+    return index >= 0 and (sql[index].isalnum() or sql[index] in "_$")
+
+def strip_comments(sql: str) -> str:
+    sql = re.sub(r"/\*.*?\*/", " ", sql, flags=re.DOTALL)
+    return re.sub(r"--[^\n]*", " ", sql)
+
+def load_migration(path: Path) -> Migration:
+    match = MIGRATION_FILE.match(path.name)
+    if not match:
+        raise MigrationError(f"Bad migration file name: {path.name} (expected NNNN_description.sql)")
+    sql = path.read_text(encoding="utf-8")
+    migration = Migration(
+        version=int(match.group(1)),
+        name=match.group(2),
+        path=path,
+        sql=sql,
+        checksum=hashlib.sha256(sql.encode("utf-8")).hexdigest(),
+        statements=split_statements(sql)
+    )
+    for directive, argument in DIRECTIVE.findall(sql):
+        if directive == "no-transaction":
+            migration.transactional = False
+        elif directive == "lock-timeout":
+            migration.lock_timeout = argument
+        else:
+            raise MigrationError(f"{path.name}: unknown directive '{directive}'")
+
+    if migration.transactional and any(re.search(r"\bCONCURRENTLY\b", strip_comments(s), re.IGNORECASE) for s in migration.statements):
+        raise MigrationError(f"{path.name}: CONCURRENTLY cannot run in a transaction; add '-- migrate: no-transaction'")
+    return migration
+
+def discover(directory: Path = MIGRATIONS_DIR) -> List[Migration]:
+    migrations = [load_migration(path) for path in sorted(directory.glob("*.sql"))]
+    versions = [migration.version for migration in migrations]
+    duplicates = {version for version in versions if versions.count(version) > 1}
+    if duplicates:
+        raise MigrationError(f"Duplicate migration versions: {sorted(duplicates)}")
+    return migrations
+
+# Dry-run lock analysis --------------------------------------------------------------------
+
+# What each table lock mode blocks while it is held (or queued for)
+LOCK_EFFECTS = {
+    "ACCESS EXCLUSIVE": "blocks reads and writes",
+    "EXCLUSIVE": "blocks writes",
+    "SHARE ROW EXCLUSIVE": "blocks writes",
+    "SHARE": "blocks writes",
+    "SHARE UPDATE EXCLUSIVE": "reads and writes continue",
+    "ROW EXCLUSIVE": "reads and writes continue",
+}
+
+IDENT = r'((?:"[^"]+"|[\w$]+)(?:\.(?:"[^"]+"|[\w$]+))?)'
+
+def _name(identifier: str) -> str:
+    return identifier.replace('"', "")
+
+def statement_locks(statement: str) -> List[Tuple[str, str]]:
+    """Best-effort (table, lock mode) pairs a statement takes on existing tables"""
+    sql = " ".join(strip_comments(statement).split())
+    upper = sql.upper()
+    locks: List[Tuple[str, str]] = []
+
+    def found(pattern: str) -> Optional[re.Match]:
+        return re.search(pattern, sql, re.IGNORECASE)
+
+    if re.match(r"CREATE (UNIQUE )?INDEX", upper):
+        table = found(r"\bON (?:ONLY )?" + IDENT)
+        mode = "SHARE UPDATE EXCLUSIVE" if " CONCURRENTLY " in f" {upper} " else "SHARE"
+        if table:
+            locks.append((_name(table.group(1)), mode))
+    elif re.match(r"(DROP|REINDEX) INDEX", upper):
+        index = found(r"INDEX (?:CONCURRENTLY )?(?:IF EXISTS )?" + IDENT)
+        mode = "SHARE UPDATE EXCLUSIVE" if " CONCURRENTLY " in f" {upper} " else "ACCESS EXCLUSIVE"
+        if upper.startswith("REINDEX") and mode != "SHARE UPDATE EXCLUSIVE":
+            mode = "SHARE"
+        if index:
+            locks.append((f"table of index {_name(index.group(1))}", mode))
+    elif upper.startswith("ALTER TABLE"):
+        table = found(r"ALTER TABLE (?:IF EXISTS )?(?:ONLY )?" + IDENT)
+        actions = upper[table.end():] if table else upper
+        if re.fullmatch(r"\s*VALIDATE CONSTRAINT \S+\s*", actions) or "DETACH PARTITION" in actions and "CONCURRENTLY" in actions:
+            mode = "SHARE UPDATE EXCLUSIVE"
+        elif re.match(r"\s*ADD (CONSTRAINT \S+ )?FOREIGN KEY", actions):
+            mode = "SHARE ROW EXCLUSIVE"
+        elif re.match(r"\s*ATTACH PARTITION", actions):
+            mode = "SHARE UPDATE EXCLUSIVE"
+            partition = found(r"ATTACH PARTITION " + IDENT)
+            if partition:
+                locks.append((_name(partition.group(1)), "ACCESS EXCLUSIVE"))
+        else:
+            mode = "ACCESS EXCLUSIVE"
+        if table:
+            locks.append((_name(table.group(1)), mode))
+        for referenced in re.finditer(r"\bREFERENCES " + IDENT, sql, re.IGNORECASE):
+            locks.append((_name(referenced.group(1)), "SHARE ROW EXCLUSIVE"))
+    elif upper.startswith("CREATE TABLE"):
+        parent = found(r"\bPARTITION OF " + IDENT)
+        if parent:
+            locks.append((_name(parent.group(1)), "ACCESS EXCLUSIVE"))
+        for referenced in re.finditer(r"\bREFERENCES " + IDENT, sql, re.IGNORECASE):
+            locks.append((_name(referenced.group(1)), "SHARE ROW EXCLUSIVE"))
+    elif re.match(r"CREATE (OR REPLACE )?TRIGGER", upper):
+        table = found(r"\bON " + IDENT)
+        if table:
+            locks.append((_name(table.group(1)), "SHARE ROW EXCLUSIVE"))
+    elif upper.startswith("DROP TRIGGER"):
+        table = found(r"\bON " + IDENT)
+        if table:
+            locks.append((_name(table.group(1)), "ACCESS EXCLUSIVE"))
+    elif re.match(r"(DROP TABLE|TRUNCATE)", upper):
+        for table in re.findall(IDENT, re.sub(r"^(DROP TABLE|TRUNCATE)( TABLE)?( IF EXISTS)?|\b(CASCADE|RESTRICT)\b", "", sql, flags=re.IGNORECASE)):
+            locks.append((_name(table), "ACCESS EXCLUSIVE"))
+    elif re.match(r"(INSERT INTO|UPDATE|DELETE FROM)", upper):
+        table = found(r"^(?:INSERT INTO|UPDATE|DELETE FROM) (?:ONLY )?" + IDENT)
+        if table:
+            locks.append((_name(table.group(1)), "ROW EXCLUSIVE"))
+    elif re.match(r"(VACUUM|ANALYZE)", upper):
+        for table in re.findall(IDENT, re.sub(r"^(VACUUM|ANALYZE)(\s*\([^)]*\))?", "", sql, flags=re.IGNORECASE)):
+            locks.append((_name(table), "SHARE UPDATE EXCLUSIVE"))
+    elif upper.startswith("LOCK"):
+        table = found(r"^LOCK (?:TABLE )?(?:ONLY )?" + IDENT)
+        mode = found(r"\bIN ([A-Z ]+?) MODE")
+        if table:
+            locks.append((_name(table.group(1)), mode.group(1).upper() if mode else "ACCESS EXCLUSIVE"))
+    return locks
+
+def plan(migration: Migration) -> List[Tuple[str, List[Tuple[str, str]]]]:
+    """(statement summary, locks) for every statement in a migration"""
+    return [
+        (" ".join(strip_comments(statement).split())[:100], statement_locks(statement))
+        for statement in migration.statements
+    ]
+
+# Applying migrations ----------------------------------------------------------------------
+
+class Migrator:
+    """Applies pending migrations over one connection"""
+
+    def __init__(
+        self,
+        conn: asyncpg.Connection,
+        migrations: Optional[List[Migration]] = None,
+        lock_timeout: str = "5s",
+        retries: int = 5,
+    ):
+        self.conn = conn
+        self.migrations = migrations if migrations is not None else discover()
+        self.lock_timeout = lock_timeout
+        self.retries = retries
+
+    async def applied(self) -> Dict[int, asyncpg.Record]:
+        await self.conn.execute(CREATE_VERSION_TABLE)
+        rows = await self.conn.fetch("SELECT version, name, checksum, applied_at FROM schema_migrations ORDER BY version")
+        return {row['version']: row for row in rows}
+
+    async def pending(self, target: Optional[int] = None) -> List[Migration]:
+        applied = await self.applied()
+        for migration in self.migrations:
+            record = applied.get(migration.version)
+            if record is not None and record['checksum'] != migration.checksum:
+                logger.warning(f"Migration {migration.label} changed after it was applied")
+        return [
+            migration for migration in self.migrations
+            if migration.version not in applied and (target is None or migration.version <= target)
+        ]
+
+    async def migrate(self, target: Optional[int] = None) -> List[Migration]:
+        """Apply pending migrations in order; returns the ones applied"""
+        if not await self.conn.fetchval("SELECT pg_try_advisory_lock($1)", ADVISORY_LOCK_KEY):
+            raise MigrationError("Another migration run holds the migration lock")
+        try:
+            done = []
+            for migration in await self.pending(target):
+                await self.apply(migration)
+                done.append(migration)
+            return done
+        finally:
+            await self.conn.execute("SELECT pg_advisory_unlock($1)", ADVISORY_LOCK_KEY)
+
+    async def apply(self, migration: Migration):
+        started = time.monotonic()
+        lock_timeout = migration.lock_timeout or self.lock_timeout
+        if migration.transactional:
+            await self._with_retries(migration, lambda: self._apply_in_transaction(migration, lock_timeout))
+        else:
+            await self.conn.execute("SELECT set_config('lock_timeout', $1, false)", lock_timeout)
+            try:
+                for statement in migration.statements:
+                    await self._with_retries(migration, lambda: self._run_outside_transaction(statement))
+            finally:
+                await self.conn.execute("RESET lock_timeout")
+            await self._record(migration, started)
+        logger.info(f"Applied migration {migration.label} in {time.monotonic() - started:.1f}s")
+
+    async def _apply_in_transaction(self, migration: Migration, lock_timeout: str):
+        started = time.monotonic()
+        async with self.conn.transaction():
+            await self.conn.execute("SELECT set_config('lock_timeout', $1, true)", lock_timeout)
+            await self.conn.execute(migration.sql)
+            await self._record(migration, started)
+
+    async def _run_outside_transaction(self, statement: str):
+        # A failed CONCURRENTLY build leaves an INVALID index that IF NOT EXISTS would skip
+        build = re.match(
+            r"CREATE (?:UNIQUE )?INDEX CONCURRENTLY IF NOT EXISTS " + IDENT,
+            " ".join(strip_comments(statement).split()),
+            re.IGNORECASE
+        )
+        if build:
+            valid = await self.conn.fetchval(
+                "SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass($1)",
+                _name(build.group(1))
+            )
+            if valid is False:
+                logger.warning(f"Rebuilding invalid index {build.group(1)}")
+                await self.conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {build.group(1)}")
+        await self.conn.execute(statement)
+
+    async def _with_retries(self, migration: Migration, step):
+        for attempt in range(1, self.retries + 2):
+            try:
+                return await step()
+            except asyncpg.LockNotAvailableError:
+                if attempt > self.retries:
+                    raise MigrationError(f"{migration.label}: could not acquire locks after {attempt} attempts")
+                delay = min(30.0, 2.0 ** attempt)
+                logger.warning(f"{migration.label}: lock timeout, retrying in {delay:.0f}s (attempt {attempt})")
+                await asyncio.sleep(delay)
+
+    async def _record(self, migration: Migration, started: float):
+        await self.conn.execute(
+            """
+            INSERT INTO schema_migrations (version, name, checksum, duration_ms)
+            VALUES ($1, $2, $3, $4)
+            """,
+            migration.version, migration.name, migration.checksum, int((time.monotonic() - started) * 1000)
+        )
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from typing import Dict, Optional, List
 from datetime import datetime
 from enum import Enum
 
@@ -14,6 +14,15 @@ class OrderStatus(str, Enum):
     COMPLETED = "completed"
     CANCELLED = "cancelled"
 
+# Statuses a cook may move an order to from each status
+ORDER_STATUS_TRANSITIONS = {
+    OrderStatus.PENDING: (OrderStatus.PREPARING, OrderStatus.CANCELLED),
+    OrderStatus.PREPARING: (OrderStatus.READY, OrderStatus.CANCELLED),
+    OrderStatus.READY: (OrderStatus.COMPLETED,),
+    OrderStatus.COMPLETED: (),
+    OrderStatus.CANCELLED: (),
+}
+
 # User Models
 class UserBase(BaseModel):
     email: EmailStr
@@ -70,6 +79,7 @@ class MenuItemBase(BaseModel):
     price: float
     photo_url: Optional[str] = None
     is_available: bool = True
+    daily_capacity: Optional[int] = None  # portions per UTC day; None for no cap
 
 class MenuItemCreate(MenuItemBase):
     pass
@@ -80,6 +90,7 @@ class MenuItemUpdate(BaseModel):
     price: Optional[float] = None
     photo_url: Optional[str] = None
     is_available: Optional[bool] = None
+    daily_capacity: Optional[int] = None  # sending null removes the cap
 
 class MenuItem(MenuItemBase):
     id: int
@@ -106,6 +117,13 @@ class BatchOrderCreate(BaseModel):
 class OrderUpdate(BaseModel):
     status: Optional[OrderStatus] = None
     special_instructions: Optional[str] = None
+    version: Optional[int] = None  # the version last read; the update fails with 409 if the order changed since
+
+class OrderStatusBulkUpdate(BaseModel):
+    """Move several of a cook's orders to one status: the listed orders, or all of a batch"""
+    status: OrderStatus
+    order_ids: Optional[List[int]] = None
+    batch_order_id: Optional[int] = None
 
 class Order(OrderBase):
     id: int
@@ -116,6 +134,8 @@ class Order(OrderBase):
     batch_order_id: Optional[int] = None
     created_at: datetime
     updated_at: datetime
+    archived: bool = False
+    version: int = 1
     
     class Config:
         from_attributes = True
@@ -125,12 +145,16 @@ class BatchOrderBase(BaseModel):
     total_price: float
     status: OrderStatus = OrderStatus.PENDING
 
+class BatchOrderItem(Order):
+    """An order within a batch, with the menu item it is for"""
+    menuItem: Optional[dict] = None
+
 class BatchOrder(BatchOrderBase):
     id: int
     buyer_id: int
     created_at: datetime
     updated_at: datetime
-    orders: Optional[List[Order]] = None
+    orders: Optional[List[BatchOrderItem]] = None
     
     class Config:
         from_attributes = True
@@ -151,10 +175,47 @@ class Message(MessageBase):
     class Config:
         from_attributes = True
 
+class Conversation(BaseModel):
+    """A user's summary of one order's message thread (GET /messages/inbox)"""
+    order_id: int
+    last_message_id: int
+    last_sender_id: Optional[int] = None
+    last_message_preview: str
+    last_activity_at: datetime
+    last_read_message_id: int
+    unread_count: int
+
+class ConversationRead(BaseModel):
+    last_read_message_id: Optional[int] = None  # None marks the whole thread read
+
+class UpdatePoll(BaseModel):
+    """GET /updates/poll: events since the last poll (empty on timeout)"""
+    events: List[dict]
+    resync: bool = False  # events may have been missed; reload instead of applying them
+    cursor: str  # send back as `since`
+
+class SyncChanges(BaseModel):
+    """GET /sync: what changed for the caller since their token"""
+    orders: List[Order] = []
+    batch_orders: List[BatchOrder] = []
+    menu_items: List[MenuItem] = []
+    messages: List[Message] = []
+    deleted: Dict[str, List[int]] = {}  # "order" / "batch_order" / "menu_item" / "message" -> ids
+    resync: bool = False  # too many changes or an expired token; reload the lists instead
+    token: str  # send back as `since`
+
 # Token Models
 class Token(BaseModel):
     access_token: str
     token_type: str
 
 class TokenData(BaseModel):
-    email: Optional[str] = None 
\ No newline at end of file
+    email: Optional[str] = None 
+# Batch Models
+class BatchSubRequest(BaseModel):
+    id: Optional[str] = None  # echoed back so clients can match responses
+    method: str = "GET"
+    path: str  # e.g. "/orders/?as_cook=true"
+
+class BatchRequest(BaseModel):
+    requests: List[BatchSubRequest]
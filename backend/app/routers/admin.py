@@ -1,25 +1,42 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from typing import List, Optional
+import json
 import asyncpg
-from app.database import get_db
+from app.caches import (
+    admin_count_cache, admin_stats_cache, cook_profile_cache, menu_item_cache, prep_sheet_cache, prep_sheet_key, principal_cache
+)
+from app.config import settings
+from app.database import get_db, acquire_connection
+from app.jobs import enqueue
 from app.models import User, Order, Message, OrderStatus
 from app.dependencies import require_admin
+from app.utils.admission import get_admission_controller
+from app.utils.cache import cache_stats
+from app.utils.counts import TotalCount, set_total_count
+from app.utils.longpoll import get_update_waiters
+from app.utils.notify import get_notification_hub
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
 # User management
 @router.get("/users", response_model=List[User])
 async def get_all_users(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    with_total: Optional[TotalCount] = None,
     admin_user: User = Depends(require_admin),
     db: asyncpg.Connection = Depends(get_db)
 ):
-    """Get all users (admin only)"""
+    """Get all users (admin only); with_total=estimate|exact adds X-Total-Count"""
+    if with_total:
+        await set_total_count(response, db, with_total, admin_count_cache, "users", "deleted_at IS NULL")
+    
     users = await db.fetch(
         """
         SELECT id, email, full_name, role, is_active, created_at
         FROM users
+        WHERE deleted_at IS NULL
         ORDER BY created_at DESC
         LIMIT $1 OFFSET $2
         """,
@@ -46,7 +63,7 @@ async def get_user_by_id(
 ):
     """Get a specific user by ID (admin only)"""
     user_record = await db.fetchrow(
-        "SELECT id, email, full_name, role, is_active, created_at FROM users WHERE id = $1",
+        "SELECT id, email, full_name, role, is_active, created_at FROM users WHERE id = $1 AND deleted_at IS NULL",
         user_id
     )
     
@@ -73,7 +90,7 @@ async def delete_user(
 ):
     """Delete a user (admin only)"""
     # Check if user exists
-    user_exists = await db.fetchrow("SELECT id FROM users WHERE id = $1", user_id)
+    user_exists = await db.fetchrow("SELECT id, email FROM users WHERE id = $1 AND deleted_at IS NULL", user_id)
     
     if not user_exists:
         raise HTTPException(
@@ -88,10 +105,28 @@ async def delete_user(
             detail="Cannot delete your own account"
         )
     
-    # Delete user (cascading deletes should handle related records)
-    await db.execute("DELETE FROM users WHERE id = $1", user_id)
+    # Deactivate the user and take their menu off sale now; the users.purge job deletes their
+    # orders, messages and profile in small chunks rather than in one cascading transaction
+    async with db.transaction():
+        await db.execute("UPDATE users SET is_active = false, deleted_at = NOW() WHERE id = $1", user_id)
+        cook_ids = await db.fetch(
+            "UPDATE cook_profiles SET deleted_at = COALESCE(deleted_at, NOW()) WHERE user_id = $1 RETURNING id",
+            user_id
+        )
+        item_ids = await db.fetch(
+            """
+            UPDATE menu_items SET is_available = false, sold_out_on = NULL
+            WHERE cook_id = ANY($1::int[])
+            RETURNING id
+            """,
+            [row['id'] for row in cook_ids]
+        )
+        job_id = await enqueue(db, "users.purge", {"user_id": user_id}, dedupe_key=f"users.purge:{user_id}")
+        await principal_cache.invalidate(db, user_exists['email'])
+        await cook_profile_cache.invalidate(db, *(row['id'] for row in cook_ids))
+        await menu_item_cache.invalidate(db, *(row['id'] for row in item_ids))
     
-    return {"message": "User deleted successfully"}
+    return {"message": "User deleted successfully", "job_id": job_id}
 
 @router.put("/users/{user_id}/deactivate")
 async def deactivate_user(
@@ -101,7 +136,7 @@ async def deactivate_user(
 ):
     """Deactivate a user (admin only)"""
     # Check if user exists
-    user_exists = await db.fetchrow("SELECT id FROM users WHERE id = $1", user_id)
+    user_exists = await db.fetchrow("SELECT id, email FROM users WHERE id = $1 AND deleted_at IS NULL", user_id)
     
     if not user_exists:
         raise HTTPException(
@@ -118,31 +153,45 @@ async def deactivate_user(
     
     # Deactivate user
     await db.execute("UPDATE users SET is_active = false WHERE id = $1", user_id)
+    await principal_cache.invalidate(db, user_exists['email'])
     
     return {"message": "User deactivated successfully"}
 
 # Order management
 @router.get("/orders", response_model=List[Order])
 async def get_all_orders(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     status_filter: Optional[OrderStatus] = None,
+    include_archived: bool = False,
+    with_total: Optional[TotalCount] = None,
     admin_user: User = Depends(require_admin),
     db: asyncpg.Connection = Depends(get_db)
 ):
-    """Get all orders (admin only)"""
+    """Get all orders (admin only); archived orders only on request; with_total=estimate|exact adds X-Total-Count"""
     base_query = """
-        SELECT id, buyer_id, menu_item_id, cook_id, quantity, total_price, status, special_instructions, created_at, updated_at
+        SELECT id, buyer_id, menu_item_id, cook_id, quantity, total_price, status, special_instructions, batch_order_id, created_at, updated_at, archived, version
         FROM orders
     """
+    conditions = []
     params = []
     param_count = 1
     
+    if not include_archived:
+        conditions.append("NOT archived")
+    
     if status_filter:
-        base_query += f" WHERE status = ${param_count}"
+        conditions.append(f"status = ${param_count}")
         params.append(status_filter.value)
         param_count += 1
     
+    if conditions:
+        base_query += " WHERE " + " AND ".join(conditions)
+    
+    if with_total:
+        await set_total_count(response, db, with_total, admin_count_cache, "orders", " AND ".join(conditions), *params)
+    
     base_query += f" ORDER BY created_at DESC LIMIT ${param_count} OFFSET ${param_count + 1}"
     params.extend([limit, skip])
     
@@ -158,8 +207,11 @@ async def get_all_orders(
             total_price=order['total_price'],
             status=order['status'],
             special_instructions=order['special_instructions'],
+            batch_order_id=order['batch_order_id'],
             created_at=order['created_at'],
-            updated_at=order['updated_at']
+            updated_at=order['updated_at'],
+            archived=order['archived'],
+            version=order['version']
         )
         for order in orders
     ]
@@ -173,7 +225,7 @@ async def get_order_by_id(
     """Get a specific order by ID (admin only)"""
     order_record = await db.fetchrow(
         """
-        SELECT id, buyer_id, menu_item_id, cook_id, quantity, total_price, status, special_instructions, created_at, updated_at
+        SELECT id, buyer_id, menu_item_id, cook_id, quantity, total_price, status, special_instructions, batch_order_id, created_at, updated_at, archived, version
         FROM orders WHERE id = $1
         """,
         order_id
@@ -194,8 +246,11 @@ async def get_order_by_id(
         total_price=order_record['total_price'],
         status=order_record['status'],
         special_instructions=order_record['special_instructions'],
+        batch_order_id=order_record['batch_order_id'],
         created_at=order_record['created_at'],
-        updated_at=order_record['updated_at']
+        updated_at=order_record['updated_at'],
+        archived=order_record['archived'],
+        version=order_record['version']
     )
 
 @router.delete("/orders/{order_id}")
@@ -215,20 +270,23 @@ async def delete_order(
         )
     
     # Delete order
-    await db.execute("DELETE FROM orders WHERE id = $1", order_id)
+    deleted = await db.fetch("DELETE FROM orders WHERE id = $1 RETURNING cook_id, created_at", order_id)
+    await prep_sheet_cache.invalidate(db, *{prep_sheet_key(row['cook_id'], row['created_at']) for row in deleted})
     
     return {"message": "Order deleted successfully"}
 
 # Message management
 @router.get("/messages", response_model=List[Message])
 async def get_all_messages(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     order_id: Optional[int] = None,
+    with_total: Optional[TotalCount] = None,
     admin_user: User = Depends(require_admin),
     db: asyncpg.Connection = Depends(get_db)
 ):
-    """Get all messages (admin only)"""
+    """Get all messages (admin only); with_total=estimate|exact adds X-Total-Count"""
     base_query = """
         SELECT id, order_id, sender_id, content, created_at
         FROM messages
@@ -241,6 +299,9 @@ async def get_all_messages(
         params.append(order_id)
         param_count += 1
     
+    if with_total:
+        await set_total_count(response, db, with_total, admin_count_cache, "messages", "order_id = $1" if order_id else "", *params)
+    
     base_query += f" ORDER BY created_at DESC LIMIT ${param_count} OFFSET ${param_count + 1}"
     params.extend([limit, skip])
     
@@ -280,32 +341,34 @@ async def delete_message(
 
 # Statistics
 @router.get("/stats")
-async def get_admin_stats(
-    admin_user: User = Depends(require_admin),
-    db: asyncpg.Connection = Depends(get_db)
-):
+async def get_admin_stats(admin_user: User = Depends(require_admin)):
     """Get platform statistics (admin only)"""
-    # Get user count
-    user_count = await db.fetchval("SELECT COUNT(*) FROM users")
-    active_user_count = await db.fetchval("SELECT COUNT(*) FROM users WHERE is_active = true")
-    
-    # Get cook count
-    cook_count = await db.fetchval("SELECT COUNT(*) FROM cook_profiles")
-    
-    # Get menu item count
-    menu_item_count = await db.fetchval("SELECT COUNT(*) FROM menu_items")
-    available_menu_item_count = await db.fetchval("SELECT COUNT(*) FROM menu_items WHERE is_available = true")
-    
-    # Get order count by status
-    order_counts = await db.fetch(
-        "SELECT status, COUNT(*) as count FROM orders GROUP BY status"
-    )
-    
-    # Get message count
-    message_count = await db.fetchval("SELECT COUNT(*) FROM messages")
-    
-    # Get total revenue
-    total_revenue = await db.fetchval("SELECT COALESCE(SUM(total_price), 0) FROM orders WHERE status = 'completed'")
+    # A dozen full-table counts: served from cache for up to 30 seconds
+    return await admin_stats_cache.get_or_load("platform", load_platform_stats)
+
+async def load_platform_stats() -> dict:
+    async with acquire_connection() as db:
+        # Get user count
+        user_count = await db.fetchval("SELECT COUNT(*) FROM users WHERE deleted_at IS NULL")
+        active_user_count = await db.fetchval("SELECT COUNT(*) FROM users WHERE is_active = true")
+        
+        # Get cook count
+        cook_count = await db.fetchval("SELECT COUNT(*) FROM cook_profiles WHERE deleted_at IS NULL")
+        
+        # Get menu item count
+        menu_item_count = await db.fetchval("SELECT COUNT(*) FROM menu_items")
+        available_menu_item_count = await db.fetchval("SELECT COUNT(*) FROM menu_items WHERE is_available = true")
+        
+        # Get order count by status
+        order_counts = await db.fetch(
+            "SELECT status, COUNT(*) as count FROM orders GROUP BY status"
+        )
+        
+        # Get message count
+        message_count = await db.fetchval("SELECT COUNT(*) FROM messages")
+        
+        # Get total revenue
+        total_revenue = await db.fetchval("SELECT COALESCE(SUM(total_price), 0) FROM orders WHERE status = 'completed'")
     
     return {
         "users": {
@@ -320,4 +383,81 @@ async def get_admin_stats(
         "orders": {status['status']: status['count'] for status in order_counts},
         "messages": message_count,
         "revenue": float(total_revenue) if total_revenue else 0.0
-    } 
\ No newline at end of file
+    }
+
+@router.get("/stats/status-times")
+async def get_status_times(
+    days: int = 7,
+    admin_user: User = Depends(require_admin),
+    db: asyncpg.Connection = Depends(get_db)
+):
+    """How long orders stayed in each status before moving on, over the last `days` days (admin only)"""
+    # Each event carries when the order entered its previous status, so this reads events only
+    rows = await db.fetch(
+        """
+        SELECT
+            from_status AS status,
+            COUNT(*) AS transitions,
+            AVG(EXTRACT(EPOCH FROM created_at - from_status_since)) AS avg_seconds,
+            percentile_cont(0.5) WITHIN GROUP (ORDER BY EXTRACT(EPOCH FROM created_at - from_status_since)) AS p50_seconds,
+            percentile_cont(0.9) WITHIN GROUP (ORDER BY EXTRACT(EPOCH FROM created_at - from_status_since)) AS p90_seconds
+        FROM order_status_events
+        WHERE created_at >= NOW() - make_interval(days => $1) AND from_status IS NOT NULL
+        GROUP BY from_status
+        """,
+        days
+    )
+    
+    return {
+        row['status']: {
+            "transitions": row['transitions'],
+            "avg_seconds": float(row['avg_seconds']),
+            "p50_seconds": row['p50_seconds'],
+            "p90_seconds": row['p90_seconds']
+        }
+        for row in rows
+    }
+
+@router.get("/cache")
+async def get_cache_stats(admin_user: User = Depends(require_admin)):
+    """Hit/miss/eviction counters for every cache in this worker process, its long-polls and admission control (admin only)"""
+    hub = get_notification_hub()
+    return {
+        "enabled": settings.cache_enabled,
+        "invalidation_listener": {"connected": hub.connected, **hub.stats},
+        "caches": cache_stats(),
+        "long_polls": get_update_waiters().snapshot(),
+        "admission": get_admission_controller().snapshot()
+    }
+
+@router.get("/jobs/{job_id}")
+async def get_job(
+    job_id: int,
+    admin_user: User = Depends(require_admin),
+    db: asyncpg.Connection = Depends(get_db)
+):
+    """Status and progress of a background job, e.g. the purge started by deleting a user (admin only)"""
+    job = await db.fetchrow(
+        """
+        SELECT id, kind, status, attempts, progress, last_error, created_at, finished_at
+        FROM jobs WHERE id = $1
+        """,
+        job_id
+    )
+    
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    
+    return {
+        "id": job['id'],
+        "kind": job['kind'],
+        "status": job['status'],
+        "attempts": job['attempts'],
+        "progress": json.loads(job['progress']) if job['progress'] else None,
+        "last_error": job['last_error'],
+        "created_at": job['created_at'],
+        "finished_at": job['finished_at']
+    }
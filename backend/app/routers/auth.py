@@ -99,7 +99,7 @@ async def login_user(
     # Create access token
     access_token_expires = timedelta(minutes=settings.jwt_access_token_expire_minutes)
     access_token = create_access_token(
-        data={"sub": user_record['email']},
+        data={"sub": user_record['email'], "uid": user_record['id']},
         expires_delta=access_token_expires
     )
     
@@ -142,7 +142,7 @@ async def login_for_access_token(
     # Create access token
     access_token_expires = timedelta(minutes=settings.jwt_access_token_expire_minutes)
     access_token = create_access_token(
-        data={"sub": user_record['email']},
+        data={"sub": user_record['email'], "uid": user_record['id']},
         expires_delta=access_token_expires
     )
     
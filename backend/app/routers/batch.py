@@ -0,0 +1,142 @@
+import asyncio
+import json
+from typing import List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+
+from app.config import settings
+from app.dependencies import get_optional_user
+from app.models import BatchRequest, BatchSubRequest, User
+
+router = APIRouter(tags=["batch"])
+
+# Request headers that describe the outer request body or connection, not the sub-request
+SKIPPED_REQUEST_HEADERS = {b"content-length", b"content-type", b"transfer-encoding", b"connection", b"expect", b"origin"}
+SKIPPED_RESPONSE_HEADERS = {"content-length", "content-type"}
+
+@router.post("/batch")
+async def run_batch(
+    batch: BatchRequest,
+    request: Request,
+    current_user: Optional[User] = Depends(get_optional_user)
+):
+    """Run several GET requests in one round trip; results come back in request order"""
+    if not batch.requests:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No requests in batch"
+        )
+
+    if len(batch.requests) > settings.batch_max_requests:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"A batch may contain at most {settings.batch_max_requests} requests"
+        )
+
+    for sub_request in batch.requests:
+        if sub_request.method.upper() != "GET":
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Only GET requests can be batched"
+            )
+        if not sub_request.path.startswith("/") or urlsplit(sub_request.path).path.rstrip("/") == "/batch":
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid batch path: {sub_request.path}"
+            )
+
+    # Authenticate once; sub-requests reuse the principal instead of decoding the token again.
+    # Inactive users are left to each sub-request so they get the usual error.
+    principal = current_user if current_user is not None and current_user.is_active else None
+
+    # Bound how many pooled connections one batch can hold at a time
+    semaphore = asyncio.Semaphore(settings.batch_concurrency)
+
+    async def run_one(sub_request: BatchSubRequest) -> bytes:
+        async with semaphore:
+            status_code, headers, body = await dispatch(request, sub_request.path, principal)
+        return b"".join([
+            b'{"id":', json.dumps(sub_request.id).encode(),
+            b',"status":', str(status_code).encode(),
+            b',"headers":', json.dumps(headers).encode(),
+            b',"body":', body,
+            b"}"
+        ])
+
+    results = await asyncio.gather(*(run_one(sub_request) for sub_request in batch.requests))
+
+    # Sub-responses are already JSON; splice them instead of parsing and re-encoding
+    return Response(
+        content=b'{"responses":[' + b",".join(results) + b"]}",
+        media_type="application/json"
+    )
+
+async def dispatch(request: Request, path: str, principal: Optional[User]) -> Tuple[int, dict, bytes]:
+    """Run one GET through the whole application in-process; returns (status, headers, JSON body)"""
+    parts = urlsplit(path)
+    scope = {
+        "type": "http",
+        "asgi": request.scope.get("asgi", {"version": "3.0"}),
+        "http_version": request.scope.get("http_version", "1.1"),
+        "method": "GET",
+        "scheme": request.scope.get("scheme", "http"),
+        "server": request.scope.get("server"),
+        "client": request.scope.get("client"),
+        "root_path": request.scope.get("root_path", ""),
+        "path": parts.path,
+        "raw_path": parts.path.encode(),
+        "query_string": parts.query.encode(),
+        "headers": [
+            (name, value) for name, value in request.scope["headers"]
+            if name not in SKIPPED_REQUEST_HEADERS
+        ],
+        "state": {"batch_principal": principal} if principal is not None else {},
+    }
+
+    response_started = {}
+    body: List[bytes] = []
+    finished = asyncio.Event()
+    request_sent = False
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response_started.update(message)
+        elif message["type"] == "http.response.body":
+            body.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                finished.set()
+
+    try:
+        await request.app(scope, receive, send)
+    except Exception:
+        # The error handler has already logged it and sent a 500; one failure must not sink the batch
+        if not response_started:
+            return 500, {}, b'{"detail":"Internal server error"}'
+    finally:
+        finished.set()
+
+    headers = {}
+    content_type = ""
+    for name, value in response_started.get("headers", []):
+        name = name.decode("latin-1").lower()
+        if name == "content-type":
+            content_type = value.decode("latin-1")
+        if name not in SKIPPED_RESPONSE_HEADERS:
+            headers[name] = value.decode("latin-1")
+
+    content = b"".join(body)
+    if not content:
+        content = b"null"
+    elif not content_type.startswith("application/json"):
+        content = json.dumps(content.decode("utf-8", errors="replace")).encode()
+
+    return response_started.get("status", 500), headers, content
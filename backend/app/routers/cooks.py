@@ -1,7 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from typing import List
 import asyncpg
-from app.database import get_db
+from app.caches import cook_profile_cache, menu_item_cache
+from app.database import get_db, acquire_connection
+from app.jobs import enqueue
 from app.models import CookProfile, CookProfileCreate, CookProfileUpdate, User
 from app.dependencies import get_current_active_user
 
@@ -16,10 +18,16 @@ async def create_cook_profile(
     """Create a new cook profile"""
     # Check if user already has a cook profile
     existing_profile = await db.fetchrow(
-        "SELECT id FROM cook_profiles WHERE user_id = $1",
+        "SELECT id, deleted_at FROM cook_profiles WHERE user_id = $1",
         current_user.id
     )
     
+    if existing_profile and existing_profile['deleted_at'] is not None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Your previous cook profile is still being deleted; try again shortly"
+        )
+    
     if existing_profile:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -69,6 +77,7 @@ async def get_cook_profiles(
     query = """
         SELECT id, user_id, name, bio, photo_url, delivery_radius, created_at, updated_at
         FROM cook_profiles
+        WHERE deleted_at IS NULL
         ORDER BY created_at DESC
         LIMIT $1 OFFSET $2
     """
@@ -90,15 +99,18 @@ async def get_cook_profiles(
     ]
 
 @router.get("/{cook_id}", response_model=CookProfile)
-async def get_cook_profile(
-    cook_id: int,
-    db: asyncpg.Connection = Depends(get_db)
-):
+async def get_cook_profile(cook_id: int):
     """Get a specific cook profile"""
-    profile_record = await db.fetchrow(
-        "SELECT id, user_id, name, bio, photo_url, delivery_radius, created_at, updated_at FROM cook_profiles WHERE id = $1",
-        cook_id
-    )
+    async def load_profile():
+        # Only cache misses borrow a connection (concurrent misses share one query)
+        async with acquire_connection() as db:
+            profile = await db.fetchrow(
+                "SELECT id, user_id, name, bio, photo_url, delivery_radius, created_at, updated_at FROM cook_profiles WHERE id = $1 AND deleted_at IS NULL",
+                cook_id
+            )
+        return dict(profile) if profile else None
+    
+    profile_record = await cook_profile_cache.get_or_load(cook_id, load_profile)
     
     if not profile_record:
         raise HTTPException(
@@ -124,7 +136,7 @@ async def get_my_cook_profile(
 ):
     """Get current user's cook profile"""
     profile_record = await db.fetchrow(
-        "SELECT id, user_id, name, bio, photo_url, delivery_radius, created_at, updated_at FROM cook_profiles WHERE user_id = $1",
+        "SELECT id, user_id, name, bio, photo_url, delivery_radius, created_at, updated_at FROM cook_profiles WHERE user_id = $1 AND deleted_at IS NULL",
         current_user.id
     )
     
@@ -155,7 +167,7 @@ async def update_cook_profile(
     """Update a cook profile"""
     # Check if profile exists and belongs to current user
     existing_profile = await db.fetchrow(
-        "SELECT id, user_id FROM cook_profiles WHERE id = $1",
+        "SELECT id, user_id FROM cook_profiles WHERE id = $1 AND deleted_at IS NULL",
         cook_id
     )
     
@@ -220,6 +232,8 @@ async def update_cook_profile(
             detail="Failed to update cook profile"
         )
     
+    await cook_profile_cache.invalidate(db, cook_id)
+    
     return CookProfile(
         id=updated_profile['id'],
         user_id=updated_profile['user_id'],
@@ -240,7 +254,7 @@ async def delete_cook_profile(
     """Delete a cook profile"""
     # Check if profile exists and belongs to current user
     existing_profile = await db.fetchrow(
-        "SELECT id, user_id FROM cook_profiles WHERE id = $1",
+        "SELECT id, user_id FROM cook_profiles WHERE id = $1 AND deleted_at IS NULL",
         cook_id
     )
     
@@ -256,7 +270,16 @@ async def delete_cook_profile(
             detail="Not authorized to delete this profile"
         )
     
-    # Delete the profile
-    await db.execute("DELETE FROM cook_profiles WHERE id = $1", cook_id)
+    # Hide the profile and take its menu off sale now; the cooks.purge job deletes its orders
+    # (which RESTRICT a plain delete) and menu items in small chunks, then the profile
+    async with db.transaction():
+        await db.execute("UPDATE cook_profiles SET deleted_at = NOW() WHERE id = $1", cook_id)
+        item_ids = await db.fetch(
+            "UPDATE menu_items SET is_available = false, sold_out_on = NULL WHERE cook_id = $1 RETURNING id",
+            cook_id
+        )
+        await enqueue(db, "cooks.purge", {"cook_id": cook_id}, dedupe_key=f"cooks.purge:{cook_id}")
+        await cook_profile_cache.invalidate(db, cook_id)
+        await menu_item_cache.invalidate(db, *(item['id'] for item in item_ids))
     
     return {"message": "Cook profile deleted successfully"} 
\ No newline at end of file
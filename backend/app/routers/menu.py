@@ -1,12 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from typing import List, Optional
 import asyncpg
-from app.database import get_db
+from app.caches import menu_item_cache
+from app.config import settings
+from app.database import get_db, acquire_connection
 from app.models import MenuItem, MenuItemCreate, MenuItemUpdate, User
 from app.dependencies import get_current_active_user
+from app.utils.coalesce import SingleFlight
 
 router = APIRouter(prefix="/menu", tags=["menu items"])
 
+# Concurrent requests for the same cook's menu page share one query
+cook_menu_flight = SingleFlight(cache_ttl=settings.coalesce_cache_ttl_ms / 1000)
+
 @router.post("/", response_model=MenuItem)
 async def create_menu_item(
     menu_item: MenuItemCreate,
@@ -16,7 +22,7 @@ async def create_menu_item(
     """Create a new menu item"""
     # Check if user has a cook profile
     cook_profile = await db.fetchrow(
-        "SELECT id FROM cook_profiles WHERE user_id = $1",
+        "SELECT id FROM cook_profiles WHERE user_id = $1 AND deleted_at IS NULL",
         current_user.id
     )
     
@@ -26,11 +32,17 @@ async def create_menu_item(
             detail="You must have a cook profile to create menu items"
         )
     
+    if menu_item.daily_capacity is not None and menu_item.daily_capacity < 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Daily capacity cannot be negative"
+        )
+    
     # Insert new menu item
     query = """
-        INSERT INTO menu_items (cook_id, title, description, price, photo_url, is_available, created_at, updated_at)
-        VALUES ($1, $2, $3, $4, $5, $6, NOW(), NOW())
-        RETURNING id, cook_id, title, description, price, photo_url, is_available, created_at, updated_at
+        INSERT INTO menu_items (cook_id, title, description, price, photo_url, is_available, daily_capacity, created_at, updated_at)
+        VALUES ($1, $2, $3, $4, $5, $6, $7, NOW(), NOW())
+        RETURNING id, cook_id, title, description, price, photo_url, is_available, daily_capacity, created_at, updated_at
     """
     
     item_record = await db.fetchrow(
@@ -40,7 +52,8 @@ async def create_menu_item(
         menu_item.description,
         menu_item.price,
         menu_item.photo_url,
-        menu_item.is_available
+        menu_item.is_available,
+        menu_item.daily_capacity
     )
     
     return MenuItem(
@@ -51,6 +64,7 @@ async def create_menu_item(
         price=item_record['price'],
         photo_url=item_record['photo_url'],
         is_available=item_record['is_available'],
+        daily_capacity=item_record['daily_capacity'],
         created_at=item_record['created_at'],
         updated_at=item_record['updated_at']
     )
@@ -65,7 +79,7 @@ async def get_menu_items(
 ):
     """Get menu items with optional filtering"""
     base_query = """
-        SELECT id, cook_id, title, description, price, photo_url, is_available, created_at, updated_at
+        SELECT id, cook_id, title, description, price, photo_url, is_available, daily_capacity, created_at, updated_at
         FROM menu_items
     """
     
@@ -79,9 +93,8 @@ async def get_menu_items(
         param_count += 1
     
     if available_only:
-        conditions.append(f"is_available = ${param_count}")
-        params.append(True)
-        param_count += 1
+        # A literal, not a parameter, so generic plans can match the partial indexes
+        conditions.append("is_available = true")
     
     if conditions:
         base_query += " WHERE " + " AND ".join(conditions)
@@ -100,6 +113,7 @@ async def get_menu_items(
             price=item['price'],
             photo_url=item['photo_url'],
             is_available=item['is_available'],
+            daily_capacity=item['daily_capacity'],
             created_at=item['created_at'],
             updated_at=item['updated_at']
         )
@@ -107,15 +121,18 @@ async def get_menu_items(
     ]
 
 @router.get("/{item_id}", response_model=MenuItem)
-async def get_menu_item(
-    item_id: int,
-    db: asyncpg.Connection = Depends(get_db)
-):
+async def get_menu_item(item_id: int):
     """Get a specific menu item"""
-    item_record = await db.fetchrow(
-        "SELECT id, cook_id, title, description, price, photo_url, is_available, created_at, updated_at FROM menu_items WHERE id = $1",
-        item_id
-    )
+    async def load_item():
+        # Only cache misses borrow a connection (concurrent misses share one query)
+        async with acquire_connection() as db:
+            item = await db.fetchrow(
+                "SELECT id, cook_id, title, description, price, photo_url, is_available, daily_capacity, created_at, updated_at FROM menu_items WHERE id = $1",
+                item_id
+            )
+        return dict(item) if item else None
+    
+    item_record = await menu_item_cache.get_or_load(item_id, load_item)
     
     if not item_record:
         raise HTTPException(
@@ -131,6 +148,7 @@ async def get_menu_item(
         price=item_record['price'],
         photo_url=item_record['photo_url'],
         is_available=item_record['is_available'],
+        daily_capacity=item_record['daily_capacity'],
         created_at=item_record['created_at'],
         updated_at=item_record['updated_at']
     )
@@ -140,40 +158,45 @@ async def get_cook_menu_items(
     cook_id: int,
     skip: int = 0,
     limit: int = 100,
-    available_only: bool = True,
-    db: asyncpg.Connection = Depends(get_db)
+    available_only: bool = True
 ):
     """Get all menu items for a specific cook"""
-    # Check if cook exists
-    cook_exists = await db.fetchrow(
-        "SELECT id FROM cook_profiles WHERE id = $1",
-        cook_id
-    )
-    
-    if not cook_exists:
+    async def load_menu():
+        # Only the first of a burst of identical requests borrows a connection
+        async with acquire_connection() as db:
+            # Check if cook exists
+            cook_exists = await db.fetchrow(
+                "SELECT id FROM cook_profiles WHERE id = $1 AND deleted_at IS NULL",
+                cook_id
+            )
+            
+            if not cook_exists:
+                return None
+            
+            base_query = """
+                SELECT id, cook_id, title, description, price, photo_url, is_available, daily_capacity, created_at, updated_at
+                FROM menu_items
+                WHERE cook_id = $1
+            """
+            params = [cook_id]
+            param_count = 2
+            
+            if available_only:
+                base_query += " AND is_available = true"
+            
+            base_query += f" ORDER BY created_at DESC LIMIT ${param_count} OFFSET ${param_count + 1}"
+            params.extend([limit, skip])
+            
+            return await db.fetch(base_query, *params)
+    
+    items = await cook_menu_flight.do((cook_id, skip, limit, available_only), load_menu)
+    
+    if items is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Cook not found"
         )
     
-    base_query = """
-        SELECT id, cook_id, title, description, price, photo_url, is_available, created_at, updated_at
-        FROM menu_items
-        WHERE cook_id = $1
-    """
-    params = [cook_id]
-    param_count = 2
-    
-    if available_only:
-        base_query += f" AND is_available = ${param_count}"
-        params.append(True)
-        param_count += 1
-    
-    base_query += f" ORDER BY created_at DESC LIMIT ${param_count} OFFSET ${param_count + 1}"
-    params.extend([limit, skip])
-    
-    items = await db.fetch(base_query, *params)
-    
     return [
         MenuItem(
             id=item['id'],
@@ -183,6 +206,7 @@ async def get_cook_menu_items(
             price=item['price'],
             photo_url=item['photo_url'],
             is_available=item['is_available'],
+            daily_capacity=item['daily_capacity'],
             created_at=item['created_at'],
             updated_at=item['updated_at']
         )
@@ -200,10 +224,10 @@ async def update_menu_item(
     # Check if item exists and belongs to current user's cook profile
     item_check = await db.fetchrow(
         """
-        SELECT mi.id, mi.cook_id, cp.user_id
+        SELECT mi.id, mi.cook_id, mi.daily_capacity, cp.user_id
         FROM menu_items mi
         JOIN cook_profiles cp ON mi.cook_id = cp.id
-        WHERE mi.id = $1
+        WHERE mi.id = $1 AND cp.deleted_at IS NULL
         """,
         item_id
     )
@@ -220,6 +244,12 @@ async def update_menu_item(
             detail="Not authorized to update this menu item"
         )
     
+    if menu_item.daily_capacity is not None and menu_item.daily_capacity < 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Daily capacity cannot be negative"
+        )
+    
     # Build update query dynamically
     update_fields = []
     values = []
@@ -246,10 +276,27 @@ async def update_menu_item(
         param_count += 1
     
     if menu_item.is_available is not None:
+        # The cook's own choice replaces any sold-out marking
         update_fields.append(f"is_available = ${param_count}")
+        update_fields.append("sold_out_on = NULL")
         values.append(menu_item.is_available)
         param_count += 1
     
+    # An explicit null removes the cap, so check which fields were sent rather than for None
+    capacity_changed = (
+        "daily_capacity" in menu_item.model_fields_set
+        and menu_item.daily_capacity != item_check['daily_capacity']
+    )
+    if capacity_changed:
+        update_fields.append(f"daily_capacity = ${param_count}")
+        values.append(menu_item.daily_capacity)
+        param_count += 1
+        
+        if menu_item.daily_capacity is None and menu_item.is_available is None:
+            # Uncapped items cannot be sold out
+            update_fields.append("is_available = is_available OR sold_out_on IS NOT NULL")
+            update_fields.append("sold_out_on = NULL")
+    
     if not update_fields:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -263,10 +310,24 @@ async def update_menu_item(
         UPDATE menu_items 
         SET {', '.join(update_fields)}
         WHERE id = ${param_count}
-        RETURNING id, cook_id, title, description, price, photo_url, is_available, created_at, updated_at
+        RETURNING id, cook_id, title, description, price, photo_url, is_available, daily_capacity, created_at, updated_at
     """
     
-    updated_item = await db.fetchrow(query, *values)
+    async with db.transaction():
+        updated_item = await db.fetchrow(query, *values)
+        
+        if capacity_changed and item_check['daily_capacity'] is not None and menu_item.daily_capacity is not None:
+            # Today's remaining portions move by the change in the cap (no-op if nothing was sold yet)
+            await db.execute(
+                "SELECT adjust_capacity($1, (NOW() AT TIME ZONE 'UTC')::date, $2)",
+                item_id, menu_item.daily_capacity - item_check['daily_capacity']
+            )
+            updated_item = await db.fetchrow(
+                "SELECT id, cook_id, title, description, price, photo_url, is_available, daily_capacity, created_at, updated_at FROM menu_items WHERE id = $1",
+                item_id
+            )
+        
+        await menu_item_cache.invalidate(db, item_id)
     
     return MenuItem(
         id=updated_item['id'],
@@ -276,6 +337,7 @@ async def update_menu_item(
         price=updated_item['price'],
         photo_url=updated_item['photo_url'],
         is_available=updated_item['is_available'],
+        daily_capacity=updated_item['daily_capacity'],
         created_at=updated_item['created_at'],
         updated_at=updated_item['updated_at']
     )
@@ -293,7 +355,7 @@ async def delete_menu_item(
         SELECT mi.id, mi.cook_id, cp.user_id
         FROM menu_items mi
         JOIN cook_profiles cp ON mi.cook_id = cp.id
-        WHERE mi.id = $1
+        WHERE mi.id = $1 AND cp.deleted_at IS NULL
         """,
         item_id
     )
@@ -312,5 +374,6 @@ async def delete_menu_item(
     
     # Delete the menu item
     await db.execute("DELETE FROM menu_items WHERE id = $1", item_id)
+    await menu_item_cache.invalidate(db, item_id)
     
     return {"message": "Menu item deleted successfully"} 
\ No newline at end of file
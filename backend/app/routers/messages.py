@@ -1,12 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from typing import List, Optional
 import asyncpg
 from app.database import get_db
-from app.models import Message, MessageCreate, User
+from app.models import Conversation, ConversationRead, Message, MessageCreate, User
 from app.dependencies import get_current_active_user
+from app.utils.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
 
 router = APIRouter(prefix="/messages", tags=["messages"])
 
+DEFAULT_MESSAGE_PAGE_SIZE = 50
+MAX_MESSAGE_PAGE_SIZE = 200
+MAX_INBOX_PAGE_SIZE = 100
+
+CONVERSATION_COLUMNS = """
+    order_id, last_message_id, last_sender_id, last_message_preview,
+    last_activity_at, last_read_message_id, unread_count
+"""
+
+def _conversation(record: asyncpg.Record) -> Conversation:
+    return Conversation(
+        order_id=record['order_id'],
+        last_message_id=record['last_message_id'],
+        last_sender_id=record['last_sender_id'],
+        last_message_preview=record['last_message_preview'],
+        last_activity_at=record['last_activity_at'],
+        last_read_message_id=record['last_read_message_id'],
+        unread_count=record['unread_count']
+    )
+
 @router.post("/", response_model=Message)
 async def create_message(
     message: MessageCreate,
@@ -66,14 +87,19 @@ async def create_message(
 @router.get("/order/{order_id}", response_model=List[Message])
 async def get_order_messages(
     order_id: int,
+    after: Optional[int] = None,
+    before: Optional[int] = None,
+    limit: int = DEFAULT_MESSAGE_PAGE_SIZE,
     current_user: User = Depends(get_current_active_user),
     db: asyncpg.Connection = Depends(get_db)
 ):
-    """Get all messages for a specific order"""
+    """Get an order's messages, oldest first: the latest page, the page after `after` or the page before `before` (message ids)"""
+    limit = max(1, min(limit, MAX_MESSAGE_PAGE_SIZE))
+    
     # Check if order exists and user has access to it
     order_check = await db.fetchrow(
         """
-        SELECT o.id, o.buyer_id, o.cook_id, cp.user_id as cook_user_id
+        SELECT o.id, o.buyer_id, o.cook_id, o.created_at, cp.user_id as cook_user_id
         FROM orders o
         JOIN cook_profiles cp ON o.cook_id = cp.id
         WHERE o.id = $1
@@ -97,16 +123,35 @@ async def get_order_messages(
             detail="You can only view messages for orders you're involved in"
         )
     
-    # Get messages
-    messages = await db.fetch(
-        """
+    # None predate the order, so older monthly partitions are skipped; ids come from one
+    # sequence, so (order_id, id) pages through a thread in posting order
+    query = """
         SELECT id, order_id, sender_id, content, created_at
         FROM messages
-        WHERE order_id = $1
-        ORDER BY created_at ASC
-        """,
-        order_id
-    )
+        WHERE order_id = $1 AND created_at >= $2
+    """
+    params = [order_id, order_check['created_at']]
+    param_count = 3
+    
+    if after is not None:
+        query += f" AND id > ${param_count}"
+        params.append(after)
+        param_count += 1
+    
+    if before is not None:
+        query += f" AND id < ${param_count}"
+        params.append(before)
+        param_count += 1
+    
+    # New messages are read forwards from `after`; otherwise the page nearest `before` (or the
+    # end of the thread) is read backwards and put back in order
+    direction = "ASC" if after is not None else "DESC"
+    query += f" ORDER BY id {direction} LIMIT ${param_count}"
+    params.append(limit)
+    
+    messages = await db.fetch(query, *params)
+    if after is None:
+        messages = list(reversed(messages))
     
     return [
         Message(
@@ -119,6 +164,78 @@ async def get_order_messages(
         for msg in messages
     ]
 
+@router.get("/inbox", response_model=List[Conversation])
+async def get_inbox(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = 20,
+    current_user: User = Depends(get_current_active_user),
+    db: asyncpg.Connection = Depends(get_db)
+):
+    """The current user's conversations, most recent activity first; pass X-Next-Cursor as cursor for the next page"""
+    limit = max(1, min(limit, MAX_INBOX_PAGE_SIZE))
+    after = decode_cursor(cursor)
+    
+    query = f"SELECT {CONVERSATION_COLUMNS} FROM conversations WHERE user_id = $1"
+    params = [current_user.id]
+    param_count = 2
+    
+    if after:
+        query += f" AND (last_activity_at, order_id) < (${param_count}, ${param_count + 1})"
+        params.extend(after)
+        param_count += 2
+    
+    # One row more than the page, to know whether another page follows
+    query += f" ORDER BY last_activity_at DESC, order_id DESC LIMIT ${param_count}"
+    params.append(limit + 1)
+    
+    records = await db.fetch(query, *params)
+    
+    if len(records) > limit:
+        records = records[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(records[-1]['last_activity_at'], records[-1]['order_id'])
+    
+    return [_conversation(record) for record in records]
+
+@router.post("/order/{order_id}/read", response_model=Conversation)
+async def mark_conversation_read(
+    order_id: int,
+    read: ConversationRead,
+    current_user: User = Depends(get_current_active_user),
+    db: asyncpg.Connection = Depends(get_db)
+):
+    """Move the current user's read marker for an order's thread (never backwards); without an id, to its last message"""
+    # Unread messages are those from the other participant after the marker; counting them
+    # reads only the (order_id, id) index range past it
+    record = await db.fetchrow(
+        f"""
+        UPDATE conversations c
+        SET last_read_message_id = marker.id,
+            unread_count = (
+                SELECT COUNT(*) FROM messages m
+                WHERE m.order_id = c.order_id AND m.id > marker.id AND m.sender_id <> c.user_id
+            )
+        FROM (
+            SELECT GREATEST(last_read_message_id, LEAST(COALESCE($3, last_message_id), last_message_id)) AS id
+            FROM conversations
+            WHERE user_id = $1 AND order_id = $2
+        ) marker
+        WHERE c.user_id = $1 AND c.order_id = $2
+        RETURNING {CONVERSATION_COLUMNS}
+        """,
+        current_user.id,
+        order_id,
+        read.last_read_message_id
+    )
+    
+    if not record:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Conversation not found"
+        )
+    
+    return _conversation(record)
+
 @router.get("/", response_model=List[Message])
 async def get_user_messages(
     skip: int = 0,
@@ -127,31 +244,20 @@ async def get_user_messages(
     db: asyncpg.Connection = Depends(get_db)
 ):
     """Get all messages for orders the current user is involved in"""
-    # Get user's cook profile ID if they have one
-    cook_profile = await db.fetchrow(
-        "SELECT id FROM cook_profiles WHERE user_id = $1",
-        current_user.id
-    )
-    
-    # Build query to get messages from orders user is involved in
-    base_query = """
+    # The user's conversations list the orders they message on as buyer or as cook, so this
+    # needs no OR across orders.buyer_id and orders.cook_id
+    messages = await db.fetch(
+        """
         SELECT m.id, m.order_id, m.sender_id, m.content, m.created_at
         FROM messages m
-        JOIN orders o ON m.order_id = o.id
-        WHERE (o.buyer_id = $1
-    """
-    params = [current_user.id]
-    param_count = 2
-    
-    if cook_profile:
-        base_query += f" OR o.cook_id = ${param_count}"
-        params.append(cook_profile['id'])
-        param_count += 1
-    
-    base_query += f") ORDER BY m.created_at DESC LIMIT ${param_count} OFFSET ${param_count + 1}"
-    params.extend([limit, skip])
-    
-    messages = await db.fetch(base_query, *params)
+        WHERE m.order_id IN (SELECT order_id FROM conversations WHERE user_id = $1)
+        ORDER BY m.created_at DESC
+        LIMIT $2 OFFSET $3
+        """,
+        current_user.id,
+        limit,
+        skip
+    )
     
     return [
         Message(
@@ -162,4 +268,4 @@ async def get_user_messages(
             created_at=msg['created_at']
         )
         for msg in messages
-    ] 
\ No newline at end of file
+    ]
@@ -1,19 +1,79 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
 from typing import List, Optional, Any
+from datetime import date, datetime, time, timedelta, timezone
 import asyncpg
-from app.database import get_db
-from app.models import Order, OrderCreate, OrderUpdate, OrderStatus, User, BatchOrderCreate, BatchOrder
+import json
+from app.caches import prep_sheet_cache, prep_sheet_key
+from app.database import get_db, acquire_connection
+from app.models import (
+    Order, OrderCreate, OrderUpdate, OrderStatus, OrderStatusBulkUpdate, ORDER_STATUS_TRANSITIONS,
+    User, BatchOrderCreate, BatchOrder
+)
+from app.config import settings
 from app.dependencies import get_current_active_user
+from app.utils.capacity import SoldOut, mark_sold_out, reserve_portions
+from app.jobs import enqueue
+from app.utils.idempotency import (
+    IDEMPOTENCY_HEADER, IdempotencyConflict, request_fingerprint, stored_response, store_response
+)
+from app.utils.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
 
 router = APIRouter(prefix="/orders", tags=["orders"])
 
+MAX_BATCH_PAGE_SIZE = 100
+
+# Orders the cook still has to prepare or hand over
+OPEN_ORDER_STATUSES = (OrderStatus.PENDING, OrderStatus.PREPARING, OrderStatus.READY)
+
+# Each batch with its orders and their menu items, aggregated in one query. The orders of a
+# batch are inserted in the batch's transaction (same NOW()), so bounding them by the batch's
+# created_at lets the per-batch lookup skip older monthly partitions.
+BATCH_ORDER_QUERY = """
+    SELECT b.id, b.buyer_id, b.total_price, b.status, b.created_at, b.updated_at,
+           COALESCE(items.orders, '[]') AS orders
+    FROM batch_orders b
+    LEFT JOIN LATERAL (
+        SELECT json_agg(json_build_object(
+            'id', o.id, 'buyer_id', o.buyer_id, 'menu_item_id', o.menu_item_id, 'cook_id', o.cook_id,
+            'quantity', o.quantity, 'total_price', o.total_price, 'status', o.status,
+            'special_instructions', o.special_instructions, 'batch_order_id', o.batch_order_id,
+            'created_at', o.created_at, 'updated_at', o.updated_at, 'archived', o.archived, 'version', o.version,
+            'menuItem', json_build_object(
+                'id', mi.id, 'title', mi.title, 'description', mi.description,
+                'price', mi.price, 'photo_url', mi.photo_url
+            )
+        ) ORDER BY o.id) AS orders
+        FROM orders o
+        JOIN menu_items mi ON o.menu_item_id = mi.id
+        WHERE o.batch_order_id = b.id AND o.created_at >= b.created_at
+    ) items ON true
+"""
+
+def _batch_order(record: asyncpg.Record) -> BatchOrder:
+    return BatchOrder(
+        id=record['id'],
+        buyer_id=record['buyer_id'],
+        total_price=record['total_price'],
+        status=record['status'],
+        created_at=record['created_at'],
+        updated_at=record['updated_at'],
+        orders=json.loads(record['orders'])
+    )
+
 @router.post("/batch", response_model=List[Order])
 async def place_batch_order(
     batch_order: BatchOrderCreate,
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER, min_length=1, max_length=255),
     current_user: User = Depends(get_current_active_user),
     db: asyncpg.Connection = Depends(get_db)
 ):
-    """Place multiple orders as a batch"""
+    """Place multiple orders as a batch; a retry with the same Idempotency-Key replays the first response"""
+    if idempotency_key:
+        fingerprint = request_fingerprint("POST /orders/batch", batch_order)
+        replay = await stored_response(db, current_user.id, idempotency_key, fingerprint)
+        if replay:
+            return replay
+    
     if not batch_order.items:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -29,7 +89,7 @@ async def place_batch_order(
         # Get menu item details and cook info
         menu_item = await db.fetchrow(
             """
-            SELECT mi.id, mi.cook_id, mi.title, mi.price, mi.is_available, cp.user_id as cook_user_id
+            SELECT mi.id, mi.cook_id, mi.title, mi.price, mi.is_available, mi.daily_capacity, cp.user_id as cook_user_id
             FROM menu_items mi
             JOIN cook_profiles cp ON mi.cook_id = cp.id
             WHERE mi.id = $1
@@ -75,84 +135,128 @@ async def place_batch_order(
     
     cook_id = list(cook_ids)[0]
     
+    # Portions per capped item, reserved in menu item id order so concurrent batches that
+    # share dishes take their shard locks in the same order
+    capped_items = {}
+    capped_portions = {}
+    for validated_item in validated_items:
+        menu_item = validated_item['menu_item']
+        if menu_item['daily_capacity'] is not None:
+            capped_items[menu_item['id']] = menu_item
+            capped_portions[menu_item['id']] = capped_portions.get(menu_item['id'], 0) + validated_item['item'].quantity
+    
     # Create a single batch order with all items
-    async with db.transaction():
-        # Create the batch order first
-        batch_query = """
-            INSERT INTO batch_orders (buyer_id, total_price, status, created_at, updated_at)
-            VALUES ($1, $2, $3, NOW(), NOW())
-            RETURNING id, buyer_id, total_price, status, created_at, updated_at
-        """
-        
-        batch_record = await db.fetchrow(
-            batch_query,
-            current_user.id,
-            total_price,
-            OrderStatus.PENDING.value
-        )
-        
-        if not batch_record:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to create batch order"
-            )
-        
-        batch_order_id = batch_record['id']
-        created_orders = []
-        
-        # Create individual order records linked to the batch
-        for validated_item in validated_items:
-            item = validated_item['item']
-            menu_item = validated_item['menu_item']
-            item_total = validated_item['item_total']
+    try:
+        async with db.transaction():
+            for menu_item_id in sorted(capped_items):
+                menu_item = capped_items[menu_item_id]
+                await reserve_portions(
+                    db, menu_item_id, menu_item['title'], capped_portions[menu_item_id], menu_item['daily_capacity']
+                )
             
-            # Create order linked to batch
-            order_query = """
-                INSERT INTO orders (buyer_id, menu_item_id, cook_id, quantity, total_price, status, special_instructions, batch_order_id, created_at, updated_at)
-                VALUES ($1, $2, $3, $4, $5, $6, $7, $8, NOW(), NOW())
-                RETURNING id, buyer_id, menu_item_id, cook_id, quantity, total_price, status, special_instructions, batch_order_id, created_at, updated_at
+            # Create the batch order first
+            batch_query = """
+                INSERT INTO batch_orders (buyer_id, total_price, status, created_at, updated_at)
+                VALUES ($1, $2, $3, NOW(), NOW())
+                RETURNING id, buyer_id, total_price, status, created_at, updated_at
             """
             
-            order_record = await db.fetchrow(
-                order_query,
+            batch_record = await db.fetchrow(
+                batch_query,
                 current_user.id,
-                item.menu_item_id,
-                menu_item['cook_id'],
-                item.quantity,
-                item_total,
-                OrderStatus.PENDING.value,
-                item.special_instructions,
-                batch_order_id
+                total_price,
+                OrderStatus.PENDING.value
             )
             
-            if order_record:
-                created_orders.append(Order(
-                    id=order_record['id'],
-                    buyer_id=order_record['buyer_id'],
-                    menu_item_id=order_record['menu_item_id'],
-                    cook_id=order_record['cook_id'],
-                    quantity=order_record['quantity'],
-                    total_price=order_record['total_price'],
-                    status=order_record['status'],
-                    special_instructions=order_record['special_instructions'],
-                    batch_order_id=order_record['batch_order_id'],
-                    created_at=order_record['created_at'],
-                    updated_at=order_record['updated_at']
-                ))
+            if not batch_record:
+                raise HTTPException(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    detail="Failed to create batch order"
+                )
+            
+            batch_order_id = batch_record['id']
+            created_orders = []
+            
+            # Create individual order records linked to the batch
+            for validated_item in validated_items:
+                item = validated_item['item']
+                menu_item = validated_item['menu_item']
+                item_total = validated_item['item_total']
+            
+                # Create order linked to batch
+                order_query = """
+                    INSERT INTO orders (buyer_id, menu_item_id, cook_id, quantity, total_price, status, special_instructions, batch_order_id, capacity_reserved, created_at, updated_at)
+                    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, NOW(), NOW())
+                    RETURNING id, buyer_id, menu_item_id, cook_id, quantity, total_price, status, special_instructions, batch_order_id, created_at, updated_at
+                """
+            
+                order_record = await db.fetchrow(
+                    order_query,
+                    current_user.id,
+                    item.menu_item_id,
+                    menu_item['cook_id'],
+                    item.quantity,
+                    item_total,
+                    OrderStatus.PENDING.value,
+                    item.special_instructions,
+                    batch_order_id,
+                    menu_item['daily_capacity'] is not None
+                )
+            
+                if order_record:
+                    created_orders.append(Order(
+                        id=order_record['id'],
+                        buyer_id=order_record['buyer_id'],
+                        menu_item_id=order_record['menu_item_id'],
+                        cook_id=order_record['cook_id'],
+                        quantity=order_record['quantity'],
+                        total_price=order_record['total_price'],
+                        status=order_record['status'],
+                        special_instructions=order_record['special_instructions'],
+                        batch_order_id=order_record['batch_order_id'],
+                        created_at=order_record['created_at'],
+                        updated_at=order_record['updated_at']
+                    ))
+            
+            # Notify the cook in the background; the job only exists if this transaction commits
+            await enqueue(db, "orders.placed", {
+                'order_ids': [created_order.id for created_order in created_orders],
+                'batch_order_id': batch_order_id,
+                'cook_id': cook_id
+            })
+            await prep_sheet_cache.invalidate(db, prep_sheet_key(cook_id, batch_record['created_at']))
+            
+            if idempotency_key:
+                await store_response(db, current_user.id, idempotency_key, fingerprint, created_orders)
+    except IdempotencyConflict:
+        return await stored_response(db, current_user.id, idempotency_key, fingerprint)
+    except SoldOut as sold_out:
+        await mark_sold_out(db, sold_out.menu_item_id)
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Menu item {sold_out.title} is sold out for today"
+        )
     
     return created_orders
 
 @router.post("/", response_model=Order)
 async def place_order(
     order: OrderCreate,
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER, min_length=1, max_length=255),
     current_user: User = Depends(get_current_active_user),
     db: asyncpg.Connection = Depends(get_db)
 ):
-    """Place a new order (single item)"""
+    """Place a new order (single item); a retry with the same Idempotency-Key replays the first response"""
+    if idempotency_key:
+        fingerprint = request_fingerprint("POST /orders/", order)
+        replay = await stored_response(db, current_user.id, idempotency_key, fingerprint)
+        if replay:
+            return replay
+    
     # Get menu item details and cook info
     menu_item = await db.fetchrow(
         """
-        SELECT mi.id, mi.cook_id, mi.title, mi.price, mi.is_available, cp.user_id as cook_user_id
+        SELECT mi.id, mi.cook_id, mi.title, mi.price, mi.is_available, mi.daily_capacity, cp.user_id as cook_user_id
         FROM menu_items mi
         JOIN cook_profiles cp ON mi.cook_id = cp.id
         WHERE mi.id = $1
@@ -184,40 +288,66 @@ async def place_order(
     
     # Create order
     query = """
-        INSERT INTO orders (buyer_id, menu_item_id, cook_id, quantity, total_price, status, special_instructions, created_at, updated_at)
-        VALUES ($1, $2, $3, $4, $5, $6, $7, NOW(), NOW())
+        INSERT INTO orders (buyer_id, menu_item_id, cook_id, quantity, total_price, status, special_instructions, capacity_reserved, created_at, updated_at)
+        VALUES ($1, $2, $3, $4, $5, $6, $7, $8, NOW(), NOW())
         RETURNING id, buyer_id, menu_item_id, cook_id, quantity, total_price, status, special_instructions, created_at, updated_at
     """
     
-    order_record = await db.fetchrow(
-        query,
-        current_user.id,
-        order.menu_item_id,
-        menu_item['cook_id'],
-        order.quantity,
-        total_price,
-        OrderStatus.PENDING.value,
-        order.special_instructions
-    )
-    
-    if not order_record:
+    try:
+        async with db.transaction():
+            if menu_item['daily_capacity'] is not None:
+                await reserve_portions(db, menu_item['id'], menu_item['title'], order.quantity, menu_item['daily_capacity'])
+            
+            order_record = await db.fetchrow(
+                query,
+                current_user.id,
+                order.menu_item_id,
+                menu_item['cook_id'],
+                order.quantity,
+                total_price,
+                OrderStatus.PENDING.value,
+                order.special_instructions,
+                menu_item['daily_capacity'] is not None
+            )
+            
+            if not order_record:
+                raise HTTPException(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    detail="Failed to create order"
+                )
+            
+            await enqueue(db, "orders.placed", {
+                'order_ids': [order_record['id']],
+                'batch_order_id': None,
+                'cook_id': menu_item['cook_id']
+            })
+            await prep_sheet_cache.invalidate(db, prep_sheet_key(order_record['cook_id'], order_record['created_at']))
+            
+            placed_order = Order(
+                id=order_record['id'],
+                buyer_id=order_record['buyer_id'],
+                menu_item_id=order_record['menu_item_id'],
+                cook_id=order_record['cook_id'],
+                quantity=order_record['quantity'],
+                total_price=order_record['total_price'],
+                status=order_record['status'],
+                special_instructions=order_record['special_instructions'],
+                created_at=order_record['created_at'],
+                updated_at=order_record['updated_at']
+            )
+            
+            if idempotency_key:
+                await store_response(db, current_user.id, idempotency_key, fingerprint, placed_order)
+    except IdempotencyConflict:
+        return await stored_response(db, current_user.id, idempotency_key, fingerprint)
+    except SoldOut:
+        await mark_sold_out(db, menu_item['id'])
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to create order"
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Menu item is sold out for today"
         )
     
-    return Order(
-        id=order_record['id'],
-        buyer_id=order_record['buyer_id'],
-        menu_item_id=order_record['menu_item_id'],
-        cook_id=order_record['cook_id'],
-        quantity=order_record['quantity'],
-        total_price=order_record['total_price'],
-        status=order_record['status'],
-        special_instructions=order_record['special_instructions'],
-        created_at=order_record['created_at'],
-        updated_at=order_record['updated_at']
-    )
+    return placed_order
 
 @router.get("/", response_model=List[dict])
 async def get_orders(
@@ -225,10 +355,11 @@ async def get_orders(
     limit: int = 100,
     status_filter: Optional[OrderStatus] = None,
     as_cook: bool = False,
+    include_archived: bool = False,
     current_user: User = Depends(get_current_active_user),
     db: asyncpg.Connection = Depends(get_db)
 ):
-    """Get orders for current user with enhanced information"""
+    """Get orders for current user with enhanced information; archived orders only on request"""
     
     if as_cook:
         # Get orders where current user is the cook
@@ -243,7 +374,7 @@ async def get_orders(
         base_query = """
             SELECT 
                 o.id, o.buyer_id, o.menu_item_id, o.cook_id, o.quantity, 
-                o.total_price, o.status, o.special_instructions, o.created_at, o.updated_at,
+                o.total_price, o.status, o.special_instructions, o.created_at, o.updated_at, o.archived, o.version,
                 mi.title as menu_item_title, mi.description as menu_item_description, 
                 mi.price as menu_item_price, mi.photo_url as menu_item_photo,
                 u.full_name as buyer_name, u.email as buyer_email
@@ -259,7 +390,7 @@ async def get_orders(
         base_query = """
             SELECT 
                 o.id, o.buyer_id, o.menu_item_id, o.cook_id, o.quantity, 
-                o.total_price, o.status, o.special_instructions, o.created_at, o.updated_at,
+                o.total_price, o.status, o.special_instructions, o.created_at, o.updated_at, o.archived, o.version,
                 mi.title as menu_item_title, mi.description as menu_item_description, 
                 mi.price as menu_item_price, mi.photo_url as menu_item_photo,
                 cp.name as cook_name, u.full_name as cook_full_name
@@ -272,6 +403,10 @@ async def get_orders(
         params = [current_user.id]
         param_count = 2
     
+    if not include_archived:
+        # A literal, so the plan never includes the orders_archive partition
+        base_query += " AND NOT o.archived"
+    
     if status_filter:
         base_query += f" AND o.status = ${param_count}"
         params.append(status_filter.value)  # type: ignore
@@ -295,6 +430,8 @@ async def get_orders(
             'special_instructions': order['special_instructions'],
             'created_at': order['created_at'],
             'updated_at': order['updated_at'],
+            'archived': order['archived'],
+            'version': order['version'],
             'menuItem': {
                 'id': order['menu_item_id'],
                 'title': order['menu_item_title'],
@@ -315,6 +452,153 @@ async def get_orders(
     
     return result
 
+@router.get("/batches", response_model=List[BatchOrder])
+async def get_batch_orders(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = 20,
+    status_filter: Optional[OrderStatus] = None,
+    current_user: User = Depends(get_current_active_user),
+    db: asyncpg.Connection = Depends(get_db)
+):
+    """Get the current user's batch orders with their orders, newest first; pass X-Next-Cursor as cursor for the next page"""
+    limit = max(1, min(limit, MAX_BATCH_PAGE_SIZE))
+    after = decode_cursor(cursor)
+    
+    query = BATCH_ORDER_QUERY + " WHERE b.buyer_id = $1"
+    params: List[Any] = [current_user.id]
+    param_count = 2
+    
+    if after:
+        query += f" AND (b.created_at, b.id) < (${param_count}, ${param_count + 1})"
+        params.extend(after)
+        param_count += 2
+    
+    if status_filter:
+        query += f" AND b.status = ${param_count}"
+        params.append(status_filter.value)
+        param_count += 1
+    
+    # One extra row tells whether there is a next page
+    query += f" ORDER BY b.created_at DESC, b.id DESC LIMIT ${param_count}"
+    params.append(limit + 1)
+    
+    records = await db.fetch(query, *params)
+    
+    if len(records) > limit:
+        records = records[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(records[-1]['created_at'], records[-1]['id'])
+    
+    return [_batch_order(record) for record in records]
+
+@router.get("/batches/{batch_order_id}", response_model=BatchOrder)
+async def get_batch_order(
+    batch_order_id: int,
+    current_user: User = Depends(get_current_active_user),
+    db: asyncpg.Connection = Depends(get_db)
+):
+    """Get a batch order with its orders; visible to its buyer and its cook"""
+    record = await db.fetchrow(
+        BATCH_ORDER_QUERY + """
+        WHERE b.id = $1 AND (b.buyer_id = $2 OR EXISTS (
+            SELECT 1 FROM orders o JOIN cook_profiles cp ON o.cook_id = cp.id
+            WHERE o.batch_order_id = b.id AND o.created_at >= b.created_at AND cp.user_id = $2
+        ))
+        """,
+        batch_order_id, current_user.id
+    )
+    
+    if not record:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Batch order not found or access denied"
+        )
+    
+    return _batch_order(record)
+
+@router.get("/prep-sheet")
+async def get_prep_sheet(
+    day: Optional[date] = Query(None, alias="date"),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Portions to prepare per menu item and status for the cook's open orders placed on `date` (UTC, default today)"""
+    # Released before the cache lookup: a miss borrows its own connection in load_prep_sheet
+    async with acquire_connection() as db:
+        cook_profile = await db.fetchrow(
+            "SELECT id FROM cook_profiles WHERE user_id = $1",
+            current_user.id
+        )
+    
+    if not cook_profile:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Cook profile not found"
+        )
+    
+    day_start = datetime.combine(day or datetime.now(timezone.utc).date(), time.min, tzinfo=timezone.utc)
+    # Cached until an order of this cook placed that day changes (see app/caches.py)
+    return await prep_sheet_cache.get_or_load(
+        prep_sheet_key(cook_profile['id'], day_start),
+        lambda: load_prep_sheet(cook_profile['id'], day_start)
+    )
+
+async def load_prep_sheet(cook_id: int, day_start: datetime) -> dict:
+    async with acquire_connection() as db:
+        # One GROUP BY over idx_orders_cook_status_created; menu items are joined to the groups
+        groups = await db.fetch(
+            """
+            SELECT g.menu_item_id, mi.title, g.status, g.special_instructions, g.quantity, g.orders
+            FROM (
+                SELECT menu_item_id, status, NULLIF(btrim(special_instructions), '') AS special_instructions,
+                       SUM(quantity) AS quantity, COUNT(*) AS orders
+                FROM orders
+                WHERE cook_id = $1 AND NOT archived AND status = ANY($2::varchar[])
+                  AND created_at >= $3 AND created_at < $4
+                GROUP BY 1, 2, 3
+            ) g
+            JOIN menu_items mi ON g.menu_item_id = mi.id
+            ORDER BY mi.title, g.menu_item_id
+            """,
+            cook_id, [open_status.value for open_status in OPEN_ORDER_STATUSES], day_start, day_start + timedelta(days=1)
+        )
+    
+    totals = {open_status.value: 0 for open_status in OPEN_ORDER_STATUSES}
+    items = {}
+    instructions = {}
+    for group in groups:
+        item = items.get(group['menu_item_id'])
+        if item is None:
+            item = items[group['menu_item_id']] = {
+                'menu_item_id': group['menu_item_id'],
+                'title': group['title'],
+                'total_quantity': 0,
+                'by_status': {open_status.value: 0 for open_status in OPEN_ORDER_STATUSES},
+                'special_instructions': []
+            }
+        item['total_quantity'] += group['quantity']
+        item['by_status'][group['status']] += group['quantity']
+        totals[group['status']] += group['quantity']
+        
+        # The same instruction on orders in different statuses is listed once
+        if group['special_instructions']:
+            key = (group['menu_item_id'], group['special_instructions'])
+            instruction = instructions.get(key)
+            if instruction is None:
+                instruction = instructions[key] = {'text': group['special_instructions'], 'quantity': 0, 'orders': 0}
+                item['special_instructions'].append(instruction)
+            instruction['quantity'] += group['quantity']
+            instruction['orders'] += group['orders']
+    
+    for item in items.values():
+        item['special_instructions'].sort(key=lambda instruction: -instruction['quantity'])
+    
+    return {
+        'date': day_start.date().isoformat(),
+        'cook_id': cook_id,
+        'totals': totals,
+        'items': list(items.values())
+    }
+
 @router.get("/{order_id}", response_model=Order)
 async def get_order(
     order_id: int,
@@ -330,7 +614,7 @@ async def get_order(
     
     # Build query to check if user has access to this order
     query = """
-        SELECT id, buyer_id, menu_item_id, cook_id, quantity, total_price, status, special_instructions, created_at, updated_at
+        SELECT id, buyer_id, menu_item_id, cook_id, quantity, total_price, status, special_instructions, batch_order_id, created_at, updated_at, archived, version
         FROM orders
         WHERE id = $1 AND (buyer_id = $2
     """
@@ -359,8 +643,11 @@ async def get_order(
         total_price=order_record['total_price'],
         status=order_record['status'],
         special_instructions=order_record['special_instructions'],
+        batch_order_id=order_record['batch_order_id'],
         created_at=order_record['created_at'],
-        updated_at=order_record['updated_at']
+        updated_at=order_record['updated_at'],
+        archived=order_record['archived'],
+        version=order_record['version']
     )
 
 @router.put("/{order_id}", response_model=Order)
@@ -370,11 +657,73 @@ async def update_order(
     current_user: User = Depends(get_current_active_user),
     db: asyncpg.Connection = Depends(get_db)
 ):
-    """Update order status or special instructions"""
-    # Get order details with cook info
+    """Update order status (cook) or special instructions (buyer); pass `version` to fail with 409 on concurrent edits"""
+    # Only cooks can update status, buyers can update special instructions. A user is never
+    # both for one order (ordering your own items is refused), so the UPDATE's WHERE clause
+    # checks permission, the status transition and the version without a prior read.
+    new_status = order_update.status.value if order_update.status else None
+    new_instructions = order_update.special_instructions or None
+    
+    if new_status is None and new_instructions is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No valid fields to update"
+        )
+    
+    # The statuses the new status can be reached from
+    from_statuses = [
+        from_status.value for from_status, to_statuses in ORDER_STATUS_TRANSITIONS.items()
+        if order_update.status in to_statuses
+    ]
+    
+    updated_order = await db.fetchrow(
+        """
+        UPDATE orders o
+        SET status = CASE WHEN o.cook_id = me.cook_id AND $3::varchar IS NOT NULL THEN $3 ELSE o.status END,
+            special_instructions = CASE WHEN o.buyer_id = $2 AND $4::text IS NOT NULL THEN $4 ELSE o.special_instructions END,
+            updated_at = NOW()
+        FROM (SELECT (SELECT id FROM cook_profiles WHERE user_id = $2) AS cook_id) me
+        WHERE o.id = $1
+          AND ($6::int IS NULL OR o.version = $6)
+          AND (($3::varchar IS NOT NULL AND o.cook_id = me.cook_id AND o.status = ANY($5::varchar[]))
+               OR ($4::text IS NOT NULL AND o.buyer_id = $2))
+        RETURNING o.id, o.buyer_id, o.menu_item_id, o.cook_id, o.quantity, o.total_price, o.status,
+                  o.special_instructions, o.batch_order_id, o.created_at, o.updated_at, o.archived, o.version
+        """,
+        order_id, current_user.id, new_status, new_instructions, from_statuses, order_update.version
+    )
+    
+    if not updated_order:
+        raise await _update_refused(db, order_id, current_user, order_update)
+    
+    await prep_sheet_cache.invalidate(db, prep_sheet_key(updated_order['cook_id'], updated_order['created_at']))
+    
+    return Order(
+        id=updated_order['id'],
+        buyer_id=updated_order['buyer_id'],
+        menu_item_id=updated_order['menu_item_id'],
+        cook_id=updated_order['cook_id'],
+        quantity=updated_order['quantity'],
+        total_price=updated_order['total_price'],
+        status=updated_order['status'],
+        special_instructions=updated_order['special_instructions'],
+        batch_order_id=updated_order['batch_order_id'],
+        created_at=updated_order['created_at'],
+        updated_at=updated_order['updated_at'],
+        archived=updated_order['archived'],
+        version=updated_order['version']
+    )
+
+async def _update_refused(
+    db: asyncpg.Connection,
+    order_id: int,
+    current_user: User,
+    order_update: OrderUpdate
+) -> HTTPException:
+    """Why an order update matched no row; only read on the failure path"""
     order_check = await db.fetchrow(
         """
-        SELECT o.id, o.buyer_id, o.cook_id, o.status, cp.user_id as cook_user_id
+        SELECT o.buyer_id, o.status, o.version, cp.user_id as cook_user_id
         FROM orders o
         JOIN cook_profiles cp ON o.cook_id = cp.id
         WHERE o.id = $1
@@ -383,71 +732,120 @@ async def update_order(
     )
     
     if not order_check:
-        raise HTTPException(
+        return HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Order not found"
         )
     
-    # Check permissions
     is_cook = order_check['cook_user_id'] == current_user.id
     is_buyer = order_check['buyer_id'] == current_user.id
     
     if not (is_cook or is_buyer):
-        raise HTTPException(
+        return HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You don't have permission to update this order"
         )
     
-    # Only cooks can update status, buyers can update special instructions
-    update_fields = []
-    params = []
-    param_count = 1
-    
-    if order_update.status and is_cook:
-        update_fields.append(f"status = ${param_count}")
-        params.append(order_update.status.value)
-        param_count += 1
-    
-    if order_update.special_instructions and is_buyer:
-        update_fields.append(f"special_instructions = ${param_count}")
-        params.append(order_update.special_instructions)
-        param_count += 1
-    
-    if not update_fields:
-        raise HTTPException(
+    if not (order_update.status and is_cook) and not (order_update.special_instructions and is_buyer):
+        return HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="No valid fields to update"
         )
     
-    # Add updated_at
-    update_fields.append(f"updated_at = NOW()")
+    if order_update.version is not None and order_update.version != order_check['version']:
+        return HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Order was changed by someone else (now version {order_check['version']}); reload and retry"
+        )
     
-    # Build and execute update query
-    query = f"""
-        UPDATE orders 
-        SET {', '.join(update_fields)}
-        WHERE id = ${param_count}
-        RETURNING id, buyer_id, menu_item_id, cook_id, quantity, total_price, status, special_instructions, created_at, updated_at
-    """
-    params.append(order_id)
+    if order_update.status and is_cook and order_update.status not in ORDER_STATUS_TRANSITIONS[OrderStatus(order_check['status'])]:
+        return HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Order cannot move from {order_check['status']} to {order_update.status.value}"
+        )
     
-    updated_order = await db.fetchrow(query, *params)
+    # The order changed between the UPDATE and this read
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="Order was changed by someone else; reload and retry"
+    )
+
+@router.patch("/status", response_model=List[Order])
+async def update_order_statuses(
+    bulk_update: OrderStatusBulkUpdate,
+    current_user: User = Depends(get_current_active_user),
+    db: asyncpg.Connection = Depends(get_db)
+):
+    """Move several of the cook's orders to one status; orders that are not theirs or cannot make that transition are left out"""
+    if (bulk_update.order_ids is None) == (bulk_update.batch_order_id is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Provide either order_ids or batch_order_id"
+        )
     
-    if not updated_order:
+    if bulk_update.order_ids is not None:
+        if not bulk_update.order_ids:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="No orders to update"
+            )
+        if len(bulk_update.order_ids) > settings.orders_bulk_status_max:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"At most {settings.orders_bulk_status_max} orders can be updated at once"
+            )
+        selector = "o.id = ANY($2::int[])"
+        target = list(set(bulk_update.order_ids))
+    else:
+        selector = "o.batch_order_id = $2"
+        target = bulk_update.batch_order_id
+    
+    # The statuses the target status can be reached from
+    from_statuses = [
+        from_status.value for from_status, to_statuses in ORDER_STATUS_TRANSITIONS.items()
+        if bulk_update.status in to_statuses
+    ]
+    if not from_statuses:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to update order"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Orders cannot be moved to {bulk_update.status.value}"
         )
     
-    return Order(
-        id=updated_order['id'],
-        buyer_id=updated_order['buyer_id'],
-        menu_item_id=updated_order['menu_item_id'],
-        cook_id=updated_order['cook_id'],
-        quantity=updated_order['quantity'],
-        total_price=updated_order['total_price'],
-        status=updated_order['status'],
-        special_instructions=updated_order['special_instructions'],
-        created_at=updated_order['created_at'],
-        updated_at=updated_order['updated_at']
-    ) 
\ No newline at end of file
+    # Ownership and the transition are checked by the UPDATE itself; the order_changes event
+    # for each moved order is published by the trigger on orders when this commits
+    updated_orders = await db.fetch(
+        f"""
+        UPDATE orders o
+        SET status = $3, updated_at = NOW()
+        WHERE {selector}
+          AND o.cook_id = (SELECT id FROM cook_profiles WHERE user_id = $1)
+          AND o.status = ANY($4::varchar[])
+          AND NOT o.archived
+        RETURNING o.id, o.buyer_id, o.menu_item_id, o.cook_id, o.quantity, o.total_price, o.status,
+                  o.special_instructions, o.batch_order_id, o.created_at, o.updated_at, o.archived, o.version
+        """,
+        current_user.id, target, bulk_update.status.value, from_statuses
+    )
+    
+    await prep_sheet_cache.invalidate(db, *{
+        prep_sheet_key(updated_order['cook_id'], updated_order['created_at']) for updated_order in updated_orders
+    })
+    
+    return [
+        Order(
+            id=updated_order['id'],
+            buyer_id=updated_order['buyer_id'],
+            menu_item_id=updated_order['menu_item_id'],
+            cook_id=updated_order['cook_id'],
+            quantity=updated_order['quantity'],
+            total_price=updated_order['total_price'],
+            status=updated_order['status'],
+            special_instructions=updated_order['special_instructions'],
+            batch_order_id=updated_order['batch_order_id'],
+            created_at=updated_order['created_at'],
+            updated_at=updated_order['updated_at'],
+            archived=updated_order['archived'],
+            version=updated_order['version']
+        )
+        for updated_order in sorted(updated_orders, key=lambda record: record['id'])
+    ]
@@ -0,0 +1,215 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Optional, Tuple
+from datetime import datetime, timedelta
+import asyncpg
+import base64
+import re
+from app.config import settings
+from app.database import get_db
+from app.dependencies import get_current_active_user
+from app.models import BatchOrder, MenuItem, Message, Order, SyncChanges, User
+
+router = APIRouter(prefix="/sync", tags=["sync"])
+
+ORDER_COLUMNS = """
+    id, buyer_id, menu_item_id, cook_id, quantity, total_price, status, special_instructions,
+    batch_order_id, created_at, updated_at, archived, version
+"""
+
+# pg_snapshot text: xmin:xmax:xip,xip,...
+SNAPSHOT_PATTERN = re.compile(r"^(\d+):(\d+):((?:\d+(?:,\d+)*)?)$")
+
+# Written by a transaction the token's snapshot could not see; the first half lets the
+# (owner, change_xid) indexes skip everything older than the snapshot's oldest running writer
+CHANGED_SINCE = "{column} >= pg_snapshot_xmin($2::text::pg_snapshot) AND NOT pg_visible_in_snapshot({column}, $2::text::pg_snapshot)"
+
+def _changed_since(column: str = "change_xid") -> str:
+    return CHANGED_SINCE.format(column=column)
+
+def _valid_snapshot(snapshot: str) -> bool:
+    """Whether Postgres will accept `snapshot` as a pg_snapshot"""
+    match = SNAPSHOT_PATTERN.match(snapshot)
+    if not match:
+        return False
+    xmin, xmax = int(match.group(1)), int(match.group(2))
+    xip = [int(xid) for xid in match.group(3).split(",") if xid]
+    return 0 < xmin <= xmax and xip == sorted(xip) and all(xmin <= xid < xmax for xid in xip)
+
+def _encode_token(snapshot: str, issued_at: datetime) -> str:
+    return base64.urlsafe_b64encode(f"{snapshot}|{issued_at.isoformat()}".encode()).decode().rstrip("=")
+
+def _decode_token(token: Optional[str]) -> Optional[Tuple[Optional[str], datetime]]:
+    """The token's snapshot and issue time; the snapshot is None for tokens from before snapshots"""
+    if not token:
+        return None
+    try:
+        value = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+        snapshot, _, issued = value.rpartition("|")
+        issued_at = datetime.fromisoformat(issued)
+        if issued_at.tzinfo is None:
+            raise ValueError("token timestamp has no time zone")
+        if snapshot and not _valid_snapshot(snapshot):
+            raise ValueError("malformed snapshot")
+        return snapshot or None, issued_at
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid sync token"
+        )
+
+def _order(record: asyncpg.Record) -> Order:
+    return Order(
+        id=record['id'],
+        buyer_id=record['buyer_id'],
+        menu_item_id=record['menu_item_id'],
+        cook_id=record['cook_id'],
+        quantity=record['quantity'],
+        total_price=record['total_price'],
+        status=record['status'],
+        special_instructions=record['special_instructions'],
+        batch_order_id=record['batch_order_id'],
+        created_at=record['created_at'],
+        updated_at=record['updated_at'],
+        archived=record['archived'],
+        version=record['version']
+    )
+
+@router.get("", response_model=SyncChanges)
+async def sync(
+    since: Optional[str] = None,
+    current_user: User = Depends(get_current_active_user),
+    db: asyncpg.Connection = Depends(get_db)
+):
+    """Changes visible to the current user since `since`; without it, only a token to start from"""
+    since_token = _decode_token(since)
+    limit = settings.sync_max_changes
+    
+    # One snapshot for every query, and it becomes the next token. Every write stamps its rows
+    # with its transaction id (change_xid, migrations/0016_sync_change_xids.sql), so the next
+    # sync returns exactly the rows written by transactions this snapshot could not see: those
+    # still running now are picked up once they commit, however long they take.
+    async with db.transaction(isolation="repeatable_read", readonly=True):
+        clock = await db.fetchrow("SELECT pg_current_snapshot()::text AS snapshot, NOW() AS now")
+        token = _encode_token(clock['snapshot'], clock['now'])
+        
+        if since_token is None:
+            return SyncChanges(token=token)
+        snapshot, issued_at = since_token
+        
+        # Tombstones this old may already be purged; tokens from before snapshots cannot be compared
+        if snapshot is None or issued_at < clock['now'] - timedelta(days=settings.sync_tombstone_retention_days):
+            return SyncChanges(resync=True, token=token)
+        
+        cook_profile_id = await db.fetchval(
+            "SELECT id FROM cook_profiles WHERE user_id = $1 AND deleted_at IS NULL", current_user.id
+        )
+        
+        # One row more than the limit, to know whether it was exceeded
+        orders = await db.fetch(
+            f"""
+            SELECT {ORDER_COLUMNS} FROM orders
+            WHERE buyer_id = $1 AND {_changed_since()} AND NOT archived
+            ORDER BY change_xid LIMIT $3
+            """,
+            current_user.id, snapshot, limit + 1
+        )
+        menu_items = []
+        if cook_profile_id is not None:
+            orders += await db.fetch(
+                f"""
+                SELECT {ORDER_COLUMNS} FROM orders
+                WHERE cook_id = $1 AND {_changed_since()} AND NOT archived
+                ORDER BY change_xid LIMIT $3
+                """,
+                cook_profile_id, snapshot, limit + 1
+            )
+            # Only the caller's own menu; buyers load other cooks' menus as they browse them
+            menu_items = await db.fetch(
+                f"""
+                SELECT id, cook_id, title, description, price, photo_url, is_available, daily_capacity, created_at, updated_at
+                FROM menu_items
+                WHERE cook_id = $1 AND {_changed_since()}
+                ORDER BY change_xid LIMIT $3
+                """,
+                cook_profile_id, snapshot, limit + 1
+            )
+        
+        batch_orders = await db.fetch(
+            f"""
+            SELECT id, buyer_id, total_price, status, created_at, updated_at
+            FROM batch_orders
+            WHERE buyer_id = $1 AND {_changed_since()}
+            ORDER BY change_xid LIMIT $3
+            """,
+            current_user.id, snapshot, limit + 1
+        )
+        
+        # Threads with new messages, from the user's conversations, then their new messages
+        messages = await db.fetch(
+            f"""
+            SELECT m.id, m.order_id, m.sender_id, m.content, m.created_at
+            FROM conversations c
+            JOIN messages m ON m.order_id = c.order_id
+            WHERE c.user_id = $1 AND {_changed_since("c.change_xid")} AND {_changed_since("m.change_xid")}
+            ORDER BY m.id LIMIT $3
+            """,
+            current_user.id, snapshot, limit + 1
+        )
+        
+        tombstones = await db.fetch(
+            f"""
+            SELECT entity, entity_id FROM sync_tombstones
+            WHERE {_changed_since()} AND $1 = ANY(user_ids)
+            ORDER BY id LIMIT $3
+            """,
+            current_user.id, snapshot, limit + 1
+        )
+    
+    if any(len(rows) > limit for rows in (orders, batch_orders, menu_items, messages, tombstones)):
+        return SyncChanges(resync=True, token=token)
+    
+    deleted = {}
+    for tombstone in tombstones:
+        deleted.setdefault(tombstone['entity'], []).append(tombstone['entity_id'])
+    
+    return SyncChanges(
+        orders=[_order(record) for record in orders],
+        batch_orders=[
+            BatchOrder(
+                id=record['id'],
+                buyer_id=record['buyer_id'],
+                total_price=record['total_price'],
+                status=record['status'],
+                created_at=record['created_at'],
+                updated_at=record['updated_at']
+            )
+            for record in batch_orders
+        ],
+        menu_items=[
+            MenuItem(
+                id=item['id'],
+                cook_id=item['cook_id'],
+                title=item['title'],
+                description=item['description'],
+                price=item['price'],
+                photo_url=item['photo_url'],
+                is_available=item['is_available'],
+                daily_capacity=item['daily_capacity'],
+                created_at=item['created_at'],
+                updated_at=item['updated_at']
+            )
+            for item in menu_items
+        ],
+        messages=[
+            Message(
+                id=msg['id'],
+                order_id=msg['order_id'],
+                sender_id=msg['sender_id'],
+                content=msg['content'],
+                created_at=msg['created_at']
+            )
+            for msg in messages
+        ],
+        deleted=deleted,
+        token=token
+    )
@@ -0,0 +1,53 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Optional
+from app.config import settings
+from app.models import UpdatePoll, User
+from app.dependencies import get_current_active_user
+from app.utils.longpoll import TooManyWaiters, get_update_waiters
+
+router = APIRouter(prefix="/updates", tags=["updates"])
+
+@router.get("/poll", response_model=UpdatePoll)
+async def poll_updates(
+    since: Optional[str] = None,
+    timeout: Optional[float] = None,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Wait for order changes and new messages for the current user; pass the returned cursor as `since` next time"""
+    # No database dependency: a parked poll must not hold a pool connection
+    since_event = None
+    if since and not since.isdigit():
+        # Cursors from before event ids were times; those clients reload once
+        if not _is_time_cursor(since):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor"
+            )
+        return UpdatePoll(events=[], resync=True, cursor=_format_cursor(get_update_waiters().cursor))
+    if since:
+        since_event = int(since)
+    
+    wait = settings.longpoll_timeout if timeout is None else timeout
+    wait = max(0.0, min(wait, settings.longpoll_max_timeout))
+    
+    try:
+        events, resync, cursor = await get_update_waiters().wait(current_user.id, since_event, wait)
+    except TooManyWaiters:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many open polls, retry shortly",
+            headers={"Retry-After": "1"}
+        )
+    
+    return UpdatePoll(events=events, resync=resync, cursor=_format_cursor(cursor))
+
+def _is_time_cursor(since: str) -> bool:
+    try:
+        float(since)
+    except ValueError:
+        return False
+    return True
+
+def _format_cursor(cursor: Optional[int]) -> str:
+    """Empty before the worker's first notification: the next poll starts from then"""
+    return "" if cursor is None else str(cursor)
@@ -0,0 +1,75 @@
+"""
+Production server for the Adresur API.
+
+Runs gunicorn as the process manager with uvicorn workers: N workers sized from the
+CPU count, uvloop + httptools, keep-alive and backlog tuning and an optionally
+preloaded app. On SIGTERM gunicorn stops accepting connections, each worker drains
+its in-flight requests (bounded by server_graceful_timeout) and then runs the app's
+shutdown handler, which drains the database pool.
+"""
+
+import os
+from typing import Any, Dict
+
+from gunicorn.app.base import BaseApplication
+from uvicorn.workers import UvicornWorker
+
+from app.config import settings
+
+def available_cpus() -> int:
+    """CPUs this process may run on (respects container CPU affinity)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def worker_count() -> int:
+    """Configured worker count, or one worker per available CPU"""
+    if settings.server_workers > 0:
+        return settings.server_workers
+    return available_cpus()
+
+class AdresurUvicornWorker(UvicornWorker):
+    """Uvicorn worker using the event loop and HTTP parser from Settings"""
+
+    CONFIG_KWARGS: Dict[str, Any] = {
+        "loop": settings.server_loop,
+        "http": settings.server_http,
+        # Leave a margin so the app shutdown (pool drain) finishes before gunicorn kills the worker
+        "timeout_graceful_shutdown": max(settings.server_graceful_timeout - 5, 1),
+    }
+
+class ProductionServer(BaseApplication):
+    """Embedded gunicorn application configured from Settings instead of a config file"""
+
+    def __init__(self, app_uri: str = "app.main:app"):
+        self.app_uri = app_uri
+        super().__init__()
+
+    def gunicorn_options(self) -> Dict[str, Any]:
+        return {
+            "bind": f"{settings.server_host}:{settings.server_port}",
+            "workers": worker_count(),
+            "worker_class": "app.server.AdresurUvicornWorker",
+            "preload_app": settings.server_preload_app,
+            "keepalive": settings.server_keepalive_timeout,
+            "backlog": settings.server_backlog,
+            "graceful_timeout": settings.server_graceful_timeout,
+            "timeout": settings.server_worker_timeout,
+            "max_requests": settings.server_max_requests,
+            "max_requests_jitter": settings.server_max_requests_jitter,
+            "accesslog": "-",
+            "errorlog": "-",
+        }
+
+    def load_config(self):
+        for key, value in self.gunicorn_options().items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from gunicorn.util import import_app
+        return import_app(self.app_uri)
+
+def run():
+    """Start the production server (blocks until shutdown)"""
+    ProductionServer().run()
@@ -0,0 +1,302 @@
+"""
+Background job handlers. Importing this module registers them with app.jobs.
+"""
+
+import asyncio
+import logging
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, List
+
+import asyncpg
+
+from app.caches import cook_profile_cache, menu_item_cache, prep_sheet_cache, prep_sheet_key, principal_cache
+from app.config import settings
+from app.jobs import JobContext, job_handler
+
+logger = logging.getLogger(__name__)
+
+# Tables range-partitioned by created_at month (migrations/0005_partition_orders.sql, 0008_order_status_events.sql)
+MONTHLY_PARTITIONED_TABLES = ("orders_live", "messages", "order_status_events")
+
+# Partition DDL briefly locks the parent table; give up and retry later rather than queue behind traffic
+PARTITION_LOCK_TIMEOUT = "2s"
+
+LIVE_ORDER_PARTITION = re.compile(r"^orders_live_(\d{4})_(\d{2})$")
+
+@job_handler("orders.placed")
+async def notify_cook_of_order(ctx: JobContext):
+    """Tell the cook about a newly placed order (or batch of orders)"""
+    cook = await ctx.conn.fetchrow(
+        """
+        SELECT cp.name, u.email
+        FROM cook_profiles cp
+        JOIN users u ON cp.user_id = u.id
+        WHERE cp.id = $1
+        """,
+        ctx.payload['cook_id']
+    )
+    if not cook:
+        return
+    # Delivery channel (email/push) hooks in here; until then the notification is logged
+    logger.info(
+        f"New order for {cook['name']} <{cook['email']}>: "
+        f"orders {ctx.payload['order_ids']} (batch {ctx.payload.get('batch_order_id')})"
+    )
+
+@job_handler("jobs.purge_finished", every=3600)
+async def purge_finished_jobs(ctx: JobContext):
+    """Delete finished jobs older than the retention window, in small chunks"""
+    while True:
+        result = await ctx.conn.execute(
+            """
+            DELETE FROM jobs WHERE id IN (
+                SELECT id FROM jobs
+                WHERE status IN ('done', 'failed')
+                  AND finished_at < NOW() - make_interval(hours => $1)
+                LIMIT 1000
+            )
+            """,
+            settings.jobs_retention_hours
+        )
+        if int(result.split()[-1]) < 1000:
+            break
+
+@job_handler("idempotency.purge_expired", every=3600)
+async def purge_expired_idempotency_keys(ctx: JobContext):
+    """Delete expired idempotency keys, in small chunks"""
+    while True:
+        result = await ctx.conn.execute(
+            """
+            DELETE FROM idempotency_keys WHERE ctid = ANY(ARRAY(
+                SELECT ctid FROM idempotency_keys
+                WHERE expires_at <= NOW()
+                LIMIT 1000
+            ))
+            """
+        )
+        if int(result.split()[-1]) < 1000:
+            break
+
+@job_handler("sync.purge_tombstones", every=3600)
+async def purge_sync_tombstones(ctx: JobContext):
+    """Delete sync tombstones older than the retention window, in small chunks"""
+    while True:
+        result = await ctx.conn.execute(
+            """
+            DELETE FROM sync_tombstones WHERE id IN (
+                SELECT id FROM sync_tombstones
+                WHERE deleted_at < NOW() - make_interval(days => $1)
+                LIMIT 1000
+            )
+            """,
+            settings.sync_tombstone_retention_days
+        )
+        if int(result.split()[-1]) < 1000:
+            break
+
+@job_handler("capacity.rollover", every=600)
+async def roll_over_capacity(ctx: JobContext):
+    """Make items sold out on a past (UTC) day available again and drop old capacity rows"""
+    reopened = await ctx.conn.fetch(
+        """
+        UPDATE menu_items SET is_available = true, sold_out_on = NULL
+        WHERE sold_out_on < (NOW() AT TIME ZONE 'UTC')::date
+        RETURNING id
+        """
+    )
+    if reopened:
+        await menu_item_cache.invalidate(ctx.conn, *[row['id'] for row in reopened])
+        logger.info(f"Reopened {len(reopened)} menu items sold out on an earlier day")
+    
+    while True:
+        result = await ctx.conn.execute(
+            """
+            DELETE FROM menu_item_capacity WHERE ctid = ANY(ARRAY(
+                SELECT ctid FROM menu_item_capacity
+                WHERE day < (NOW() AT TIME ZONE 'UTC')::date - $1
+                LIMIT 1000
+            ))
+            """,
+            settings.capacity_retention_days
+        )
+        if int(result.split()[-1]) < 1000:
+            break
+
+async def create_upcoming_partitions(conn: asyncpg.Connection):
+    """Create this month's and the next PARTITIONS_PREMAKE_MONTHS months' missing partitions.
+
+    Also run at API startup: without them new rows land in the DEFAULT partitions
+    (migrations/0018_default_partitions.sql), which create_monthly_partitions empties again.
+    """
+    for table in MONTHLY_PARTITIONED_TABLES:
+        async with conn.transaction():
+            await conn.execute("SELECT set_config('lock_timeout', $1, true)", PARTITION_LOCK_TIMEOUT)
+            created = await conn.fetch(
+                "SELECT create_monthly_partitions($1, NOW(), NOW() + make_interval(months => $2)) AS name",
+                table, settings.partitions_premake_months
+            )
+        for partition in created:
+            logger.info(f"Created partition {partition['name']}")
+
+@job_handler("partitions.maintain", every=6 * 3600)
+async def maintain_partitions(ctx: JobContext):
+    """Create the coming months' partitions and drop live order partitions archiving emptied"""
+    await create_upcoming_partitions(ctx.conn)
+
+    # Months entirely before the archive cutoff only hold orders that never finished
+    cutoff = datetime.now(timezone.utc) - timedelta(days=settings.orders_archive_after_days)
+    partitions = await ctx.conn.fetch(
+        """
+        SELECT c.relname AS name
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'orders_live'::regclass
+        """
+    )
+    for partition in partitions:
+        match = LIVE_ORDER_PARTITION.match(partition['name'])
+        if not match:
+            continue
+        year, month = int(match.group(1)), int(match.group(2))
+        month_end = datetime(year + month // 12, month % 12 + 1, 1, tzinfo=timezone.utc)
+        if month_end > cutoff:
+            continue
+        async with ctx.conn.transaction():
+            await ctx.conn.execute("SELECT set_config('lock_timeout', $1, true)", PARTITION_LOCK_TIMEOUT)
+            # Parent first, like every query on orders does, so this cannot deadlock with them
+            await ctx.conn.execute("LOCK TABLE orders_live IN ACCESS EXCLUSIVE MODE")
+            if await ctx.conn.fetchval(f'SELECT EXISTS (SELECT 1 FROM "{partition["name"]}")'):
+                continue
+            await ctx.conn.execute(f'DROP TABLE "{partition["name"]}"')
+        logger.info(f"Dropped empty partition {partition['name']}")
+
+@job_handler("orders.archive", every=3600)
+async def archive_orders(ctx: JobContext):
+    """Move completed/cancelled orders older than the archive age into orders_archive, in chunks"""
+    cutoff = await ctx.conn.fetchval(
+        "SELECT NOW() - make_interval(days => $1)", settings.orders_archive_after_days
+    )
+    archived = 0
+    while True:
+        chunk = await ctx.conn.fetch(
+            """
+            SELECT id, created_at FROM orders
+            WHERE NOT archived AND created_at < $1 AND status IN ('completed', 'cancelled')
+            ORDER BY created_at
+            LIMIT $2
+            """,
+            cutoff, settings.orders_archive_batch_size
+        )
+        if not chunk:
+            break
+        # Updating through `orders` moves each row from its orders_live month to orders_archive.
+        # Oldest first, so the chunk's created_at range prunes this to one or two partitions.
+        result = await ctx.conn.execute(
+            """
+            UPDATE orders SET archived = true
+            WHERE id = ANY($1::int[]) AND created_at BETWEEN $2 AND $3
+              AND NOT archived AND status IN ('completed', 'cancelled')
+            """,
+            [row['id'] for row in chunk], chunk[0]['created_at'], chunk[-1]['created_at']
+        )
+        archived += int(result.split()[-1])
+        await ctx.report_progress(archived=archived)
+        if len(chunk) < settings.orders_archive_batch_size:
+            break
+    if archived:
+        logger.info(f"Archived {archived} orders created before {cutoff.isoformat()}")
+
+async def _delete_in_chunks(ctx: JobContext, progress: Dict[str, int], step: str, query: str, *args: Any) -> AsyncIterator[List[asyncpg.Record]]:
+    """Run a DELETE ... RETURNING (chunk size as its last parameter) until it deletes nothing; yields each chunk"""
+    # A short chunk does not mean the end: rows another purge deleted first drop out of it
+    while True:
+        rows = await ctx.conn.fetch(query, *args, settings.purge_batch_size)
+        if not rows:
+            break
+        progress[step] = progress.get(step, 0) + len(rows)
+        await ctx.report_progress(**progress)
+        yield rows
+        await asyncio.sleep(settings.purge_batch_delay)
+
+async def _purge_orders(ctx: JobContext, progress: Dict[str, int], column: str, owner_id: int):
+    # Each order takes its messages with it (delete_order_messages trigger). A buyer's orders
+    # with a cook being purged at the same time are skipped rather than waited for.
+    async for rows in _delete_in_chunks(
+        ctx, progress, "orders",
+        f"""
+        DELETE FROM orders WHERE (id, created_at) IN (
+            SELECT id, created_at FROM orders WHERE {column} = $1 LIMIT $2 FOR UPDATE SKIP LOCKED
+        )
+        RETURNING cook_id, created_at
+        """,
+        owner_id
+    ):
+        await prep_sheet_cache.invalidate(ctx.conn, *{prep_sheet_key(row['cook_id'], row['created_at']) for row in rows})
+
+async def _purge_cook_profile(ctx: JobContext, progress: Dict[str, int], cook_id: int):
+    await _purge_orders(ctx, progress, "cook_id", cook_id)
+    async for rows in _delete_in_chunks(
+        ctx, progress, "menu_items",
+        """
+        DELETE FROM menu_items WHERE id IN (
+            SELECT id FROM menu_items WHERE cook_id = $1 LIMIT $2
+        )
+        RETURNING id
+        """,
+        cook_id
+    ):
+        await menu_item_cache.invalidate(ctx.conn, *[row['id'] for row in rows])
+    await ctx.conn.execute("DELETE FROM cook_profiles WHERE id = $1", cook_id)
+    await cook_profile_cache.invalidate(ctx.conn, cook_id)
+
+@job_handler("cooks.purge")
+async def purge_cook_profile(ctx: JobContext):
+    """Delete a soft-deleted cook profile's orders (with their messages) and menu items in chunks, then the profile"""
+    cook_id = ctx.payload['cook_id']
+    # Each chunk commits on its own, so a retry picks up where the last attempt stopped
+    if not await ctx.conn.fetchval("SELECT deleted_at IS NOT NULL FROM cook_profiles WHERE id = $1", cook_id):
+        return
+    progress: Dict[str, int] = {}
+    await _purge_cook_profile(ctx, progress, cook_id)
+    logger.info(f"Purged cook profile {cook_id}: {progress}")
+
+@job_handler("users.purge")
+async def purge_user(ctx: JobContext):
+    """Delete a soft-deleted user's cook profile, orders, batch orders and messages in chunks, then the user"""
+    user_id = ctx.payload['user_id']
+    user = await ctx.conn.fetchrow("SELECT email, deleted_at FROM users WHERE id = $1", user_id)
+    if not user or user['deleted_at'] is None:
+        return
+    progress: Dict[str, int] = {}
+    cook_id = await ctx.conn.fetchval("SELECT id FROM cook_profiles WHERE user_id = $1", user_id)
+    if cook_id is not None:
+        await _purge_cook_profile(ctx, progress, cook_id)
+    await _purge_orders(ctx, progress, "buyer_id", user_id)
+    async for _ in _delete_in_chunks(
+        ctx, progress, "batch_orders",
+        """
+        DELETE FROM batch_orders WHERE id IN (
+            SELECT id FROM batch_orders WHERE buyer_id = $1 LIMIT $2
+        )
+        RETURNING id
+        """,
+        user_id
+    ):
+        pass
+    # Messages they sent in threads of orders that were not theirs (as an admin, say)
+    async for _ in _delete_in_chunks(
+        ctx, progress, "messages",
+        """
+        DELETE FROM messages WHERE (id, created_at) IN (
+            SELECT id, created_at FROM messages WHERE sender_id = $1 LIMIT $2
+        )
+        RETURNING id
+        """,
+        user_id
+    ):
+        pass
+    # What is left (conversations, idempotency keys) is small and cascades
+    await ctx.conn.execute("DELETE FROM users WHERE id = $1", user_id)
+    await principal_cache.invalidate(ctx.conn, user['email'])
+    logger.info(f"Purged user {user_id}: {progress}")
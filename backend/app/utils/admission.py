@@ -0,0 +1,262 @@
+"""
+Admission control: per-route-class concurrency limits, bounded queues and load shedding.
+
+Without it every request queues equally for the event loop and the connection pool, so when
+the database is saturated a cook's order status update waits behind a crowd of menu
+browsers. `AdmissionMiddleware` gives each route class (app/utils/routes.py) its own number of
+in-flight requests and a bounded queue. A request that finds its class full waits up to
+ADMISSION_QUEUE_TIMEOUT seconds for a slot. If the queue is full or the wait runs out, it is
+answered with 503 and Retry-After before any database work.
+
+Overload is judged from two signals. The first is event-loop lag, sampled by a monitor task.
+The second is how long requests wait for a pooled connection, reported by
+app/database.py. Both are smoothed and decay once the load is gone. Their ratio to
+ADMISSION_MAX_LOOP_LAG_MS / ADMISSION_MAX_POOL_WAIT_MS is the pressure. Classes are shed from
+the bottom up as pressure rises: anonymous browsing and admin at 1, other reads, writes and
+logins at 2. Order writes are never shed, only bounded by their queue.
+"""
+
+import asyncio
+import json
+import math
+import time
+from collections import deque
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Deque, Dict, Optional
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.config import settings
+from app.utils.routes import RouteClass, classify_route
+
+# Parked long-polls hold no connection and would fill their class for minutes; not metered
+UNMETERED_PATHS = {"/updates/poll"}
+
+# How often the event loop is sampled, and how fast the smoothed signals forget a spike
+LOOP_LAG_INTERVAL = 0.1
+SIGNAL_HALF_LIFE = 2.0
+
+@dataclass(frozen=True)
+class ClassPolicy:
+    """In-flight limit for a route class and the pressure at which it is shed (None: never)"""
+    concurrency: int
+    shed_at: Optional[float]
+
+def default_policies() -> Dict[RouteClass, ClassPolicy]:
+    return {
+        RouteClass.ORDER_WRITE: ClassPolicy(settings.admission_order_write_concurrency, None),
+        RouteClass.AUTH: ClassPolicy(settings.admission_auth_concurrency, 2.0),
+        RouteClass.READ: ClassPolicy(settings.admission_read_concurrency, 2.0),
+        RouteClass.WRITE: ClassPolicy(settings.admission_write_concurrency, 2.0),
+        RouteClass.PUBLIC_READ: ClassPolicy(settings.admission_public_read_concurrency, 1.0),
+        RouteClass.ADMIN: ClassPolicy(settings.admission_admin_concurrency, 1.0),
+    }
+
+class DecayingSignal:
+    """Exponentially smoothed measurement that halves every SIGNAL_HALF_LIFE seconds without new samples"""
+
+    def __init__(self, alpha: float = 0.1, clock=time.monotonic):
+        self.alpha = alpha
+        self.clock = clock
+        self._value = 0.0
+        self._updated_at = clock()
+
+    def record(self, sample: float):
+        self._value = self.value + self.alpha * (sample - self.value)
+        self._updated_at = self.clock()
+
+    @property
+    def value(self) -> float:
+        return self._value * 0.5 ** ((self.clock() - self._updated_at) / SIGNAL_HALF_LIFE)
+
+class ClassGate:
+    """Counting semaphore with a bounded FIFO of waiters; a released slot is handed to the oldest waiter"""
+
+    def __init__(self, concurrency: int, queue_size: int):
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.active = 0
+        self._waiters: "Deque[asyncio.Future[None]]" = deque()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self, timeout: float) -> bool:
+        """Take a slot, waiting up to `timeout` seconds in the queue; False if full or timed out"""
+        if self.active < self.concurrency and not self._waiters:
+            self.active += 1
+            return True
+        if len(self._waiters) >= self.queue_size or timeout <= 0:
+            return False
+
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        self._waiters.append(waiter)
+        # Not asyncio.wait_for: it can swallow a cancellation that arrives just after the
+        # handoff, admitting a request whose client is gone
+        expired = loop.call_later(timeout, waiter.cancel)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()  # handed a slot we will not use
+                raise
+            self._discard(waiter)
+            if expired.when() <= loop.time():
+                return False
+            raise
+        finally:
+            expired.cancel()
+        return True
+
+    def release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)  # the slot passes on; `active` is unchanged
+                return
+        self.active -= 1
+
+    def _discard(self, waiter: "asyncio.Future[None]"):
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+class AdmissionController:
+    """Per-class gates and the load signals that decide when to shed, for one worker process"""
+
+    def __init__(
+        self,
+        policies: Dict[RouteClass, ClassPolicy],
+        queue_size: int,
+        queue_timeout: float,
+        max_loop_lag: float,
+        max_pool_wait: float,
+    ):
+        self.policies = policies
+        self.queue_timeout = queue_timeout
+        self.max_loop_lag = max_loop_lag
+        self.max_pool_wait = max_pool_wait
+        self.gates = {route_class: ClassGate(policy.concurrency, queue_size) for route_class, policy in policies.items()}
+        self.loop_lag = DecayingSignal()
+        self.pool_wait = DecayingSignal()
+        self.stats = {route_class.value: {"admitted": 0, "queued": 0, "shed": 0, "rejected": 0} for route_class in policies}
+        self._monitor: Optional[asyncio.Task] = None
+
+    def pressure(self) -> float:
+        """How overloaded the worker is: 1.0 is the configured lag / pool wait limit"""
+        pressure = 0.0
+        if self.max_loop_lag > 0:
+            pressure = max(pressure, self.loop_lag.value / self.max_loop_lag)
+        if self.max_pool_wait > 0:
+            pressure = max(pressure, self.pool_wait.value / self.max_pool_wait)
+        return pressure
+
+    def record_pool_wait(self, seconds: float):
+        self.pool_wait.record(seconds)
+
+    async def admit(self, route_class: RouteClass) -> bool:
+        """Take a slot for a request of this class; False means answer 503"""
+        policy = self.policies.get(route_class)
+        if policy is None:
+            return True
+        stats = self.stats[route_class.value]
+        if policy.shed_at is not None and self.pressure() >= policy.shed_at:
+            stats["shed"] += 1
+            return False
+        gate = self.gates[route_class]
+        if gate.active >= gate.concurrency:
+            stats["queued"] += 1
+        if not await gate.acquire(self.queue_timeout):
+            stats["rejected"] += 1
+            return False
+        stats["admitted"] += 1
+        return True
+
+    def release(self, route_class: RouteClass):
+        gate = self.gates.get(route_class)
+        if gate is not None:
+            gate.release()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "pressure": round(self.pressure(), 3),
+            "loop_lag_ms": round(self.loop_lag.value * 1000, 1),
+            "pool_wait_ms": round(self.pool_wait.value * 1000, 1),
+            "classes": {
+                route_class.value: {"active": gate.active, "waiting": gate.waiting, **self.stats[route_class.value]}
+                for route_class, gate in self.gates.items()
+            },
+        }
+
+    def start(self):
+        """Start sampling event-loop lag (call from application startup)"""
+        if self._monitor is None:
+            self._monitor = asyncio.create_task(self._sample_loop_lag())
+
+    async def stop(self):
+        if self._monitor is not None:
+            self._monitor.cancel()
+            try:
+                await self._monitor
+            except asyncio.CancelledError:
+                pass
+            self._monitor = None
+
+    async def _sample_loop_lag(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(LOOP_LAG_INTERVAL)
+            # Anything past the interval is time the loop spent on other work before waking us.
+            # One login's bcrypt blocks for a few hundred ms; smoothing keeps that from shedding
+            # on its own, while a sustained run of them pushes the average up within a couple of seconds
+            self.loop_lag.record(max(0.0, loop.time() - started - LOOP_LAG_INTERVAL))
+
+@lru_cache(maxsize=1)
+def get_admission_controller() -> AdmissionController:
+    """The process-wide controller; its lag monitor is started with the application"""
+    return AdmissionController(
+        default_policies(),
+        queue_size=settings.admission_queue_size,
+        queue_timeout=settings.admission_queue_timeout,
+        max_loop_lag=settings.admission_max_loop_lag_ms / 1000,
+        max_pool_wait=settings.admission_max_pool_wait_ms / 1000,
+    )
+
+class AdmissionMiddleware:
+    """ASGI middleware admitting requests by route class; refusals get a 503 before routing"""
+
+    def __init__(self, app: ASGIApp, controller: Optional[AdmissionController] = None):
+        self.app = app
+        self.controller = controller or get_admission_controller()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"] in UNMETERED_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        route_class = classify_route(scope["method"], scope["path"])
+        if not await self.controller.admit(route_class):
+            await self.reject(send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(route_class)
+
+    async def reject(self, send: Send):
+        body = json.dumps({"detail": "Service busy, please retry"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(self.controller.queue_timeout))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -36,4 +36,13 @@ def verify_token(token: str) -> Optional[str]:
             return None
         return str(email)
     except JWTError:
-        return None 
\ No newline at end of file
+        return None 
+
+def decode_token_subject(token: str) -> Optional[str]:
+    """Verify JWT token and return the user id (or email for older tokens) as a rate limit key"""
+    try:
+        payload = jwt.decode(token, settings.jwt_secret_key, algorithms=[settings.jwt_algorithm])
+    except JWTError:
+        return None
+    subject = payload.get("uid") or payload.get("sub")
+    return str(subject) if subject is not None else None
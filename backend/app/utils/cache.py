@@ -0,0 +1,226 @@
+"""
+Two-tier read caches with invalidation over Postgres LISTEN/NOTIFY.
+
+Each `Cache` has an in-process LRU tier and, optionally, a tier in the shared store
+(Redis, or the local stand-in) that every worker reads through. Misses are loaded once
+per key per process (see SingleFlight) and written to both tiers.
+
+Write paths call `await cache.invalidate(conn, *keys)` with the connection that makes the
+change. That drops the keys here immediately and publishes a notification on
+CACHE_INVALIDATION_CHANNEL; because NOTIFY is transactional, every worker's listener
+(app.utils.notify) receives it after the write commits and drops its own copies then.
+If the listener connection drops, local tiers are cleared, and TTLs bound staleness
+when no listener runs at all.
+
+Values must be JSON-serialisable when a shared tier is configured; datetimes and decimals
+come back from it as strings, which the pydantic models accept.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple, TypeVar
+
+import asyncpg
+
+from app.config import settings
+from app.utils.coalesce import SingleFlight
+from app.utils.notify import notify
+from app.utils.shared_store import SharedStore
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+CACHE_INVALIDATION_CHANNEL = "cache_invalidation"
+
+# Keys per notification; NOTIFY payloads are limited to 8000 bytes
+INVALIDATION_CHUNK = 100
+
+# name -> cache, so invalidation notifications can find their target
+CACHES: Dict[str, "Cache"] = {}
+
+class LRUTier:
+    """Bounded in-process tier with per-entry expiry"""
+
+    def __init__(self, max_entries: int, ttl: float, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return False, None
+        if entry[0] <= self.clock():
+            del self._entries[key]
+            self.stats["expirations"] += 1
+            self.stats["misses"] += 1
+            return False, None
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return True, entry[1]
+
+    def set(self, key: Hashable, value: Any):
+        self._entries[key] = (self.clock() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def delete(self, key: Hashable):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+class Cache:
+    """A named read-through cache: local LRU tier, then the shared tier, then the loader"""
+
+    def __init__(
+        self,
+        name: str,
+        ttl: float = settings.cache_local_ttl,
+        max_entries: int = settings.cache_max_entries,
+        shared: Optional[SharedStore] = None,
+        shared_ttl: float = settings.cache_shared_ttl,
+    ):
+        self.name = name
+        self.local = LRUTier(max_entries, ttl)
+        self.shared = shared
+        self.shared_ttl = shared_ttl
+        self.stats = {"loads": 0, "shared_hits": 0, "shared_misses": 0, "shared_errors": 0, "invalidations": 0}
+        self._flight = SingleFlight()
+        # Bumped on every invalidation so loads that raced with one are not cached
+        self._epoch = 0
+        CACHES[name] = self
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[T]]) -> T:
+        """Cached value for key, loading it on a miss; None results are not cached"""
+        if not settings.cache_enabled:
+            return await loader()
+        hit, value = self.local.get(key)
+        if hit:
+            return value
+        # Keyed by epoch too: a caller arriving after an invalidation must not join a load that started before it
+        epoch = self._epoch
+        return await self._flight.do((key, epoch), lambda: self._load(key, loader, epoch))
+
+    async def invalidate(self, conn: asyncpg.Connection, *keys: Hashable):
+        """Drop keys everywhere; other workers drop them when the caller's transaction commits"""
+        if not keys:
+            return
+        self.drop_local(*keys)
+        await self._delete_shared(*keys)
+        for start in range(0, len(keys), INVALIDATION_CHUNK):
+            await notify(conn, CACHE_INVALIDATION_CHANNEL, {
+                "cache": self.name,
+                "keys": list(keys[start:start + INVALIDATION_CHUNK])
+            })
+
+    def drop_local(self, *keys: Hashable):
+        self._epoch += 1
+        self.stats["invalidations"] += len(keys)
+        for key in keys:
+            self.local.delete(key)
+
+    def clear_local(self):
+        self._epoch += 1
+        self.local.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters for tuning sizes and TTLs"""
+        lookups = self.local.stats["hits"] + self.local.stats["misses"]
+        return {
+            "entries": len(self.local),
+            "max_entries": self.local.max_entries,
+            "ttl": self.local.ttl,
+            "shared_tier": self.shared is not None,
+            **self.local.stats,
+            **self.stats,
+            "coalesced": self._flight.stats["coalesced"],
+            "hit_ratio": round(self.local.stats["hits"] / lookups, 4) if lookups else None,
+        }
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[T]], epoch: int) -> T:
+        if self.shared is not None:
+            raw = await self._get_shared(key)
+            if raw is not None:
+                self.stats["shared_hits"] += 1
+                value = json.loads(raw)
+                if epoch == self._epoch:
+                    self.local.set(key, value)
+                return value
+            self.stats["shared_misses"] += 1
+
+        self.stats["loads"] += 1
+        value = await loader()
+        if value is not None and epoch == self._epoch:
+            self.local.set(key, value)
+            if self.shared is not None:
+                await self._set_shared(key, value)
+        return value
+
+    def _shared_key(self, key: Hashable) -> str:
+        return f"cache:{self.name}:{key}"
+
+    # The shared tier is an optimisation: if it is unavailable, fall through to the loader
+    async def _get_shared(self, key: Hashable) -> Optional[bytes]:
+        try:
+            return await self.shared.get(self._shared_key(key))
+        except Exception as e:
+            self.stats["shared_errors"] += 1
+            logger.warning(f"Cache '{self.name}' shared read failed: {e!r}")
+            return None
+
+    async def _set_shared(self, key: Hashable, value: Any):
+        try:
+            await self.shared.set(self._shared_key(key), json.dumps(value, default=_json_default).encode(), self.shared_ttl)
+        except Exception as e:
+            self.stats["shared_errors"] += 1
+            logger.warning(f"Cache '{self.name}' shared write failed: {e!r}")
+
+    async def _delete_shared(self, *keys: Hashable):
+        if self.shared is None:
+            return
+        try:
+            await self.shared.delete(*(self._shared_key(key) for key in keys))
+        except Exception as e:
+            self.stats["shared_errors"] += 1
+            logger.warning(f"Cache '{self.name}' shared delete failed: {e!r}")
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Cannot cache value of type {type(value).__name__}")
+
+def handle_invalidation(payload: str):
+    """NotificationHub callback for CACHE_INVALIDATION_CHANNEL"""
+    message = json.loads(payload)
+    cache = CACHES.get(message["cache"])
+    if cache is None:
+        return
+    if cache.shared is not None:
+        # Also clear the shared tier after commit, in case a reader refilled it in between
+        asyncio.ensure_future(cache._delete_shared(*message["keys"]))
+    cache.drop_local(*message["keys"])
+
+def clear_local_caches():
+    """Forget every local entry (used when invalidations may have been missed)"""
+    for cache in CACHES.values():
+        cache.clear_local()
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: cache.snapshot() for name, cache in CACHES.items()}
@@ -0,0 +1,35 @@
+"""
+Daily portion caps per menu item.
+
+`menu_items.daily_capacity` caps the portions sold per UTC day. The SQL functions in
+migrations/0009_menu_item_capacity.sql keep each day's remaining portions in several shard
+rows, so concurrent buyers of a popular dish decrement different rows instead of queueing
+on one. Orders reserve inside the transaction that inserts them (so a failed order reserves
+nothing) and a trigger on orders releases the portions when a reserved order is cancelled
+or deleted. Running out marks the item unavailable for the rest of the day.
+"""
+
+import asyncpg
+
+from app.config import settings
+
+class SoldOut(Exception):
+    """Today's capacity for the item cannot cover the order; the transaction must roll back"""
+
+    def __init__(self, menu_item_id: int, title: str):
+        super().__init__(f"{title} is sold out for today")
+        self.menu_item_id = menu_item_id
+        self.title = title
+
+async def reserve_portions(conn: asyncpg.Connection, menu_item_id: int, title: str, portions: int, daily_capacity: int):
+    """Take portions of today's capacity; call inside the transaction that inserts the order"""
+    reserved = await conn.fetchval(
+        "SELECT reserve_capacity($1, $2, $3, $4)",
+        menu_item_id, portions, daily_capacity, settings.capacity_shards
+    )
+    if not reserved:
+        raise SoldOut(menu_item_id, title)
+
+async def mark_sold_out(conn: asyncpg.Connection, menu_item_id: int):
+    """After a SoldOut rollback: mark the item unavailable if nothing is left today"""
+    await conn.execute("SELECT sync_sold_out($1, (NOW() AT TIME ZONE 'UTC')::date)", menu_item_id)
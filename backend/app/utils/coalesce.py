@@ -0,0 +1,57 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple, TypeVar
+
+T = TypeVar("T")
+
+class SingleFlight:
+    """Collapse concurrent identical reads into one in-flight call per worker process.
+
+    The first caller for a key runs the loader; callers arriving while it runs await the
+    same result (or exception). With `cache_ttl` > 0 a successful result is also served
+    for that many seconds after it completes, smoothing bursts that arrive just after.
+    """
+
+    def __init__(self, cache_ttl: float = 0.0, max_cached: int = 1024):
+        self.cache_ttl = cache_ttl
+        self.max_cached = max_cached
+        self._inflight: Dict[Hashable, "asyncio.Future[Any]"] = {}
+        self._recent: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self.stats = {"calls": 0, "coalesced": 0, "cache_hits": 0}
+
+    async def do(self, key: Hashable, loader: Callable[[], Awaitable[T]]) -> T:
+        self.stats["calls"] += 1
+
+        if self.cache_ttl > 0:
+            cached = self._recent.get(key)
+            if cached is not None and cached[0] > time.monotonic():
+                self.stats["cache_hits"] += 1
+                return cached[1]
+
+        task = self._inflight.get(key)
+        if task is None:
+            # Run the loader in its own task so a cancelled caller does not fail the others
+            task = asyncio.ensure_future(self._load(key, loader))
+            task.add_done_callback(_consume_exception)
+            self._inflight[key] = task
+        else:
+            self.stats["coalesced"] += 1
+        return await asyncio.shield(task)
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[T]]) -> T:
+        try:
+            value = await loader()
+            if self.cache_ttl > 0:
+                self._recent[key] = (time.monotonic() + self.cache_ttl, value)
+                self._recent.move_to_end(key)
+                while len(self._recent) > self.max_cached:
+                    self._recent.popitem(last=False)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+def _consume_exception(task: "asyncio.Future[Any]"):
+    # Avoid "exception was never retrieved" when every waiter was cancelled
+    if not task.cancelled():
+        task.exception()
@@ -0,0 +1,75 @@
+"""
+Totals for paginated lists ("showing 1-100 of N") without counting on every page load.
+
+`with_total=estimate` asks the planner: an unfiltered list uses pg_class.reltuples (summed
+over the partitions of orders and messages), a filtered one the row estimate of EXPLAIN for
+its WHERE clause. Either is a catalog lookup, and is usually within a few percent after
+autovacuum has analyzed the table. `with_total=exact` runs COUNT(*), cached for
+ADMIN_COUNT_CACHE_TTL seconds per query and arguments, so paging through a list counts once.
+
+The total goes in the X-Total-Count response header; X-Total-Count-Estimated says which kind
+it is.
+"""
+
+import json
+from enum import Enum
+from typing import Any
+
+import asyncpg
+from fastapi import Response
+
+from app.utils.cache import Cache
+
+TOTAL_COUNT_HEADER = "X-Total-Count"
+TOTAL_COUNT_ESTIMATED_HEADER = "X-Total-Count-Estimated"
+
+class TotalCount(str, Enum):
+    ESTIMATE = "estimate"
+    EXACT = "exact"
+
+async def estimate_count(conn: asyncpg.Connection, table: str, where: str = "", *args: Any) -> int:
+    """Planner estimate of the rows of `table` matching `where` (which may use $n parameters)"""
+    if not where:
+        # Partitioned tables have no rows of their own; a never-analyzed leaf (-1) means no estimate
+        reltuples = await conn.fetchval(
+            """
+            SELECT CASE WHEN bool_and(c.reltuples >= 0) THEN SUM(c.reltuples) END
+            FROM pg_partition_tree($1::regclass) t
+            JOIN pg_class c ON c.oid = t.relid
+            WHERE t.isleaf
+            """,
+            table
+        )
+        if reltuples is not None:
+            return int(reltuples)
+    plan = await conn.fetchval(
+        f"EXPLAIN (FORMAT JSON) SELECT 1 FROM {table}" + (f" WHERE {where}" if where else ""), *args
+    )
+    return int(json.loads(plan)[0]["Plan"]["Plan Rows"])
+
+async def exact_count(conn: asyncpg.Connection, cache: Cache, table: str, where: str = "", *args: Any) -> int:
+    """COUNT(*) of the rows of `table` matching `where`, served from `cache` while fresh"""
+    async def load_count():
+        return await conn.fetchval(
+            f"SELECT COUNT(*) FROM {table}" + (f" WHERE {where}" if where else ""), *args
+        )
+
+    key = f"{table}|{where}|{json.dumps(args, default=str)}"
+    return await cache.get_or_load(key, load_count)
+
+async def set_total_count(
+    response: Response,
+    conn: asyncpg.Connection,
+    with_total: TotalCount,
+    cache: Cache,
+    table: str,
+    where: str = "",
+    *args: Any,
+):
+    """Put the estimated or exact total of a list in the response headers"""
+    if with_total == TotalCount.EXACT:
+        total = await exact_count(conn, cache, table, where, *args)
+    else:
+        total = await estimate_count(conn, table, where, *args)
+    response.headers[TOTAL_COUNT_HEADER] = str(total)
+    response.headers[TOTAL_COUNT_ESTIMATED_HEADER] = "false" if with_total == TotalCount.EXACT else "true"
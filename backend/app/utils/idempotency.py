@@ -0,0 +1,92 @@
+"""
+Idempotency keys for order placement.
+
+Clients send `Idempotency-Key: <unique value>` with a POST and reuse it when they retry. The
+first request stores its response in `idempotency_keys` (migrations/0006_idempotency_keys.sql)
+inside the transaction that writes the orders, so the key and the orders commit together.
+Later requests with the same key from the same user get that response back without any
+validation or writes; reusing a key for a different request body is rejected with 422.
+If two requests with one key race, the second blocks on the key's primary key until the
+first commits, then rolls back its own writes and replays the first response.
+
+Keys expire after IDEMPOTENCY_KEY_TTL_HOURS and are purged by the idempotency.purge_expired job.
+"""
+
+import hashlib
+import json
+from typing import Any, Optional
+
+import asyncpg
+from fastapi import HTTPException, Response, status
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+
+from app.config import settings
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+class IdempotencyConflict(Exception):
+    """A concurrent request with the same key committed first; raised to roll back this one"""
+
+def request_fingerprint(endpoint: str, payload: BaseModel) -> str:
+    """Hash of the endpoint and body, to catch a key reused for a different request"""
+    body = json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(f"{endpoint}\n{body}".encode()).hexdigest()
+
+async def stored_response(
+    conn: asyncpg.Connection,
+    user_id: int,
+    key: str,
+    fingerprint: str
+) -> Optional[Response]:
+    """The response recorded for this key, or None if the key is unused or expired"""
+    record = await conn.fetchrow(
+        """
+        SELECT request_hash, status_code, response
+        FROM idempotency_keys
+        WHERE user_id = $1 AND idempotency_key = $2 AND expires_at > NOW()
+        """,
+        user_id, key
+    )
+    if not record:
+        return None
+
+    if record['request_hash'] != fingerprint:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"{IDEMPOTENCY_HEADER} was already used for a different request"
+        )
+
+    return Response(
+        content=record['response'],
+        status_code=record['status_code'],
+        media_type="application/json",
+        headers={REPLAYED_HEADER: "true"}
+    )
+
+async def store_response(
+    conn: asyncpg.Connection,
+    user_id: int,
+    key: str,
+    fingerprint: str,
+    body: Any,
+    status_code: int = status.HTTP_200_OK
+):
+    """Record the response for this key; call inside the transaction that does the writes"""
+    # Same encoding as the JSON response FastAPI sends, so replays are byte-for-byte identical
+    content = json.dumps(jsonable_encoder(body), ensure_ascii=False, allow_nan=False, separators=(",", ":"))
+    stored = await conn.fetchval(
+        """
+        INSERT INTO idempotency_keys (user_id, idempotency_key, request_hash, status_code, response, expires_at)
+        VALUES ($1, $2, $3, $4, $5::json, NOW() + make_interval(hours => $6))
+        ON CONFLICT (user_id, idempotency_key) DO UPDATE
+            SET request_hash = EXCLUDED.request_hash, status_code = EXCLUDED.status_code,
+                response = EXCLUDED.response, created_at = NOW(), expires_at = EXCLUDED.expires_at
+            WHERE idempotency_keys.expires_at <= NOW()
+        RETURNING true
+        """,
+        user_id, key, fingerprint, status_code, content, settings.idempotency_key_ttl_hours
+    )
+    if not stored:
+        raise IdempotencyConflict()
@@ -0,0 +1,236 @@
+"""
+Long-polling for clients that cannot hold a WebSocket or SSE stream.
+
+GET /updates/poll parks the request on an in-process waiter until an event for the user
+arrives, or the timeout passes. Events come from the worker's single LISTEN connection
+(NotificationHub): order changes on ORDER_CHANGES_CHANNEL and new messages on
+MESSAGE_CHANGES_CHANNEL, both published by triggers. A parked poll holds no pool connection
+and runs no queries.
+
+Each worker keeps the last LONGPOLL_RETENTION seconds of events per user, so an event that
+lands between two polls is returned by the next one: each response carries a `cursor` that
+the client sends back as `since`. The cursor is the event_id (migrations/0017) of the last
+notification the worker had received, not a time. Postgres delivers notifications to every
+listener in the same order, so whichever worker serves the next poll finds that event in its
+own stream and returns the user's events that followed it. A worker that has not received
+it yet waits briefly for it. Events are hints (ids, status, version); clients fetch the
+data through the regular endpoints. When events may have been missed (listener reconnect, a
+cursor older than the retention window) the response says `resync: true` and the client
+should reload instead.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict, deque
+from functools import lru_cache
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# How long a poll waits for this worker to receive the notification its cursor names
+CURSOR_WAIT = 1.0
+
+class TooManyWaiters(Exception):
+    """The worker already holds LONGPOLL_MAX_WAITERS parked polls"""
+
+class UpdateWaiters:
+    """Per-user event buffers and parked polls for one worker process"""
+
+    def __init__(
+        self,
+        retention: float,
+        max_events_per_user: int,
+        max_waiters: int,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.retention = retention
+        self.max_events_per_user = max_events_per_user
+        self.max_waiters = max_waiters
+        self.clock = clock
+        # Position of the latest notification in this worker's stream, which has the same order on every worker
+        self._position = 0
+        # event id -> (position, received at), oldest first; the latest entry is always kept
+        self._stream: "OrderedDict[int, Tuple[int, float]]" = OrderedDict()
+        self._last_event_id: Optional[int] = None
+        # user id -> (position, received at, event), oldest first; users ordered by their latest event
+        self._events: "OrderedDict[int, Deque[Tuple[int, float, Dict[str, Any]]]]" = OrderedDict()
+        # user id -> position of the newest event pushed out of a full buffer
+        self._dropped: Dict[int, int] = {}
+        self._waiters: Dict[int, Set["asyncio.Future[None]"]] = {}
+        self._stream_waiters: Set["asyncio.Future[None]"] = set()
+        self._waiting = 0
+        # Cursors at or before this position may have missed events; polls parked across a resync see the generation change
+        self._resync_position = 0
+        self._generation = 0
+        self.stats = {"events": 0, "polls": 0, "woken": 0, "timeouts": 0, "resyncs": 0, "rejected": 0}
+
+    @property
+    def cursor(self) -> Optional[int]:
+        """Event id of the latest notification received; None before the first"""
+        return self._last_event_id
+
+    def publish(self, user_ids: Iterable[int], event: Dict[str, Any], event_id: Optional[int] = None):
+        """Record an event for these users and wake their parked polls"""
+        now = self.clock()
+        self.stats["events"] += 1
+        self._position += 1
+        if event_id is not None:
+            self._stream[event_id] = (self._position, now)
+            self._last_event_id = event_id
+        for user_id in set(user_ids):
+            if user_id is None:
+                continue
+            events = self._events.get(user_id)
+            if events is None:
+                events = self._events[user_id] = deque(maxlen=self.max_events_per_user)
+            elif len(events) == self.max_events_per_user:
+                self._dropped[user_id] = events[0][0]
+            events.append((self._position, now, event))
+            self._events.move_to_end(user_id)
+            self._wake(user_id)
+        self._wake_stream()
+        self._expire(now)
+
+    def resync(self):
+        """Notifications may have been lost: make every poll (parked or not yet sent) resync"""
+        self._resync_position = self._position
+        self._generation += 1
+        self._last_event_id = None
+        self._events.clear()
+        self._dropped.clear()
+        for user_id in list(self._waiters):
+            self._wake(user_id)
+        self._wake_stream()
+
+    async def wait(self, user_id: int, since: Optional[int], timeout: float) -> Tuple[List[Dict[str, Any]], bool, Optional[int]]:
+        """(events after cursor `since`, resync, cursor for the next poll); waits up to `timeout` for the first event"""
+        self.stats["polls"] += 1
+        if since is None:
+            # First poll: only what happens from now on
+            position = self._position
+        else:
+            position = await self._position_of(since, min(timeout, CURSOR_WAIT))
+            if position is None or position <= self._resync_position:
+                self.stats["resyncs"] += 1
+                return [], True, self.cursor
+        generation = self._generation
+
+        result = self._collect(user_id, position, generation)
+        if result[0] or result[1] or timeout <= 0:
+            return result
+
+        if self._waiting >= self.max_waiters:
+            self.stats["rejected"] += 1
+            raise TooManyWaiters()
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(user_id, set()).add(waiter)
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(waiter, timeout)
+            self.stats["woken"] += 1
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+        finally:
+            self._waiting -= 1
+            waiters = self._waiters.get(user_id)
+            if waiters is not None:
+                waiters.discard(waiter)
+                if not waiters:
+                    del self._waiters[user_id]
+
+        return self._collect(user_id, position, generation)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {**self.stats, "waiting": self._waiting, "buffered_users": len(self._events), "stream": len(self._stream)}
+
+    async def _position_of(self, event_id: int, timeout: float) -> Optional[int]:
+        """This worker's position of a cursor's event, waiting up to `timeout` if it has not arrived yet"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while event_id not in self._stream:
+            # Another worker got it first, or it has expired / was lost (then resync after the wait)
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return None
+            waiter = loop.create_future()
+            self._stream_waiters.add(waiter)
+            try:
+                await asyncio.wait_for(waiter, remaining)
+            except asyncio.TimeoutError:
+                return None
+            finally:
+                self._stream_waiters.discard(waiter)
+        return self._stream[event_id][0]
+
+    def _collect(self, user_id: int, position: int, generation: int) -> Tuple[List[Dict[str, Any]], bool, Optional[int]]:
+        if generation != self._generation:
+            self.stats["resyncs"] += 1
+            return [], True, self.cursor
+        # The buffer was full and dropped events the client has not seen
+        if self._dropped.get(user_id, 0) > position:
+            self.stats["resyncs"] += 1
+            return [], True, self.cursor
+        events = self._events.get(user_id, ())
+        return [event for event_position, _, event in events if event_position > position], False, self.cursor
+
+    def _wake(self, user_id: int):
+        for waiter in self._waiters.get(user_id, ()):
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def _wake_stream(self):
+        for waiter in self._stream_waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def _expire(self, now: float):
+        # Users are ordered by their latest event, so stale buffers are at the front
+        cutoff = now - self.retention
+        while self._events:
+            user_id, events = next(iter(self._events.items()))
+            if events[-1][1] > cutoff:
+                break
+            del self._events[user_id]
+            self._dropped.pop(user_id, None)
+        # The latest event stays: on a quiet system it is every client's cursor
+        while len(self._stream) > 1:
+            event_id, (_, received_at) = next(iter(self._stream.items()))
+            if received_at > cutoff:
+                break
+            del self._stream[event_id]
+
+    # NotificationHub callbacks
+    def handle_order_change(self, payload: str):
+        change = json.loads(payload)
+        self.publish((change.get("buyer_id"), change.get("cook_user_id")), {
+            "type": "order",
+            "order_id": change["order_id"],
+            "batch_order_id": change.get("batch_order_id"),
+            "status": change.get("status"),
+            "version": change.get("version"),
+            "updated_at": change.get("updated_at"),
+        }, change.get("event_id"))
+
+    def handle_message(self, payload: str):
+        message = json.loads(payload)
+        self.publish(message.get("user_ids") or (), {
+            "type": "message",
+            "message_id": message["message_id"],
+            "order_id": message["order_id"],
+            "sender_id": message.get("sender_id"),
+            "created_at": message.get("created_at"),
+        }, message.get("event_id"))
+
+@lru_cache(maxsize=1)
+def get_update_waiters() -> UpdateWaiters:
+    """The process-wide waiters; fed by the notification hub started with the application"""
+    return UpdateWaiters(
+        retention=settings.longpoll_retention,
+        max_events_per_user=settings.longpoll_max_events_per_user,
+        max_waiters=settings.longpoll_max_waiters,
+    )
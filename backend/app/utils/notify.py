@@ -0,0 +1,146 @@
+"""
+Postgres LISTEN/NOTIFY fan-out.
+
+Each worker process holds one dedicated LISTEN connection (outside the pool) and
+dispatches notifications to in-process callbacks. Publishing goes through `notify()` on
+the caller's connection, so a notification sent inside a transaction is only delivered
+if and when that transaction commits.
+"""
+
+import asyncio
+import json
+import logging
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, List
+
+import asyncpg
+
+from app.database import connect_listener
+
+logger = logging.getLogger(__name__)
+
+NotificationCallback = Callable[[str], None]
+
+# One notification per placed order and per status change, published by a trigger on orders
+# (migrations/0008_order_status_events.sql, 0012_update_notifications.sql): {"order_id",
+# "batch_order_id", "buyer_id", "cook_id", "cook_user_id", "status", "version", "updated_at"}
+ORDER_CHANGES_CHANNEL = "order_changes"
+
+# One notification per new message, published by a trigger on messages
+# (migrations/0012_update_notifications.sql): {"message_id", "order_id", "sender_id",
+# "created_at", "user_ids"} where user_ids are the order's buyer and cook users
+MESSAGE_CHANGES_CHANNEL = "message_changes"
+
+async def notify(conn: asyncpg.Connection, channel: str, payload: Dict[str, Any]):
+    """Publish a JSON payload on a channel (delivered on commit when inside a transaction)"""
+    await conn.execute("SELECT pg_notify($1, $2)", channel, json.dumps(payload, default=str))
+
+class NotificationHub:
+    """Keeps a LISTEN connection open and calls subscribers for every notification"""
+
+    def __init__(
+        self,
+        connect: Callable[[], Awaitable[asyncpg.Connection]],
+        reconnect_delay: float = 1.0,
+        max_reconnect_delay: float = 30.0,
+        health_check_interval: float = 30.0,
+    ):
+        self.connect = connect
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.health_check_interval = health_check_interval
+        self.connected = False
+        self.stats = {"received": 0, "callback_errors": 0, "reconnects": 0}
+        self._callbacks: Dict[str, List[NotificationCallback]] = {}
+        self._reconnect_callbacks: List[Callable[[], None]] = []
+        self._stopping = None
+        self._task = None
+
+    def subscribe(self, channel: str, callback: NotificationCallback):
+        """Call `callback(payload)` for every notification on `channel`; subscribe before start()"""
+        self._callbacks.setdefault(channel, []).append(callback)
+
+    def on_reconnect(self, callback: Callable[[], None]):
+        """Call `callback()` whenever notifications may have been missed (connection lost or re-established)"""
+        self._reconnect_callbacks.append(callback)
+
+    async def start(self):
+        if self._task is None:
+            self._stopping = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stopping.set()
+        await self._task
+        self._task = None
+
+    async def _run(self):
+        delay = self.reconnect_delay
+        while not self._stopping.is_set():
+            try:
+                conn = await self.connect()
+            except (OSError, asyncpg.PostgresError, asyncio.TimeoutError) as e:
+                logger.error(f"Notification listener could not connect, retrying in {delay:.0f}s: {e}")
+                await self._sleep(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+                continue
+
+            try:
+                for channel in self._callbacks:
+                    await conn.add_listener(channel, self._dispatch)
+                self.connected = True
+                delay = self.reconnect_delay
+                logger.info(f"Listening for notifications on {', '.join(self._callbacks) or 'no channels'}")
+                # Anything published while we were not listening is lost
+                self._missed_notifications()
+                await self._watch(conn)
+            except (OSError, asyncpg.PostgresError, asyncio.TimeoutError) as e:
+                logger.error(f"Notification listener connection lost: {e}")
+            finally:
+                if self.connected:
+                    self.connected = False
+                    self._missed_notifications()
+                if not conn.is_closed():
+                    await conn.close()
+
+            if not self._stopping.is_set():
+                self.stats["reconnects"] += 1
+                await self._sleep(delay)
+
+    async def _watch(self, conn: asyncpg.Connection):
+        # Return when stopping; raise when the connection dies (including half-open sockets)
+        while not self._stopping.is_set():
+            await self._sleep(self.health_check_interval)
+            if conn.is_closed():
+                raise ConnectionError("listener connection closed")
+            if not self._stopping.is_set():
+                await conn.execute("SELECT 1", timeout=10)
+
+    async def _sleep(self, seconds: float):
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    def _dispatch(self, conn: asyncpg.Connection, pid: int, channel: str, payload: str):
+        self.stats["received"] += 1
+        for callback in self._callbacks.get(channel, ()):
+            try:
+                callback(payload)
+            except Exception as e:
+                self.stats["callback_errors"] += 1
+                logger.error(f"Notification callback for '{channel}' failed: {e!r}")
+
+    def _missed_notifications(self):
+        for callback in self._reconnect_callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Notification reconnect callback failed: {e!r}")
+
+@lru_cache(maxsize=1)
+def get_notification_hub() -> NotificationHub:
+    """The process-wide hub; started and stopped with the application"""
+    return NotificationHub(connect_listener)
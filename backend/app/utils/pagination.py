@@ -0,0 +1,37 @@
+"""
+Keyset (cursor) pagination for lists ordered by `created_at DESC, id DESC`.
+
+A page is fetched with `WHERE (created_at, id) < (cursor created_at, cursor id)`, which an
+index on (..., created_at DESC, id DESC) answers without reading the skipped rows the way
+OFFSET does, and which does not shift when rows are added in front of the page. The cursor
+for the next page is sent in the X-Next-Cursor response header and is absent on the last page.
+"""
+
+import base64
+from datetime import datetime
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, status
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """Opaque cursor pointing just past the row with this created_at and id"""
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{row_id}".encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    """(created_at, id) from a cursor made by encode_cursor; 400 if it is malformed"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.split("|")
+        parsed = datetime.fromisoformat(created_at)
+        if parsed.tzinfo is None:
+            raise ValueError("cursor timestamp has no time zone")
+        return parsed, int(row_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
@@ -0,0 +1,169 @@
+import json
+import math
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.config import settings
+from app.utils.auth import decode_token_subject
+from app.utils.routes import RouteClass, classify_route
+from app.utils.shared_store import SharedStore, refill_bucket
+
+@dataclass(frozen=True)
+class Limit:
+    """A token bucket: `per_minute` sustained rate with bursts up to `burst` requests"""
+    name: str
+    scope: str  # "ip" or "user"
+    per_minute: int
+    burst: int
+
+    @property
+    def rate(self) -> float:
+        return self.per_minute / 60.0
+
+def make_limit(name: str, scope: str, per_minute: int) -> Limit:
+    return Limit(name, scope, per_minute, max(1, int(per_minute * settings.rate_limit_burst_ratio)))
+
+def default_policies() -> Dict[RouteClass, List[Limit]]:
+    """Limits applied per route class; every limit must pass for a request to proceed"""
+    ip_ceiling = make_limit("ip", "ip", settings.rate_limit_ip_per_minute)
+    user_default = make_limit("user", "user", settings.rate_limit_default_per_minute)
+    return {
+        RouteClass.AUTH: [make_limit("auth", "ip", settings.rate_limit_auth_per_minute)],
+        RouteClass.PUBLIC_READ: [make_limit("browse", "ip", settings.rate_limit_public_read_per_minute)],
+        RouteClass.ORDER_WRITE: [make_limit("order_write", "user", settings.rate_limit_order_write_per_minute), ip_ceiling],
+        RouteClass.ADMIN: [make_limit("admin", "user", settings.rate_limit_admin_per_minute), ip_ceiling],
+        RouteClass.READ: [user_default, ip_ceiling],
+        RouteClass.WRITE: [user_default, ip_ceiling],
+    }
+
+class RateLimitBackend(ABC):
+    """Where bucket state lives"""
+
+    @abstractmethod
+    async def take(self, key: str, limit: Limit, cost: float = 1.0) -> Tuple[bool, float]:
+        """Take tokens for `key`; returns (allowed, retry_after seconds)"""
+
+    async def refund(self, key: str, limit: Limit, cost: float = 1.0):
+        """Give back tokens taken for a request that a later limit rejected"""
+        await self.take(key, limit, -cost)
+
+class InMemoryBackend(RateLimitBackend):
+    """Per-process buckets (default). Limits are per worker, but checks cost no I/O at all."""
+
+    def __init__(self, max_keys: int = 100_000, clock=time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def take(self, key: str, limit: Limit, cost: float = 1.0) -> Tuple[bool, float]:
+        now = self.clock()
+        tokens, updated_at = self._buckets.pop(key, (float(limit.burst), now))
+        allowed, tokens, retry_after = refill_bucket(tokens, updated_at, now, limit.rate, limit.burst, cost)
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            # Least recently used bucket goes first; a forgotten bucket simply starts full
+            self._buckets.popitem(last=False)
+        return allowed, retry_after
+
+class SharedBackend(RateLimitBackend):
+    """Buckets shared by all workers through a SharedStore"""
+
+    def __init__(self, store: SharedStore):
+        self.store = store
+
+    async def take(self, key: str, limit: Limit, cost: float = 1.0) -> Tuple[bool, float]:
+        return await self.store.take_tokens(key, limit.rate, limit.burst, cost)
+
+def client_ip(scope: Scope) -> str:
+    if settings.trust_proxy_headers:
+        # Each proxy appends the address it received from, so only the last TRUSTED_PROXY_HOPS
+        # entries are ours; anything to their left was written by the client and can be forged
+        forwarded = [
+            entry.strip()
+            for name, value in scope.get("headers", []) if name == b"x-forwarded-for"
+            for entry in value.decode("latin-1").split(",") if entry.strip()
+        ]
+        if forwarded:
+            return forwarded[-min(len(forwarded), max(1, settings.trusted_proxy_hops))]
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+def user_identity(scope: Scope) -> Optional[str]:
+    """User id from a valid bearer token, without touching the database"""
+    for name, value in scope.get("headers", []):
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                return decode_token_subject(token)
+    return None
+
+class RateLimitMiddleware:
+    """ASGI middleware enforcing per-IP and per-user token buckets by route class.
+
+    Rejections are answered here with a 429 before routing, so they never reach
+    a dependency that opens a database connection.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        backend: Optional[RateLimitBackend] = None,
+        policies: Optional[Dict[RouteClass, List[Limit]]] = None,
+    ):
+        self.app = app
+        self.backend = backend or InMemoryBackend(max_keys=settings.rate_limit_max_keys)
+        self.policies = policies if policies is not None else default_policies()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        limits = self.policies.get(classify_route(scope["method"], scope["path"]), [])
+        if limits:
+            retry_after = await self.check(scope, limits)
+            if retry_after is not None:
+                await self.reject(send, retry_after)
+                return
+
+        await self.app(scope, receive, send)
+
+    async def check(self, scope: Scope, limits: List[Limit]) -> Optional[float]:
+        """Return None if allowed, otherwise seconds until the request would be allowed"""
+        ip = client_ip(scope)
+        user = None
+        if any(limit.scope == "user" for limit in limits):
+            user = user_identity(scope)
+
+        taken = []
+        for limit in limits:
+            identity = ip if limit.scope == "ip" else user
+            if identity is None:
+                continue  # anonymous requests are covered by the IP limits
+            key = f"rl:{limit.name}:{limit.scope}:{identity}"
+            allowed, retry_after = await self.backend.take(key, limit)
+            if not allowed:
+                # A rejected request must not use up the buckets that did let it through
+                for taken_key, taken_limit in taken:
+                    await self.backend.refund(taken_key, taken_limit)
+                return retry_after
+            taken.append((key, limit))
+        return None
+
+    async def reject(self, send: Send, retry_after: float):
+        body = json.dumps({"detail": "Too many requests"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
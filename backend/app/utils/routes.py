@@ -0,0 +1,33 @@
+from enum import Enum
+
+class RouteClass(str, Enum):
+    """Coarse request classes used for per-class policies (rate limits, budgets)"""
+    EXEMPT = "exempt"            # health checks and docs
+    AUTH = "auth"                # login/register: each call burns a bcrypt hash or verify
+    PUBLIC_READ = "public_read"  # anonymous browsing of cooks and menus
+    ORDER_WRITE = "order_write"  # placing and updating orders
+    ADMIN = "admin"
+    READ = "read"                # other authenticated reads
+    WRITE = "write"              # other authenticated writes
+
+EXEMPT_PATHS = {"/", "/health", "/docs", "/redoc", "/openapi.json"}
+AUTH_PATHS = {"/auth/login", "/auth/token", "/auth/register"}
+PUBLIC_READ_PREFIXES = ("/menu", "/cooks")
+
+def classify_route(method: str, path: str) -> RouteClass:
+    """Map a request to its route class using only the method and path"""
+    if path in EXEMPT_PATHS or path.startswith("/docs"):
+        return RouteClass.EXEMPT
+    if path == "/batch":
+        return RouteClass.EXEMPT  # each sub-request is classified (and limited) on its own
+    if path in AUTH_PATHS:
+        return RouteClass.AUTH
+    if path.startswith("/admin"):
+        return RouteClass.ADMIN
+
+    is_read = method in ("GET", "HEAD", "OPTIONS")
+    if path.startswith("/orders") and not is_read:
+        return RouteClass.ORDER_WRITE
+    if is_read and path.startswith(PUBLIC_READ_PREFIXES) and not path.startswith("/cooks/me"):
+        return RouteClass.PUBLIC_READ
+    return RouteClass.READ if is_read else RouteClass.WRITE
@@ -0,0 +1,159 @@
+import math
+import time
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+from app.config import settings
+
+def refill_bucket(
+    tokens: float, updated_at: float, now: float, rate: float, capacity: float, cost: float
+) -> Tuple[bool, float, float]:
+    """Token bucket step: returns (allowed, remaining tokens, seconds until enough tokens); a negative cost refunds"""
+    tokens = min(capacity, tokens + max(0.0, now - updated_at) * rate)
+    if tokens >= cost:
+        return True, min(capacity, tokens - cost), 0.0
+    return False, tokens, (cost - tokens) / rate
+
+def bucket_ttl(rate: float, capacity: float) -> int:
+    """Seconds after which an untouched bucket is full again and can be forgotten"""
+    return max(1, math.ceil(capacity / rate))
+
+class SharedStore(ABC):
+    """State shared by every worker process (e.g. Redis)"""
+
+    @abstractmethod
+    async def take_tokens(self, key: str, rate: float, capacity: float, cost: float = 1.0) -> Tuple[bool, float]:
+        """Atomically take `cost` tokens from a bucket; returns (allowed, retry_after seconds)"""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[bytes]:
+        """Value for key, or None if missing/expired"""
+
+    @abstractmethod
+    async def set(self, key: str, value: bytes, ttl: float):
+        """Store value for `ttl` seconds"""
+
+    @abstractmethod
+    async def delete(self, *keys: str):
+        """Remove keys (missing keys are ignored)"""
+
+    async def close(self):
+        pass
+
+class LocalSharedStore(SharedStore):
+    """In-process stand-in for a shared store with the same semantics as RedisSharedStore.
+
+    State is kept the way Redis keeps it (per-key fields plus an expiry) so it can be
+    used for tests and single-process development without a Redis server.
+    """
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self._buckets: Dict[str, Tuple[float, float, float]] = {}  # key -> (tokens, updated_at, expires_at)
+        self._values: Dict[str, Tuple[bytes, float]] = {}  # key -> (value, expires_at)
+
+    async def take_tokens(self, key: str, rate: float, capacity: float, cost: float = 1.0) -> Tuple[bool, float]:
+        # No await between read and write, so this is atomic within the event loop
+        now = self.clock()
+        tokens, updated_at, expires_at = self._buckets.get(key, (capacity, now, now))
+        if expires_at < now:
+            tokens, updated_at = capacity, now
+        allowed, tokens, retry_after = refill_bucket(tokens, updated_at, now, rate, capacity, cost)
+        self._buckets[key] = (tokens, now, now + bucket_ttl(rate, capacity))
+        self._expire(now)
+        return allowed, retry_after
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._values.get(key)
+        if entry is None or entry[1] < self.clock():
+            return None
+        return entry[0]
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        now = self.clock()
+        self._values[key] = (value, now + ttl)
+        self._expire(now)
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self._values.pop(key, None)
+
+    def _expire(self, now: float):
+        # Cheap amortised cleanup, mirroring key expiry in Redis
+        if len(self._buckets) > 10_000:
+            for key in [key for key, (_, _, expires_at) in self._buckets.items() if expires_at < now]:
+                del self._buckets[key]
+        if len(self._values) > 10_000:
+            for key in [key for key, (_, expires_at) in self._values.items() if expires_at < now]:
+                del self._values[key]
+
+TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local ttl = tonumber(ARGV[4])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = math.min(capacity, tokens - cost)
+    allowed = 1
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], ttl)
+return {allowed, tostring(retry_after)}
+"""
+
+class RedisSharedStore(SharedStore):
+    """Shared store backed by Redis (requires the optional `redis` package)"""
+
+    def __init__(self, url: str, key_prefix: str = "adresur:"):
+        try:
+            from redis import asyncio as redis_asyncio
+        except ImportError as e:
+            raise RuntimeError("The 'redis' package is required for a redis:// shared store") from e
+        self.client = redis_asyncio.from_url(url)
+        self.key_prefix = key_prefix
+        self._token_bucket = self.client.register_script(TOKEN_BUCKET_LUA)
+
+    async def take_tokens(self, key: str, rate: float, capacity: float, cost: float = 1.0) -> Tuple[bool, float]:
+        allowed, retry_after = await self._token_bucket(
+            keys=[self.key_prefix + key], args=[rate, capacity, cost, bucket_ttl(rate, capacity)]
+        )
+        return bool(int(allowed)), float(retry_after)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(self.key_prefix + key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self.client.set(self.key_prefix + key, value, px=max(1, int(ttl * 1000)))
+
+    async def delete(self, *keys: str):
+        if keys:
+            await self.client.delete(*(self.key_prefix + key for key in keys))
+
+    async def close(self):
+        await self.client.close()
+
+def create_shared_store(url: str) -> Optional[SharedStore]:
+    """Build a shared store from a URL: '' (none), 'local://' or 'redis://...'"""
+    if not url:
+        return None
+    if url.startswith("local://"):
+        return LocalSharedStore()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisSharedStore(url)
+    raise ValueError(f"Unsupported shared store URL: {url}")
+
+@lru_cache(maxsize=1)
+def get_shared_store() -> Optional[SharedStore]:
+    """The process-wide shared store configured by SHARED_STORE_URL, if any"""
+    return create_shared_store(settings.shared_store_url)
@@ -0,0 +1,131 @@
+"""
+Per-route-class query budgets and cancellation of requests whose client has gone away.
+
+`RequestTimeoutMiddleware` classifies each request (app/utils/routes.py) and records its
+per-query budget in a context variable. `acquire_connection` (app/database.py) hands the
+request a connection that passes the budget as asyncpg's `timeout=` to every query that does
+not set its own. A query that runs past it is cancelled on the server by asyncpg, and the
+resulting TimeoutError is answered with a 504 (app/main.py) instead of holding the connection
+until it finishes.
+
+The budget is enforced by the client on purpose. DATABASE_URL is normally a transaction-mode
+pgbouncer, where a session `SET statement_timeout` stays on whichever server connection ran it
+and is inherited by the next transaction there, from any client.
+
+The middleware also watches the connection. If the client disconnects before the response
+is complete, the request's task is cancelled. asyncpg then cancels the query in flight on
+the server, and the connection goes back to the pool instead of finishing work nobody will
+read.
+"""
+
+import asyncio
+import logging
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+from app.utils.routes import RouteClass, classify_route
+
+logger = logging.getLogger(__name__)
+
+# Per-query budget (ms) for connections checked out by the current request; None: no limit
+statement_timeout_ms: ContextVar[Optional[int]] = ContextVar("statement_timeout_ms", default=None)
+
+def default_budgets() -> Dict[RouteClass, int]:
+    """Per-query budget per route class, in milliseconds; classes not listed are not limited"""
+    return {
+        RouteClass.AUTH: settings.statement_timeout_auth_ms,
+        RouteClass.PUBLIC_READ: settings.statement_timeout_public_read_ms,
+        RouteClass.ORDER_WRITE: settings.statement_timeout_order_write_ms,
+        RouteClass.ADMIN: settings.statement_timeout_admin_ms,
+        RouteClass.READ: settings.statement_timeout_read_ms,
+        RouteClass.WRITE: settings.statement_timeout_write_ms,
+    }
+
+# Query methods that take a `timeout=`; everything else is passed through untouched
+BUDGETED_METHODS = frozenset({"execute", "executemany", "fetch", "fetchrow", "fetchval", "fetchmany"})
+
+class BudgetedConnection:
+    """Connection wrapper giving queries without an explicit `timeout=` the request's budget"""
+
+    def __init__(self, conn, timeout: float):
+        self._conn = conn
+        self._timeout = timeout
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._conn, name)
+        if name not in BUDGETED_METHODS:
+            return attr
+
+        async def budgeted(*args, timeout: Optional[float] = None, **kwargs):
+            return await attr(*args, timeout=timeout if timeout is not None else self._timeout, **kwargs)
+        return budgeted
+
+def with_query_budget(conn):
+    """Wrap a checked-out connection in the current request's budget; unchanged if it has none"""
+    timeout_ms = statement_timeout_ms.get()
+    if not timeout_ms:
+        return conn
+    return BudgetedConnection(conn, timeout_ms / 1000)
+
+class RequestTimeoutMiddleware:
+    """ASGI middleware setting the request's query budget and cancelling it on client disconnect"""
+
+    def __init__(self, app: ASGIApp, budgets: Optional[Dict[RouteClass, int]] = None):
+        self.app = app
+        self.budgets = budgets if budgets is not None else default_budgets()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        budget = self.budgets.get(classify_route(scope["method"], scope["path"]))
+        token = statement_timeout_ms.set(budget or None)
+        try:
+            await self.run(scope, receive, send)
+        finally:
+            statement_timeout_ms.reset(token)
+
+    async def run(self, scope: Scope, receive: Receive, send: Send):
+        # Only the watcher reads from the server; the application reads what it forwards,
+        # so request bodies still arrive and disconnects are seen by both
+        messages: "asyncio.Queue[Message]" = asyncio.Queue()
+
+        async def watch() -> None:
+            while True:
+                message = await receive()
+                messages.put_nowait(message)
+                if message["type"] == "http.disconnect":
+                    return
+
+        response_complete = False
+
+        async def send_and_track(message: Message) -> None:
+            nonlocal response_complete
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                response_complete = True
+
+        app_task = asyncio.ensure_future(self.app(scope, messages.get, send_and_track))
+        watcher = asyncio.ensure_future(watch())
+        try:
+            await asyncio.wait((app_task, watcher), return_when=asyncio.FIRST_COMPLETED)
+            # Once the response is out the server reports a disconnect too; let the app finish
+            if not app_task.done() and not response_complete:
+                # The client is gone; nothing will read the response
+                logger.info(f"Client disconnected, cancelling {scope['method']} {scope['path']}")
+                app_task.cancel()
+                try:
+                    await app_task
+                except asyncio.CancelledError:
+                    pass
+                return
+            await app_task
+        finally:
+            watcher.cancel()
+            if not app_task.done():
+                # Our own caller was cancelled (server shutdown); take the request down with it
+                app_task.cancel()
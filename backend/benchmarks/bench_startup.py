@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Cold start benchmark for the Adresur API
+
+Measures, in fresh interpreter processes:
+- import time and peak RSS of `app.main` (what every new worker pays before serving)
+- time to first request: launching uvicorn until GET /health returns 200
+
+Run from the backend directory:
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --runs 10 --top-imports 15
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+from typing import List, Tuple
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+IMPORT_PROBE = """
+import resource, time
+started = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - started
+print(elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def measure_import() -> Tuple[float, int]:
+    """Return (seconds to import app.main, peak RSS in KB) from a fresh interpreter"""
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_PROBE],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    ).stdout.split()
+    return float(output[0]), int(output[1])
+
+def measure_first_request(timeout: float = 30.0) -> float:
+    """Return seconds from spawning uvicorn until /health answers"""
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.01)
+        raise TimeoutError(f"server did not answer within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+def top_imports(limit: int) -> List[Tuple[int, str]]:
+    """Slowest modules (cumulative microseconds) according to python -X importtime"""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    ).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative), name.rstrip()))
+    return sorted(rows, reverse=True)[:limit]
+
+def summarize(label: str, samples: List[float], unit: str = "ms", scale: float = 1000.0):
+    values = sorted(sample * scale for sample in samples)
+    p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+    print(f"{label:<28} median {statistics.median(values):8.1f} {unit}   min {values[0]:8.1f} {unit}   p95 {p95:8.1f} {unit}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark app import time and time to first request")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top-imports", type=int, default=10, help="Show the N slowest imports (0 to skip)")
+    parser.add_argument("--skip-server", action="store_true", help="Only measure import time")
+    args = parser.parse_args()
+
+    print(f"⏱️  Cold start benchmark ({args.runs} runs, Python {sys.version.split()[0]}, pid {os.getpid()})")
+
+    import_times, peak_rss = [], []
+    for _ in range(args.runs):
+        seconds, rss_kb = measure_import()
+        import_times.append(seconds)
+        peak_rss.append(rss_kb)
+    summarize("import app.main", import_times)
+    summarize("peak RSS after import", [kb / 1024 for kb in peak_rss], unit="MB", scale=1.0)
+
+    if not args.skip_server:
+        summarize("time to first request", [measure_first_request() for _ in range(args.runs)])
+
+    if args.top_imports:
+        print(f"\nSlowest imports (cumulative):")
+        for cumulative_us, name in top_imports(args.top_imports):
+            print(f"  {cumulative_us / 1000:8.1f} ms  {name.strip()}")
+
+if __name__ == "__main__":
+    main()
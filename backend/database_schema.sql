@@ -1,5 +1,6 @@
 -- Adresur Database Schema
 -- This script creates all the necessary tables for the Adresur platform
+-- Later schema changes live in migrations/; apply them with `python migrate.py`
 
 -- Enable UUID extension (if needed)
 -- CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
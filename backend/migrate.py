@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Schema migration runner for Adresur
+
+Applies the pending SQL files in migrations/ in order and records them in
+schema_migrations (see app/migrator.py for the file format and directives).
+
+Usage:
+    python migrate.py                 # apply everything pending
+    python migrate.py --status        # list applied and pending migrations
+    python migrate.py --dry-run       # show which tables each pending statement would lock
+    python migrate.py --target 5 --lock-timeout 2s
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+
+import asyncpg
+
+from app.config import settings
+from app.database import _connection_kwargs
+from app.migrator import LOCK_EFFECTS, MigrationError, Migrator, discover, plan
+
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+async def connect(dsn: str) -> asyncpg.Connection:
+    # Migrations need a session (advisory lock, session settings): avoid transaction-mode pgbouncer
+    if dsn:
+        return await asyncpg.connect(dsn)
+    return await asyncpg.connect(**_connection_kwargs())
+
+def print_plan(migrations) -> None:
+    for migration in migrations:
+        mode = "in a transaction" if migration.transactional else "outside a transaction"
+        print(f"\n📄 {migration.label} ({mode}, lock_timeout={migration.lock_timeout or 'default'})")
+        for statement, locks in plan(migration):
+            print(f"   {statement}")
+            for table, lock in locks:
+                print(f"      🔒 {table}: {lock} ({LOCK_EFFECTS.get(lock, 'see PostgreSQL docs')})")
+
+async def run(args: argparse.Namespace) -> bool:
+    try:
+        migrations = discover()
+    except MigrationError as e:
+        print(f"❌ {e}")
+        return False
+
+    conn = await connect(args.dsn)
+    try:
+        migrator = Migrator(conn, migrations, lock_timeout=args.lock_timeout, retries=args.retries)
+
+        if args.status:
+            applied = await migrator.applied()
+            for migration in migrations:
+                record = applied.get(migration.version)
+                if record is None:
+                    print(f"   ⏳ {migration.label}")
+                elif record['checksum'] != migration.checksum:
+                    print(f"   ⚠️  {migration.label} (applied {record['applied_at']:%Y-%m-%d %H:%M}, file changed since)")
+                else:
+                    print(f"   ✓ {migration.label} (applied {record['applied_at']:%Y-%m-%d %H:%M})")
+            return True
+
+        pending = await migrator.pending(args.target)
+        if not pending:
+            print("✅ Database is up to date")
+            return True
+
+        if args.dry_run:
+            print(f"🔍 {len(pending)} pending migration(s); nothing will be executed")
+            print_plan(pending)
+            return True
+
+        print(f"🔨 Applying {len(pending)} migration(s)...")
+        for migration in await migrator.migrate(args.target):
+            print(f"   ✓ {migration.label}")
+        print("✅ Migrations complete")
+        return True
+    except (MigrationError, asyncpg.PostgresError) as e:
+        print(f"❌ Migration failed: {e}")
+        return False
+    finally:
+        await conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply Adresur schema migrations")
+    parser.add_argument("--dsn", default=settings.migrations_database_url or settings.database_url,
+                        help="Database URL (default: $MIGRATIONS_DATABASE_URL, then $DATABASE_URL)")
+    parser.add_argument("--target", type=int, default=None, help="Stop after this version")
+    parser.add_argument("--lock-timeout", default="5s", help="lock_timeout for each migration (default: 5s)")
+    parser.add_argument("--retries", type=int, default=5, help="Retries when a lock cannot be acquired in time")
+    parser.add_argument("--dry-run", action="store_true", help="Report the locks pending migrations would take")
+    parser.add_argument("--status", action="store_true", help="List applied and pending migrations")
+    args = parser.parse_args()
+
+    success = asyncio.run(run(args))
+    sys.exit(0 if success else 1)
+
+if __name__ == "__main__":
+    main()
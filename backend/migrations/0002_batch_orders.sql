@@ -22,5 +22,5 @@ CREATE INDEX IF NOT EXISTS idx_batch_orders_created_at ON batch_orders(created_a
 CREATE INDEX IF NOT EXISTS idx_orders_batch_order_id ON orders(batch_order_id);
 
 -- Add trigger for batch_orders updated_at
-CREATE TRIGGER update_batch_orders_updated_at BEFORE UPDATE ON batch_orders
+CREATE OR REPLACE TRIGGER update_batch_orders_updated_at BEFORE UPDATE ON batch_orders
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column(); 
\ No newline at end of file
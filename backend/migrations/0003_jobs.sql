@@ -0,0 +1,36 @@
+-- Add a durable background job queue
+-- Workers claim jobs with FOR UPDATE SKIP LOCKED (see app/jobs.py), so any number of
+-- API processes and worker processes can share this table without blocking each other
+
+CREATE TABLE IF NOT EXISTS jobs (
+    id BIGSERIAL PRIMARY KEY,
+    kind VARCHAR(100) NOT NULL,
+    payload JSONB NOT NULL DEFAULT '{}',
+    priority SMALLINT NOT NULL DEFAULT 0,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued'
+        CHECK (status IN ('queued', 'running', 'done', 'failed')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 5,
+    run_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    locked_until TIMESTAMP WITH TIME ZONE,
+    locked_by VARCHAR(100),
+    dedupe_key VARCHAR(255),
+    progress JSONB,
+    last_error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    finished_at TIMESTAMP WITH TIME ZONE
+);
+
+-- Claim order: highest priority first, then oldest due job
+CREATE INDEX IF NOT EXISTS idx_jobs_queued ON jobs(priority DESC, run_at) WHERE status = 'queued';
+-- Finds running jobs whose visibility timeout expired (crashed workers)
+CREATE INDEX IF NOT EXISTS idx_jobs_running_locked_until ON jobs(locked_until) WHERE status = 'running';
+-- Finds finished jobs to purge
+CREATE INDEX IF NOT EXISTS idx_jobs_finished_at ON jobs(finished_at) WHERE status IN ('done', 'failed');
+-- At most one pending job per dedupe key (used for periodic jobs)
+CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_dedupe_key ON jobs(dedupe_key)
+    WHERE dedupe_key IS NOT NULL AND status IN ('queued', 'running');
+
+CREATE OR REPLACE TRIGGER update_jobs_updated_at BEFORE UPDATE ON jobs
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
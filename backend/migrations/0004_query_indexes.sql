@@ -0,0 +1,49 @@
+-- migrate: no-transaction
+-- Composite, partial and covering indexes matched to the router queries
+-- Built CONCURRENTLY so orders/messages keep accepting writes while they build.
+-- Check plans with: python -m benchmarks.bench_index_plans --vacuum
+
+-- orders: GET /orders/?as_cook=true [&status_filter=] -> WHERE cook_id = $1 [AND status = $2] ORDER BY created_at DESC
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_orders_cook_created ON orders(cook_id, created_at DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_orders_cook_status_created ON orders(cook_id, status, created_at DESC);
+
+-- orders: GET /orders/ [&status_filter=] -> WHERE buyer_id = $1 [AND status = $2] ORDER BY created_at DESC
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_orders_buyer_created ON orders(buyer_id, created_at DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_orders_buyer_status_created ON orders(buyer_id, status, created_at DESC);
+
+-- orders: GET /admin/orders?status_filter=
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_orders_status_created ON orders(status, created_at DESC);
+
+-- orders: GET /admin/stats revenue, answered from the index alone (idx_orders_status is kept:
+-- deduplicated it is a fraction of the size above, so the status counts stay index-only too)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_orders_completed_total ON orders(total_price) WHERE status = 'completed';
+
+-- orders.menu_item_id is ON DELETE RESTRICT: without an index every menu item delete scans orders
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_orders_menu_item_id ON orders(menu_item_id);
+
+-- menu_items: GET /menu/cook/{cook_id} and GET /menu/?cook_id= (available_only=true is the default)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_menu_items_available_cook_created ON menu_items(cook_id, created_at DESC) WHERE is_available;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_menu_items_cook_created ON menu_items(cook_id, created_at DESC);
+
+-- menu_items: GET /menu/ (browse everything available, newest first)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_menu_items_available_created ON menu_items(created_at DESC) WHERE is_available;
+
+-- messages: GET /messages/order/{order_id} and GET /admin/messages?order_id=
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_messages_order_created ON messages(order_id, created_at);
+
+-- messages: GET /admin/messages (newest first)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_messages_created_at ON messages(created_at);
+
+-- cook_profiles: GET /cooks/; users: GET /admin/users
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cook_profiles_created_at ON cook_profiles(created_at DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_created_at ON users(created_at DESC);
+
+-- Superseded: each is a prefix of an index above, duplicates a UNIQUE constraint's index,
+-- or (is_available) is too unselective to ever be used. Dropping them speeds up writes.
+DROP INDEX CONCURRENTLY IF EXISTS idx_orders_cook_id;
+DROP INDEX CONCURRENTLY IF EXISTS idx_orders_buyer_id;
+DROP INDEX CONCURRENTLY IF EXISTS idx_menu_items_cook_id;
+DROP INDEX CONCURRENTLY IF EXISTS idx_menu_items_is_available;
+DROP INDEX CONCURRENTLY IF EXISTS idx_messages_order_id;
+DROP INDEX CONCURRENTLY IF EXISTS idx_cook_profiles_user_id;
+DROP INDEX CONCURRENTLY IF EXISTS idx_users_email;
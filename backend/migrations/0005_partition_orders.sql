@@ -0,0 +1,147 @@
+-- migrate: lock-timeout 10s
+-- Partition orders and messages by created_at month, with an archive partition for old orders
+--
+--   orders                      PARTITION BY LIST (archived)
+--     orders_live               archived = false, PARTITION BY RANGE (created_at)
+--       orders_live_YYYY_MM
+--     orders_archive            archived = true: completed/cancelled orders moved by the orders.archive job
+--   messages                    PARTITION BY RANGE (created_at)
+--     messages_YYYY_MM
+--
+-- Both tables are rewritten under an ACCESS EXCLUSIVE lock, so apply this in a quiet period.
+-- Later months are created ahead of time by the partitions.maintain job (app/tasks.py).
+--
+-- Unique keys of a partitioned table must contain its partition keys, so the primary keys
+-- become (id, created_at, archived) and (id, created_at); ids still come from the same
+-- sequences. orders(id) can no longer be the target of a foreign key, so deleting an order
+-- removes its messages with a trigger instead of ON DELETE CASCADE.
+
+-- Creates the missing monthly partitions of `parent` covering first_at..last_at (UTC months),
+-- named <parent>_YYYY_MM; returns the names of the partitions it created
+CREATE OR REPLACE FUNCTION create_monthly_partitions(parent TEXT, first_at TIMESTAMPTZ, last_at TIMESTAMPTZ)
+    RETURNS SETOF TEXT AS $$
+DECLARE
+    month_start TIMESTAMP;
+    partition_name TEXT;
+BEGIN
+    FOR month_start IN
+        SELECT generate_series(
+            date_trunc('month', first_at AT TIME ZONE 'UTC'),
+            date_trunc('month', last_at AT TIME ZONE 'UTC'),
+            INTERVAL '1 month'
+        )
+    LOOP
+        partition_name := format('%s_%s', parent, to_char(month_start, 'YYYY_MM'));
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                partition_name, parent,
+                month_start AT TIME ZONE 'UTC', (month_start + INTERVAL '1 month') AT TIME ZONE 'UTC'
+            );
+            RETURN NEXT partition_name;
+        END IF;
+    END LOOP;
+END;
+$$ language 'plpgsql';
+
+-- Move the old tables aside; their sequences carry over to the new ones
+ALTER TABLE messages DROP CONSTRAINT IF EXISTS messages_order_id_fkey;
+ALTER TABLE orders RENAME TO orders_unpartitioned;
+ALTER TABLE messages RENAME TO messages_unpartitioned;
+ALTER SEQUENCE orders_id_seq OWNED BY NONE;
+ALTER SEQUENCE messages_id_seq OWNED BY NONE;
+
+CREATE TABLE orders (
+    id INTEGER NOT NULL DEFAULT nextval('orders_id_seq'),
+    buyer_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+    menu_item_id INTEGER REFERENCES menu_items(id) ON DELETE RESTRICT,
+    cook_id INTEGER REFERENCES cook_profiles(id) ON DELETE RESTRICT,
+    quantity INTEGER NOT NULL DEFAULT 1 CHECK (quantity > 0),
+    total_price DECIMAL(10,2) NOT NULL CHECK (total_price > 0),
+    status VARCHAR(20) NOT NULL DEFAULT 'pending'
+        CHECK (status IN ('pending', 'preparing', 'ready', 'completed', 'cancelled')),
+    special_instructions TEXT,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    batch_order_id INTEGER REFERENCES batch_orders(id) ON DELETE CASCADE,
+    archived BOOLEAN NOT NULL DEFAULT false
+) PARTITION BY LIST (archived);
+
+CREATE TABLE orders_live PARTITION OF orders FOR VALUES IN (false) PARTITION BY RANGE (created_at);
+CREATE TABLE orders_archive PARTITION OF orders FOR VALUES IN (true);
+
+CREATE TABLE messages (
+    id INTEGER NOT NULL DEFAULT nextval('messages_id_seq'),
+    order_id INTEGER,
+    sender_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+    content TEXT NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+) PARTITION BY RANGE (created_at);
+
+SELECT create_monthly_partitions(
+    'orders_live',
+    (SELECT COALESCE(MIN(created_at), NOW()) FROM orders_unpartitioned),
+    (SELECT GREATEST(MAX(created_at), NOW() + INTERVAL '3 months') FROM orders_unpartitioned)
+);
+SELECT create_monthly_partitions(
+    'messages',
+    (SELECT COALESCE(MIN(created_at), NOW()) FROM messages_unpartitioned),
+    (SELECT GREATEST(MAX(created_at), NOW() + INTERVAL '3 months') FROM messages_unpartitioned)
+);
+
+-- Everything starts live; the orders.archive job moves old finished orders on its first run
+INSERT INTO orders (id, buyer_id, menu_item_id, cook_id, quantity, total_price, status,
+                    special_instructions, created_at, updated_at, batch_order_id)
+SELECT id, buyer_id, menu_item_id, cook_id, quantity, total_price, status,
+       special_instructions, COALESCE(created_at, updated_at, NOW()), updated_at, batch_order_id
+FROM orders_unpartitioned;
+
+INSERT INTO messages (id, order_id, sender_id, content, created_at)
+SELECT id, order_id, sender_id, content, COALESCE(created_at, NOW())
+FROM messages_unpartitioned;
+
+DROP TABLE messages_unpartitioned;
+DROP TABLE orders_unpartitioned;
+
+ALTER SEQUENCE orders_id_seq OWNED BY orders.id;
+ALTER SEQUENCE messages_id_seq OWNED BY messages.id;
+
+-- Keys and indexes (built after the copy; same shapes as 0004, now per partition)
+ALTER TABLE orders ADD CONSTRAINT orders_pkey PRIMARY KEY (id, created_at, archived);
+CREATE INDEX idx_orders_created_at ON orders(created_at);
+CREATE INDEX idx_orders_batch_order_id ON orders(batch_order_id);
+CREATE INDEX idx_orders_cook_created ON orders(cook_id, created_at DESC);
+CREATE INDEX idx_orders_cook_status_created ON orders(cook_id, status, created_at DESC);
+CREATE INDEX idx_orders_buyer_created ON orders(buyer_id, created_at DESC);
+CREATE INDEX idx_orders_buyer_status_created ON orders(buyer_id, status, created_at DESC);
+CREATE INDEX idx_orders_status_created ON orders(status, created_at DESC);
+CREATE INDEX idx_orders_status ON orders(status);
+CREATE INDEX idx_orders_completed_total ON orders(total_price) WHERE status = 'completed';
+CREATE INDEX idx_orders_menu_item_id ON orders(menu_item_id);
+
+ALTER TABLE messages ADD CONSTRAINT messages_pkey PRIMARY KEY (id, created_at);
+CREATE INDEX idx_messages_order_created ON messages(order_id, created_at);
+CREATE INDEX idx_messages_created_at ON messages(created_at);
+CREATE INDEX idx_messages_sender_id ON messages(sender_id);
+
+-- Archiving only flips `archived`; it is not an edit of the order
+CREATE OR REPLACE TRIGGER update_orders_updated_at BEFORE UPDATE ON orders
+    FOR EACH ROW WHEN (OLD.archived = NEW.archived) EXECUTE FUNCTION update_updated_at_column();
+
+-- Replaces messages.order_id ... ON DELETE CASCADE
+CREATE OR REPLACE FUNCTION delete_order_messages()
+    RETURNS TRIGGER AS $$
+BEGIN
+    -- Moving an order to another partition (archiving) also fires this; the order still exists then
+    IF NOT EXISTS (SELECT 1 FROM orders WHERE id = OLD.id AND created_at = OLD.created_at) THEN
+        DELETE FROM messages WHERE order_id = OLD.id;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE OR REPLACE TRIGGER delete_order_messages AFTER DELETE ON orders
+    FOR EACH ROW EXECUTE FUNCTION delete_order_messages();
+
+ANALYZE orders;
+ANALYZE messages;
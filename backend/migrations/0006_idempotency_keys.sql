@@ -0,0 +1,17 @@
+-- Idempotency keys for order placement (see app/utils/idempotency.py)
+-- The key and the response it produced are written in the same transaction as the orders,
+-- so a retried request either finds the stored response or places the orders itself
+
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    idempotency_key VARCHAR(255) NOT NULL,
+    request_hash CHAR(64) NOT NULL,
+    status_code SMALLINT NOT NULL,
+    response JSON NOT NULL,  -- JSON, not JSONB: replays return the original bytes
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    PRIMARY KEY (user_id, idempotency_key)
+);
+
+-- Finds expired keys to purge
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires_at ON idempotency_keys(expires_at);
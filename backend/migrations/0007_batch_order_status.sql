@@ -0,0 +1,78 @@
+-- migrate: no-transaction
+-- Batch order listing (GET /orders/batches) and batch status kept in sync with its orders
+--
+-- A batch's status is derived from its orders by a statement-level trigger, so a statement
+-- that changes many orders recomputes each affected batch once:
+--   all cancelled                         -> cancelled
+--   all completed or cancelled            -> completed
+--   all ready, completed or cancelled     -> ready
+--   any preparing, ready or completed     -> preparing
+--   otherwise                             -> pending
+
+-- GET /orders/batches -> WHERE buyer_id = $1 [AND (created_at, id) < cursor] ORDER BY created_at DESC, id DESC
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_batch_orders_buyer_created ON batch_orders(buyer_id, created_at DESC, id DESC);
+
+-- Superseded by the index above
+DROP INDEX CONCURRENTLY IF EXISTS idx_batch_orders_buyer_id;
+
+CREATE OR REPLACE FUNCTION sync_batch_order_status(batch_ids INTEGER[])
+    RETURNS VOID AS $$
+BEGIN
+    IF cardinality(batch_ids) = 0 THEN
+        RETURN;
+    END IF;
+
+    -- Lock the batches first: the UPDATE below takes a new snapshot, so it also sees sibling
+    -- orders that concurrent transactions changed and committed while this one waited
+    PERFORM 1 FROM batch_orders WHERE id = ANY(batch_ids) ORDER BY id FOR UPDATE;
+
+    UPDATE batch_orders b
+    SET status = derived.status
+    FROM (
+        SELECT
+            batch_order_id,
+            CASE
+                WHEN bool_and(status = 'cancelled') THEN 'cancelled'
+                WHEN bool_and(status IN ('completed', 'cancelled')) THEN 'completed'
+                WHEN bool_and(status IN ('ready', 'completed', 'cancelled')) THEN 'ready'
+                WHEN bool_or(status IN ('preparing', 'ready', 'completed')) THEN 'preparing'
+                ELSE 'pending'
+            END AS status
+        FROM orders
+        WHERE batch_order_id = ANY(batch_ids)
+        GROUP BY batch_order_id
+    ) derived
+    WHERE b.id = derived.batch_order_id AND b.status <> derived.status;
+END;
+$$ language 'plpgsql';
+
+CREATE OR REPLACE FUNCTION sync_batch_order_status_trigger()
+    RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        -- Archiving moves rows between partitions without changing their status; skip those
+        PERFORM sync_batch_order_status(ARRAY(
+            SELECT DISTINCT new_orders.batch_order_id
+            FROM new_orders
+            JOIN old_orders ON old_orders.id = new_orders.id AND old_orders.created_at = new_orders.created_at
+            WHERE new_orders.batch_order_id IS NOT NULL AND new_orders.status <> old_orders.status
+        ));
+    ELSE
+        PERFORM sync_batch_order_status(ARRAY(
+            SELECT DISTINCT batch_order_id FROM old_orders WHERE batch_order_id IS NOT NULL
+        ));
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE OR REPLACE TRIGGER sync_batch_order_status_on_update AFTER UPDATE ON orders
+    REFERENCING OLD TABLE AS old_orders NEW TABLE AS new_orders
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_batch_order_status_trigger();
+
+CREATE OR REPLACE TRIGGER sync_batch_order_status_on_delete AFTER DELETE ON orders
+    REFERENCING OLD TABLE AS old_orders
+    FOR EACH STATEMENT EXECUTE FUNCTION sync_batch_order_status_trigger();
+
+-- Bring existing batches in line
+SELECT sync_batch_order_status(ARRAY(SELECT id FROM batch_orders));
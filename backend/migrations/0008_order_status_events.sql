@@ -0,0 +1,99 @@
+-- migrate: lock-timeout 5s
+-- Order versions for compare-and-swap updates, and an append-only status history
+--
+-- orders.version starts at 1 and goes up by one on every edit (archiving aside), so
+-- `UPDATE ... WHERE id = $1 AND version = $2` only succeeds if nobody changed the order since
+-- it was read. Every placed order and every status change appends a row to
+-- order_status_events and publishes it on the order_changes channel, whichever code path
+-- made the change. Each event records when the order entered its previous status, so
+-- time-in-status is `created_at - from_status_since` without looking at orders.
+
+-- Constant defaults: neither column rewrites the table
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS status_changed_at TIMESTAMP WITH TIME ZONE;  -- NULL: unchanged since created_at
+
+CREATE OR REPLACE FUNCTION bump_order_version()
+    RETURNS TRIGGER AS $$
+BEGIN
+    NEW.version = OLD.version + 1;
+    IF NEW.status <> OLD.status THEN
+        NEW.status_changed_at = NOW();
+    END IF;
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+-- Archiving only flips `archived`; it is not an edit of the order
+CREATE OR REPLACE TRIGGER bump_order_version BEFORE UPDATE ON orders
+    FOR EACH ROW WHEN (OLD.archived = NEW.archived) EXECUTE FUNCTION bump_order_version();
+
+CREATE TABLE IF NOT EXISTS order_status_events (
+    id BIGSERIAL,
+    order_id INTEGER NOT NULL,
+    cook_id INTEGER,
+    from_status VARCHAR(20),                      -- NULL for the event written when the order is placed
+    to_status VARCHAR(20) NOT NULL,
+    from_status_since TIMESTAMP WITH TIME ZONE,   -- when the order entered from_status
+    version INTEGER NOT NULL,                     -- the order's version after the change
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+SELECT create_monthly_partitions('order_status_events', NOW(), NOW() + INTERVAL '3 months');
+
+CREATE INDEX IF NOT EXISTS idx_order_status_events_order_created ON order_status_events(order_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_order_status_events_created_at ON order_status_events(created_at);
+
+CREATE OR REPLACE FUNCTION reject_order_status_event_changes()
+    RETURNS TRIGGER AS $$
+BEGIN
+    RAISE EXCEPTION 'order_status_events is append-only';
+END;
+$$ language 'plpgsql';
+
+CREATE OR REPLACE TRIGGER order_status_events_append_only BEFORE UPDATE OR DELETE ON order_status_events
+    FOR EACH STATEMENT EXECUTE FUNCTION reject_order_status_event_changes();
+
+CREATE OR REPLACE FUNCTION record_order_status_events()
+    RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO order_status_events (order_id, cook_id, from_status, to_status, from_status_since, version, created_at)
+        SELECT id, cook_id, NULL, status, NULL, version, created_at
+        FROM new_orders;
+
+        PERFORM pg_notify('order_changes', json_build_object(
+            'order_id', id, 'batch_order_id', batch_order_id, 'buyer_id', buyer_id, 'cook_id', cook_id,
+            'status', status, 'version', version, 'updated_at', updated_at
+        )::text)
+        FROM new_orders;
+    ELSE
+        -- Archiving moves rows between partitions without changing their status; skip those
+        INSERT INTO order_status_events (order_id, cook_id, from_status, to_status, from_status_since, version, created_at)
+        SELECT new_orders.id, new_orders.cook_id, old_orders.status, new_orders.status,
+               COALESCE(old_orders.status_changed_at, old_orders.created_at), new_orders.version,
+               COALESCE(new_orders.status_changed_at, NOW())
+        FROM new_orders
+        JOIN old_orders ON old_orders.id = new_orders.id AND old_orders.created_at = new_orders.created_at
+        WHERE new_orders.status <> old_orders.status;
+
+        PERFORM pg_notify('order_changes', json_build_object(
+            'order_id', new_orders.id, 'batch_order_id', new_orders.batch_order_id,
+            'buyer_id', new_orders.buyer_id, 'cook_id', new_orders.cook_id,
+            'status', new_orders.status, 'version', new_orders.version, 'updated_at', new_orders.updated_at
+        )::text)
+        FROM new_orders
+        JOIN old_orders ON old_orders.id = new_orders.id AND old_orders.created_at = new_orders.created_at
+        WHERE new_orders.status <> old_orders.status;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE OR REPLACE TRIGGER record_order_status_events_on_insert AFTER INSERT ON orders
+    REFERENCING NEW TABLE AS new_orders
+    FOR EACH STATEMENT EXECUTE FUNCTION record_order_status_events();
+
+CREATE OR REPLACE TRIGGER record_order_status_events_on_update AFTER UPDATE ON orders
+    REFERENCING OLD TABLE AS old_orders NEW TABLE AS new_orders
+    FOR EACH STATEMENT EXECUTE FUNCTION record_order_status_events();
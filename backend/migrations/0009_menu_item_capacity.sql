@@ -0,0 +1,229 @@
+-- migrate: lock-timeout 5s
+-- Daily portion caps per menu item, reserved atomically when orders are placed
+--
+-- menu_items.daily_capacity caps the portions sold per UTC day (NULL: no cap). Each day's
+-- remaining portions are split over a few shard rows in menu_item_capacity, so concurrent
+-- buyers of one dish decrement different rows instead of queueing on one:
+--
+--   reserve_capacity()   takes portions from any shard nobody holds (SKIP LOCKED); only when
+--                        no single free shard has enough does it lock them all and combine
+--   release_capacity()   gives portions back when a reserved order is cancelled or deleted
+--                        (trigger on orders)
+--
+-- When a day's portions run out the item is marked unavailable with sold_out_on = that day;
+-- a release, a capacity increase or the capacity.rollover job (next day) makes it available
+-- again. Availability changes are published on cache_invalidation so menu_item_cache follows.
+
+ALTER TABLE menu_items ADD COLUMN IF NOT EXISTS daily_capacity INTEGER CHECK (daily_capacity >= 0);
+ALTER TABLE menu_items ADD COLUMN IF NOT EXISTS sold_out_on DATE;  -- set only when capacity made it unavailable
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS capacity_reserved BOOLEAN NOT NULL DEFAULT false;
+
+CREATE TABLE IF NOT EXISTS menu_item_capacity (
+    menu_item_id INTEGER NOT NULL REFERENCES menu_items(id) ON DELETE CASCADE,
+    day DATE NOT NULL,
+    shard SMALLINT NOT NULL,
+    remaining INTEGER NOT NULL CHECK (remaining >= 0),
+    PRIMARY KEY (menu_item_id, day, shard)
+);
+
+CREATE INDEX IF NOT EXISTS idx_menu_item_capacity_day ON menu_item_capacity(day);
+
+-- Marks the item sold out for the day when no portions remain, or available again when some do
+CREATE OR REPLACE FUNCTION sync_sold_out(item_id INTEGER, on_day DATE)
+    RETURNS VOID AS $$
+DECLARE
+    portions_left INTEGER;
+BEGIN
+    SELECT SUM(remaining) INTO portions_left
+    FROM menu_item_capacity
+    WHERE menu_item_id = item_id AND day = on_day;
+
+    IF portions_left IS NULL THEN
+        RETURN;
+    END IF;
+
+    IF portions_left = 0 THEN
+        UPDATE menu_items SET is_available = false, sold_out_on = on_day
+        WHERE id = item_id AND is_available AND daily_capacity IS NOT NULL;
+    ELSE
+        UPDATE menu_items SET is_available = true, sold_out_on = NULL
+        WHERE id = item_id AND sold_out_on = on_day;
+    END IF;
+
+    IF FOUND THEN
+        PERFORM pg_notify('cache_invalidation', json_build_object('cache', 'menu_item', 'keys', json_build_array(item_id))::text);
+    END IF;
+END;
+$$ language 'plpgsql';
+
+-- Takes `portions` of today's (UTC) capacity; false if fewer remain. Creates the day's shards
+-- on first use, splitting `capacity` evenly over `shard_count` rows.
+CREATE OR REPLACE FUNCTION reserve_capacity(item_id INTEGER, portions INTEGER, capacity INTEGER, shard_count INTEGER)
+    RETURNS BOOLEAN AS $$
+DECLARE
+    on_day DATE := (NOW() AT TIME ZONE 'UTC')::date;
+    shard_left INTEGER;
+    portions_left INTEGER;
+    needed INTEGER := portions;
+    taken INTEGER;
+    shard_row RECORD;
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM menu_item_capacity WHERE menu_item_id = item_id AND day = on_day) THEN
+        INSERT INTO menu_item_capacity (menu_item_id, day, shard, remaining)
+        SELECT item_id, on_day, s, capacity / shard_count + CASE WHEN s < capacity % shard_count THEN 1 ELSE 0 END
+        FROM generate_series(0, shard_count - 1) s
+        ON CONFLICT DO NOTHING;
+    END IF;
+
+    -- Fast path: one shard nobody else holds
+    UPDATE menu_item_capacity SET remaining = remaining - portions
+    WHERE menu_item_id = item_id AND day = on_day AND remaining >= portions AND shard = (
+        SELECT shard FROM menu_item_capacity
+        WHERE menu_item_id = item_id AND day = on_day AND remaining >= portions
+        ORDER BY random()
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING remaining INTO shard_left;
+
+    IF FOUND THEN
+        IF shard_left = 0 THEN
+            PERFORM sync_sold_out(item_id, on_day);
+        END IF;
+        RETURN true;
+    END IF;
+
+    -- Committed totals only shrink by the reservations still in flight, so if they are already
+    -- short the item is sold out without waiting for anyone
+    SELECT SUM(remaining) INTO portions_left
+    FROM menu_item_capacity
+    WHERE menu_item_id = item_id AND day = on_day;
+
+    IF portions_left < portions THEN
+        RETURN false;
+    END IF;
+
+    -- Slow path: every free shard is too small, or all are held. Lock them all (in shard
+    -- order, like every caller) and take from several; the next statement sees the latest totals.
+    PERFORM 1 FROM menu_item_capacity WHERE menu_item_id = item_id AND day = on_day ORDER BY shard FOR UPDATE;
+
+    SELECT SUM(remaining) INTO portions_left
+    FROM menu_item_capacity
+    WHERE menu_item_id = item_id AND day = on_day;
+
+    IF portions_left < portions THEN
+        RETURN false;
+    END IF;
+
+    FOR shard_row IN
+        SELECT shard, remaining FROM menu_item_capacity
+        WHERE menu_item_id = item_id AND day = on_day AND remaining > 0
+        ORDER BY remaining DESC
+    LOOP
+        taken := LEAST(shard_row.remaining, needed);
+        UPDATE menu_item_capacity SET remaining = remaining - taken
+        WHERE menu_item_id = item_id AND day = on_day AND shard = shard_row.shard;
+        needed := needed - taken;
+        EXIT WHEN needed = 0;
+    END LOOP;
+
+    IF portions_left = portions THEN
+        PERFORM sync_sold_out(item_id, on_day);
+    END IF;
+    RETURN true;
+END;
+$$ language 'plpgsql';
+
+-- Gives portions back to the day's capacity (a shard nobody holds, else shard 0)
+CREATE OR REPLACE FUNCTION release_capacity(item_id INTEGER, on_day DATE, portions INTEGER)
+    RETURNS VOID AS $$
+BEGIN
+    UPDATE menu_item_capacity SET remaining = remaining + portions
+    WHERE menu_item_id = item_id AND day = on_day AND shard = COALESCE(
+        (
+            SELECT shard FROM menu_item_capacity
+            WHERE menu_item_id = item_id AND day = on_day
+            ORDER BY random()
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        ),
+        0
+    );
+
+    IF FOUND THEN
+        PERFORM sync_sold_out(item_id, on_day);
+    END IF;
+END;
+$$ language 'plpgsql';
+
+-- Adds (or, if negative, removes as far as possible) portions when the cook changes the cap
+CREATE OR REPLACE FUNCTION adjust_capacity(item_id INTEGER, on_day DATE, delta INTEGER)
+    RETURNS VOID AS $$
+DECLARE
+    needed INTEGER := -delta;
+    taken INTEGER;
+    shard_row RECORD;
+BEGIN
+    IF delta >= 0 THEN
+        UPDATE menu_item_capacity SET remaining = remaining + delta
+        WHERE menu_item_id = item_id AND day = on_day AND shard = 0;
+    ELSE
+        FOR shard_row IN
+            SELECT shard, remaining FROM menu_item_capacity
+            WHERE menu_item_id = item_id AND day = on_day
+            ORDER BY shard
+            FOR UPDATE
+        LOOP
+            taken := LEAST(shard_row.remaining, needed);
+            UPDATE menu_item_capacity SET remaining = remaining - taken
+            WHERE menu_item_id = item_id AND day = on_day AND shard = shard_row.shard;
+            needed := needed - taken;
+            EXIT WHEN needed = 0;
+        END LOOP;
+    END IF;
+
+    PERFORM sync_sold_out(item_id, on_day);
+END;
+$$ language 'plpgsql';
+
+-- Cancelling or deleting an open order that reserved portions gives them back, whichever
+-- code path does it. Items are released in id order, the order reservations take them in.
+CREATE OR REPLACE FUNCTION release_order_capacity()
+    RETURNS TRIGGER AS $$
+DECLARE
+    released RECORD;
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        FOR released IN
+            SELECT new_orders.menu_item_id, (new_orders.created_at AT TIME ZONE 'UTC')::date AS day,
+                   SUM(new_orders.quantity)::int AS portions
+            FROM new_orders
+            JOIN old_orders ON old_orders.id = new_orders.id AND old_orders.created_at = new_orders.created_at
+            WHERE new_orders.capacity_reserved AND new_orders.status = 'cancelled' AND old_orders.status <> 'cancelled'
+            GROUP BY 1, 2
+            ORDER BY 1, 2
+        LOOP
+            PERFORM release_capacity(released.menu_item_id, released.day, released.portions);
+        END LOOP;
+    ELSE
+        FOR released IN
+            SELECT menu_item_id, (created_at AT TIME ZONE 'UTC')::date AS day, SUM(quantity)::int AS portions
+            FROM old_orders
+            WHERE capacity_reserved AND status IN ('pending', 'preparing', 'ready')
+            GROUP BY 1, 2
+            ORDER BY 1, 2
+        LOOP
+            PERFORM release_capacity(released.menu_item_id, released.day, released.portions);
+        END LOOP;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE OR REPLACE TRIGGER release_order_capacity_on_update AFTER UPDATE ON orders
+    REFERENCING OLD TABLE AS old_orders NEW TABLE AS new_orders
+    FOR EACH STATEMENT EXECUTE FUNCTION release_order_capacity();
+
+CREATE OR REPLACE TRIGGER release_order_capacity_on_delete AFTER DELETE ON orders
+    REFERENCING OLD TABLE AS old_orders
+    FOR EACH STATEMENT EXECUTE FUNCTION release_order_capacity();
@@ -0,0 +1,12 @@
+-- migrate: lock-timeout 5s
+-- Message threads paged by id: GET /messages/order/{order_id}?after=<id> / ?before=<id>
+--
+-- WHERE order_id = $1 AND id > $2 ORDER BY id LIMIT n reads only the new messages, so a client
+-- polling a long thread does constant work per refresh. messages is partitioned, and an index
+-- on a partitioned table cannot be built CONCURRENTLY; the build blocks message inserts (not
+-- reads) while it runs, which the lock timeout keeps from queueing behind a long transaction.
+CREATE INDEX IF NOT EXISTS idx_messages_order_id_id ON messages(order_id, id);
+
+-- Superseded by the index above: the thread query keeps `created_at >= <order created_at>`
+-- only to skip older partitions, which the partition bounds do without an index
+DROP INDEX IF EXISTS idx_messages_order_created;
@@ -0,0 +1,128 @@
+-- migrate: lock-timeout 5s
+-- Per-user conversation summaries for the inbox (GET /messages/inbox)
+--
+-- One row per participant (buyer and cook user) of every order with messages, holding the
+-- thread's last message, last activity and the participant's read marker and unread count.
+-- A trigger on messages keeps the rows current as messages are posted, so the inbox is one
+-- scan of idx_conversations_user_activity however many messages the user has. Deleting
+-- messages (admin delete, order delete, user delete) recomputes the affected threads.
+
+CREATE TABLE IF NOT EXISTS conversations (
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    order_id INTEGER NOT NULL,                 -- orders is partitioned; no foreign key (see 0005)
+    last_message_id INTEGER NOT NULL,
+    last_sender_id INTEGER,
+    last_message_preview VARCHAR(200) NOT NULL,
+    last_activity_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    last_read_message_id INTEGER NOT NULL DEFAULT 0,  -- the newest message this user has read
+    unread_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, order_id)
+);
+
+-- GET /messages/inbox -> WHERE user_id = $1 [AND (last_activity_at, order_id) < cursor] ORDER BY last_activity_at DESC, order_id DESC
+CREATE INDEX IF NOT EXISTS idx_conversations_user_activity ON conversations(user_id, last_activity_at DESC, order_id DESC);
+CREATE INDEX IF NOT EXISTS idx_conversations_order_id ON conversations(order_id);
+
+-- The buyer and the cook's user for an order
+CREATE OR REPLACE FUNCTION order_participants(for_order_id INTEGER)
+    RETURNS TABLE (user_id INTEGER) AS $$
+    SELECT o.buyer_id FROM orders o WHERE o.id = for_order_id
+    UNION
+    SELECT cp.user_id FROM orders o JOIN cook_profiles cp ON cp.id = o.cook_id WHERE o.id = for_order_id;
+$$ language 'sql' STABLE;
+
+-- A new message is the thread's latest for both participants, unread for the recipient, and
+-- marks everything up to it read for the sender. Concurrent messages may commit out of id
+-- order, so the latest is only replaced by a newer id.
+CREATE OR REPLACE FUNCTION record_conversation_message()
+    RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO conversations AS c (
+        user_id, order_id, last_message_id, last_sender_id, last_message_preview,
+        last_activity_at, last_read_message_id, unread_count
+    )
+    SELECT p.user_id, NEW.order_id, NEW.id, NEW.sender_id, left(NEW.content, 200), NEW.created_at,
+           CASE WHEN p.user_id = NEW.sender_id THEN NEW.id ELSE 0 END,
+           CASE WHEN p.user_id = NEW.sender_id THEN 0 ELSE 1 END
+    FROM order_participants(NEW.order_id) p
+    WHERE p.user_id IS NOT NULL
+    ON CONFLICT (user_id, order_id) DO UPDATE SET
+        last_message_id = GREATEST(c.last_message_id, EXCLUDED.last_message_id),
+        last_sender_id = CASE WHEN EXCLUDED.last_message_id > c.last_message_id THEN EXCLUDED.last_sender_id ELSE c.last_sender_id END,
+        last_message_preview = CASE WHEN EXCLUDED.last_message_id > c.last_message_id THEN EXCLUDED.last_message_preview ELSE c.last_message_preview END,
+        last_activity_at = GREATEST(c.last_activity_at, EXCLUDED.last_activity_at),
+        last_read_message_id = CASE WHEN c.user_id = EXCLUDED.last_sender_id
+            THEN GREATEST(c.last_read_message_id, EXCLUDED.last_message_id) ELSE c.last_read_message_id END,
+        unread_count = CASE WHEN c.user_id = EXCLUDED.last_sender_id THEN 0 ELSE c.unread_count + 1 END;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE OR REPLACE TRIGGER record_conversation_message AFTER INSERT ON messages
+    FOR EACH ROW EXECUTE FUNCTION record_conversation_message();
+
+-- Recomputes an order's summaries from its messages, or removes them if none are left
+CREATE OR REPLACE FUNCTION refresh_conversations(for_order_id INTEGER)
+    RETURNS VOID AS $$
+DECLARE
+    latest RECORD;
+BEGIN
+    SELECT id, sender_id, content, created_at INTO latest
+    FROM messages
+    WHERE order_id = for_order_id
+    ORDER BY id DESC
+    LIMIT 1;
+
+    IF NOT FOUND THEN
+        DELETE FROM conversations WHERE order_id = for_order_id;
+        RETURN;
+    END IF;
+
+    UPDATE conversations c
+    SET last_message_id = latest.id,
+        last_sender_id = latest.sender_id,
+        last_message_preview = left(latest.content, 200),
+        last_activity_at = latest.created_at,
+        unread_count = (
+            SELECT COUNT(*) FROM messages m
+            WHERE m.order_id = for_order_id AND m.id > c.last_read_message_id
+              AND m.sender_id IS DISTINCT FROM c.user_id
+        )
+    WHERE c.order_id = for_order_id;
+END;
+$$ language 'plpgsql';
+
+CREATE OR REPLACE FUNCTION refresh_conversations_trigger()
+    RETURNS TRIGGER AS $$
+DECLARE
+    affected RECORD;
+BEGIN
+    FOR affected IN SELECT DISTINCT order_id FROM old_messages WHERE order_id IS NOT NULL ORDER BY order_id LOOP
+        PERFORM refresh_conversations(affected.order_id);
+    END LOOP;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE OR REPLACE TRIGGER refresh_conversations_on_delete AFTER DELETE ON messages
+    REFERENCING OLD TABLE AS old_messages
+    FOR EACH STATEMENT EXECUTE FUNCTION refresh_conversations_trigger();
+
+-- Existing threads start out read: there is no record of what was read before
+INSERT INTO conversations (
+    user_id, order_id, last_message_id, last_sender_id, last_message_preview,
+    last_activity_at, last_read_message_id, unread_count
+)
+SELECT p.user_id, latest.order_id, latest.id, latest.sender_id, left(latest.content, 200),
+       latest.created_at, latest.id, 0
+FROM (
+    SELECT DISTINCT ON (order_id) order_id, id, sender_id, content, created_at
+    FROM messages
+    WHERE order_id IS NOT NULL
+    ORDER BY order_id, id DESC
+) latest
+CROSS JOIN LATERAL order_participants(latest.order_id) p
+WHERE p.user_id IS NOT NULL
+ON CONFLICT (user_id, order_id) DO NOTHING;
+
+ANALYZE conversations;
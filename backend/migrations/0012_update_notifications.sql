@@ -0,0 +1,80 @@
+-- migrate: lock-timeout 5s
+-- Notifications for long-polling clients (GET /updates/poll)
+--
+-- Waiters are keyed by user id, so order changes now also carry the cook's user id, and
+-- every new message is published on message_changes with the ids of both participants
+-- (taken from the conversation rows the message touches, so it costs no extra lookup).
+
+CREATE OR REPLACE FUNCTION record_order_status_events()
+    RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO order_status_events (order_id, cook_id, from_status, to_status, from_status_since, version, created_at)
+        SELECT id, cook_id, NULL, status, NULL, version, created_at
+        FROM new_orders;
+
+        PERFORM pg_notify('order_changes', json_build_object(
+            'order_id', new_orders.id, 'batch_order_id', new_orders.batch_order_id,
+            'buyer_id', new_orders.buyer_id, 'cook_id', new_orders.cook_id, 'cook_user_id', cp.user_id,
+            'status', new_orders.status, 'version', new_orders.version, 'updated_at', new_orders.updated_at
+        )::text)
+        FROM new_orders
+        LEFT JOIN cook_profiles cp ON cp.id = new_orders.cook_id;
+    ELSE
+        -- Archiving moves rows between partitions without changing their status; skip those
+        INSERT INTO order_status_events (order_id, cook_id, from_status, to_status, from_status_since, version, created_at)
+        SELECT new_orders.id, new_orders.cook_id, old_orders.status, new_orders.status,
+               COALESCE(old_orders.status_changed_at, old_orders.created_at), new_orders.version,
+               COALESCE(new_orders.status_changed_at, NOW())
+        FROM new_orders
+        JOIN old_orders ON old_orders.id = new_orders.id AND old_orders.created_at = new_orders.created_at
+        WHERE new_orders.status <> old_orders.status;
+
+        PERFORM pg_notify('order_changes', json_build_object(
+            'order_id', new_orders.id, 'batch_order_id', new_orders.batch_order_id,
+            'buyer_id', new_orders.buyer_id, 'cook_id', new_orders.cook_id, 'cook_user_id', cp.user_id,
+            'status', new_orders.status, 'version', new_orders.version, 'updated_at', new_orders.updated_at
+        )::text)
+        FROM new_orders
+        JOIN old_orders ON old_orders.id = new_orders.id AND old_orders.created_at = new_orders.created_at
+        LEFT JOIN cook_profiles cp ON cp.id = new_orders.cook_id
+        WHERE new_orders.status <> old_orders.status;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE OR REPLACE FUNCTION record_conversation_message()
+    RETURNS TRIGGER AS $$
+DECLARE
+    participant_ids INTEGER[];
+BEGIN
+    WITH touched AS (
+        INSERT INTO conversations AS c (
+            user_id, order_id, last_message_id, last_sender_id, last_message_preview,
+            last_activity_at, last_read_message_id, unread_count
+        )
+        SELECT p.user_id, NEW.order_id, NEW.id, NEW.sender_id, left(NEW.content, 200), NEW.created_at,
+               CASE WHEN p.user_id = NEW.sender_id THEN NEW.id ELSE 0 END,
+               CASE WHEN p.user_id = NEW.sender_id THEN 0 ELSE 1 END
+        FROM order_participants(NEW.order_id) p
+        WHERE p.user_id IS NOT NULL
+        ON CONFLICT (user_id, order_id) DO UPDATE SET
+            last_message_id = GREATEST(c.last_message_id, EXCLUDED.last_message_id),
+            last_sender_id = CASE WHEN EXCLUDED.last_message_id > c.last_message_id THEN EXCLUDED.last_sender_id ELSE c.last_sender_id END,
+            last_message_preview = CASE WHEN EXCLUDED.last_message_id > c.last_message_id THEN EXCLUDED.last_message_preview ELSE c.last_message_preview END,
+            last_activity_at = GREATEST(c.last_activity_at, EXCLUDED.last_activity_at),
+            last_read_message_id = CASE WHEN c.user_id = EXCLUDED.last_sender_id
+                THEN GREATEST(c.last_read_message_id, EXCLUDED.last_message_id) ELSE c.last_read_message_id END,
+            unread_count = CASE WHEN c.user_id = EXCLUDED.last_sender_id THEN 0 ELSE c.unread_count + 1 END
+        RETURNING c.user_id
+    )
+    SELECT array_agg(user_id) INTO participant_ids FROM touched;
+
+    PERFORM pg_notify('message_changes', json_build_object(
+        'message_id', NEW.id, 'order_id', NEW.order_id, 'sender_id', NEW.sender_id,
+        'created_at', NEW.created_at, 'user_ids', COALESCE(participant_ids, '{}')
+    )::text);
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
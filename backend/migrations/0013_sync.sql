@@ -0,0 +1,74 @@
+-- migrate: no-transaction
+-- Delta sync (GET /sync?since=<token>): what changed for a user since their last sync
+--
+-- Changed rows are found by updated_at (created_at for messages, through conversations),
+-- so a sync reads only the changes. Deletions leave a row in sync_tombstones, written by
+-- triggers so that every delete path (menu item delete, admin order/message delete,
+-- cascades from user and cook profile deletes) is covered. The sync.purge_tombstones job
+-- removes tombstones older than SYNC_TOMBSTONE_RETENTION_DAYS; older tokens must resync.
+
+-- GET /sync -> WHERE buyer_id = $1 AND updated_at >= $2 / WHERE cook_id = $1 AND updated_at >= $2.
+-- An index on a partitioned table cannot be built CONCURRENTLY; these block order writes
+-- (not reads) while they build.
+CREATE INDEX IF NOT EXISTS idx_orders_buyer_updated ON orders(buyer_id, updated_at);
+CREATE INDEX IF NOT EXISTS idx_orders_cook_updated ON orders(cook_id, updated_at);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_batch_orders_buyer_updated ON batch_orders(buyer_id, updated_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_menu_items_updated_at ON menu_items(updated_at);
+
+CREATE TABLE IF NOT EXISTS sync_tombstones (
+    id BIGSERIAL PRIMARY KEY,
+    entity VARCHAR(20) NOT NULL,        -- 'order', 'batch_order', 'menu_item' or 'message'
+    entity_id INTEGER NOT NULL,
+    user_ids INTEGER[],                 -- users who could see it; NULL: everyone (menu items)
+    deleted_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_sync_tombstones_deleted_at ON sync_tombstones(deleted_at);
+
+CREATE OR REPLACE FUNCTION record_sync_tombstones()
+    RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_TABLE_NAME = 'orders' THEN
+        -- Cross-partition moves (archiving) fire UPDATE statement triggers, not this one
+        INSERT INTO sync_tombstones (entity, entity_id, user_ids)
+        SELECT 'order', o.id, array_remove(ARRAY[o.buyer_id, cp.user_id], NULL)
+        FROM old_rows o
+        LEFT JOIN cook_profiles cp ON cp.id = o.cook_id;
+    ELSIF TG_TABLE_NAME = 'batch_orders' THEN
+        INSERT INTO sync_tombstones (entity, entity_id, user_ids)
+        SELECT 'batch_order', id, ARRAY[buyer_id]
+        FROM old_rows;
+    ELSIF TG_TABLE_NAME = 'menu_items' THEN
+        INSERT INTO sync_tombstones (entity, entity_id, user_ids)
+        SELECT 'menu_item', id, NULL
+        FROM old_rows;
+    ELSE
+        -- Messages deleted with their order have no participants left; the order's tombstone covers them
+        INSERT INTO sync_tombstones (entity, entity_id, user_ids)
+        SELECT 'message', m.id, participants.user_ids
+        FROM old_rows m
+        CROSS JOIN LATERAL (
+            SELECT array_agg(p.user_id) AS user_ids FROM order_participants(m.order_id) p WHERE p.user_id IS NOT NULL
+        ) participants
+        WHERE participants.user_ids IS NOT NULL;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE OR REPLACE TRIGGER record_sync_tombstones AFTER DELETE ON orders
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_sync_tombstones();
+
+CREATE OR REPLACE TRIGGER record_sync_tombstones AFTER DELETE ON batch_orders
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_sync_tombstones();
+
+CREATE OR REPLACE TRIGGER record_sync_tombstones AFTER DELETE ON menu_items
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_sync_tombstones();
+
+CREATE OR REPLACE TRIGGER record_sync_tombstones AFTER DELETE ON messages
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_sync_tombstones();
@@ -0,0 +1,13 @@
+-- migrate: lock-timeout 5s
+-- Soft delete for users and cook profiles, purged in the background
+--
+-- DELETE /admin/users/{id} and DELETE /cooks/{id} only set deleted_at (and deactivate the
+-- user / take the menu off sale), which touches a handful of rows. The users.purge and
+-- cooks.purge jobs (app/tasks.py) then delete the orders, messages, batch orders and menu
+-- items in chunks, each in its own short transaction, and finally the row itself. Cascading
+-- through a busy account in one statement held locks on hot rows for the whole delete, and
+-- orders' RESTRICT foreign keys made a cook profile with orders impossible to delete.
+-- Adding a nullable column without a default does not rewrite the table.
+
+ALTER TABLE users ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP WITH TIME ZONE;
+ALTER TABLE cook_profiles ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP WITH TIME ZONE;
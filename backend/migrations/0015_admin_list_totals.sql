@@ -0,0 +1,8 @@
+-- Statistics for with_total=estimate on the admin lists (see app/utils/counts.py)
+--
+-- Estimates come from the planner, so they are only as good as the table statistics.
+-- users.deleted_at (0014) has none until autovacuum next analyzes users, which a small,
+-- rarely written table may not do for a long time; until then the planner guesses that
+-- 0.5% of users are not deleted.
+ANALYZE users;
+ANALYZE cook_profiles;
@@ -0,0 +1,92 @@
+-- migrate: no-transaction
+-- Delta sync by transaction id instead of time, and menu changes scoped to their cook
+--
+-- The sync token used to be the start of the oldest transaction in pg_stat_activity, so any
+-- long transaction (an idle-in-transaction session, a report, an index build) held every
+-- client's window open until it passed SYNC_MAX_CHANGES. Rows now carry change_xid, the id
+-- of the transaction that last wrote them, and the token is the sync's snapshot. The next
+-- sync returns rows whose change_xid that snapshot could not see: exactly the changes
+-- committed in between, however long other transactions run. Sessions that only read never
+-- get a transaction id and do not affect it at all. Rows not written since this migration
+-- have no change_xid and are never returned as changed.
+--
+-- Menu item changes and tombstones now belong to the item's cook, instead of going to every
+-- user.
+
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS change_xid xid8;
+ALTER TABLE batch_orders ADD COLUMN IF NOT EXISTS change_xid xid8;
+ALTER TABLE menu_items ADD COLUMN IF NOT EXISTS change_xid xid8;
+ALTER TABLE messages ADD COLUMN IF NOT EXISTS change_xid xid8;
+ALTER TABLE conversations ADD COLUMN IF NOT EXISTS change_xid xid8;
+ALTER TABLE sync_tombstones ADD COLUMN IF NOT EXISTS change_xid xid8;
+-- Set after the column is added, so existing tombstones are not rewritten with this migration's id
+ALTER TABLE sync_tombstones ALTER COLUMN change_xid SET DEFAULT pg_current_xact_id();
+
+CREATE OR REPLACE FUNCTION stamp_change_xid()
+    RETURNS TRIGGER AS $$
+BEGIN
+    NEW.change_xid = pg_current_xact_id();
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+CREATE OR REPLACE TRIGGER stamp_change_xid BEFORE INSERT OR UPDATE ON orders
+    FOR EACH ROW EXECUTE FUNCTION stamp_change_xid();
+CREATE OR REPLACE TRIGGER stamp_change_xid BEFORE INSERT OR UPDATE ON batch_orders
+    FOR EACH ROW EXECUTE FUNCTION stamp_change_xid();
+CREATE OR REPLACE TRIGGER stamp_change_xid BEFORE INSERT OR UPDATE ON menu_items
+    FOR EACH ROW EXECUTE FUNCTION stamp_change_xid();
+CREATE OR REPLACE TRIGGER stamp_change_xid BEFORE INSERT OR UPDATE ON messages
+    FOR EACH ROW EXECUTE FUNCTION stamp_change_xid();
+-- A thread's row is rewritten by every new message, so it carries the latest message's id
+CREATE OR REPLACE TRIGGER stamp_change_xid BEFORE INSERT OR UPDATE ON conversations
+    FOR EACH ROW EXECUTE FUNCTION stamp_change_xid();
+
+-- Menu item tombstones go to the cook's user (cascades from a deleted profile reach no one)
+CREATE OR REPLACE FUNCTION record_sync_tombstones()
+    RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_TABLE_NAME = 'orders' THEN
+        -- Cross-partition moves (archiving) fire UPDATE statement triggers, not this one
+        INSERT INTO sync_tombstones (entity, entity_id, user_ids)
+        SELECT 'order', o.id, array_remove(ARRAY[o.buyer_id, cp.user_id], NULL)
+        FROM old_rows o
+        LEFT JOIN cook_profiles cp ON cp.id = o.cook_id;
+    ELSIF TG_TABLE_NAME = 'batch_orders' THEN
+        INSERT INTO sync_tombstones (entity, entity_id, user_ids)
+        SELECT 'batch_order', id, ARRAY[buyer_id]
+        FROM old_rows;
+    ELSIF TG_TABLE_NAME = 'menu_items' THEN
+        INSERT INTO sync_tombstones (entity, entity_id, user_ids)
+        SELECT 'menu_item', mi.id, array_remove(ARRAY[cp.user_id], NULL)
+        FROM old_rows mi
+        LEFT JOIN cook_profiles cp ON cp.id = mi.cook_id;
+    ELSE
+        -- Messages deleted with their order have no participants left; the order's tombstone covers them
+        INSERT INTO sync_tombstones (entity, entity_id, user_ids)
+        SELECT 'message', m.id, participants.user_ids
+        FROM old_rows m
+        CROSS JOIN LATERAL (
+            SELECT array_agg(p.user_id) AS user_ids FROM order_participants(m.order_id) p WHERE p.user_id IS NOT NULL
+        ) participants
+        WHERE participants.user_ids IS NOT NULL;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+-- GET /sync -> WHERE buyer_id = $1 AND change_xid >= pg_snapshot_xmin($2) ORDER BY change_xid (and cook_id).
+-- An index on a partitioned table cannot be built CONCURRENTLY; these block order writes
+-- (not reads) while they build.
+CREATE INDEX IF NOT EXISTS idx_orders_buyer_change_xid ON orders(buyer_id, change_xid);
+CREATE INDEX IF NOT EXISTS idx_orders_cook_change_xid ON orders(cook_id, change_xid);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_batch_orders_buyer_change_xid ON batch_orders(buyer_id, change_xid);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_menu_items_cook_change_xid ON menu_items(cook_id, change_xid);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_conversations_user_change_xid ON conversations(user_id, change_xid);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_sync_tombstones_change_xid ON sync_tombstones(change_xid);
+
+-- The updated_at indexes from 0013 only served GET /sync
+DROP INDEX IF EXISTS idx_orders_buyer_updated;
+DROP INDEX IF EXISTS idx_orders_cook_updated;
+DROP INDEX CONCURRENTLY IF EXISTS idx_batch_orders_buyer_updated;
+DROP INDEX CONCURRENTLY IF EXISTS idx_menu_items_updated_at;
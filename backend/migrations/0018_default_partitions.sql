@@ -0,0 +1,65 @@
+-- migrate: lock-timeout 5s
+-- DEFAULT partitions for the monthly-partitioned tables, so inserts never fail for want of a month
+--
+-- Only a few months were created ahead, and later ones only by the partitions.maintain job,
+-- which runs in worker.py (or with JOBS_RUN_IN_API). If it stopped running, order placement,
+-- messages and status events would start failing once the last month ran out. Rows past the
+-- last partition now land in <table>_default. The API also creates the coming months at
+-- startup (app/tasks.py create_upcoming_partitions).
+--
+-- A month cannot be created while the default partition holds rows that belong to it, so
+-- create_monthly_partitions now moves those rows into the new month. It detaches the default
+-- first, so the move fires none of the row triggers the default carries as a partition (a
+-- delete from an orders partition also deletes the order's messages).
+
+CREATE TABLE IF NOT EXISTS orders_live_default PARTITION OF orders_live DEFAULT;
+CREATE TABLE IF NOT EXISTS messages_default PARTITION OF messages DEFAULT;
+CREATE TABLE IF NOT EXISTS order_status_events_default PARTITION OF order_status_events DEFAULT;
+
+CREATE OR REPLACE FUNCTION create_monthly_partitions(parent TEXT, first_at TIMESTAMPTZ, last_at TIMESTAMPTZ)
+    RETURNS SETOF TEXT AS $$
+DECLARE
+    month_start TIMESTAMP;
+    partition_name TEXT;
+    default_name TEXT := format('%s_default', parent);
+    from_at TIMESTAMPTZ;
+    to_at TIMESTAMPTZ;
+    stranded BOOLEAN;
+BEGIN
+    FOR month_start IN
+        SELECT generate_series(
+            date_trunc('month', first_at AT TIME ZONE 'UTC'),
+            date_trunc('month', last_at AT TIME ZONE 'UTC'),
+            INTERVAL '1 month'
+        )
+    LOOP
+        partition_name := format('%s_%s', parent, to_char(month_start, 'YYYY_MM'));
+        IF to_regclass(partition_name) IS NULL THEN
+            from_at := month_start AT TIME ZONE 'UTC';
+            to_at := (month_start + INTERVAL '1 month') AT TIME ZONE 'UTC';
+            stranded := false;
+            IF to_regclass(default_name) IS NOT NULL THEN
+                EXECUTE format('SELECT EXISTS (SELECT 1 FROM %I WHERE created_at >= $1 AND created_at < $2)', default_name)
+                    INTO stranded USING from_at, to_at;
+            END IF;
+
+            IF stranded THEN
+                EXECUTE format('ALTER TABLE %I DETACH PARTITION %I', parent, default_name);
+                EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', partition_name, parent);
+                EXECUTE format(
+                    'WITH moved AS (DELETE FROM %I WHERE created_at >= $1 AND created_at < $2 RETURNING *) INSERT INTO %I SELECT * FROM moved',
+                    default_name, partition_name
+                ) USING from_at, to_at;
+                EXECUTE format('ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', parent, partition_name, from_at, to_at);
+                EXECUTE format('ALTER TABLE %I ATTACH PARTITION %I DEFAULT', parent, default_name);
+            ELSE
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                    partition_name, parent, from_at, to_at
+                );
+            END IF;
+            RETURN NEXT partition_name;
+        END IF;
+    END LOOP;
+END;
+$$ language 'plpgsql';
@@ -1,33 +1,37 @@
 #!/usr/bin/env python3
 """
 Database Setup Script for Adresur
-This script creates all the necessary tables in the Supabase database.
+This script applies the schema migrations in migrations/ and adds the sample users.
+Re-running it only applies migrations that are still pending.
 """
 
 import asyncio
 import asyncpg
-from pathlib import Path
 from app.config import settings
+from app.migrator import Migrator, MIGRATIONS_DIR, discover
 import sys
 
+# Password hashes are generated by the fix_passwords.py script
+SAMPLE_USERS_SQL = """
+    INSERT INTO users (email, full_name, role, hashed_password, is_active, created_at)
+    VALUES ('admin@adresur.com', 'Admin User', 'admin', 'PLACEHOLDER_HASH', true, NOW()),
+           ('user@example.com', 'Test User', 'user', 'PLACEHOLDER_HASH', true, NOW())
+    ON CONFLICT (email) DO NOTHING
+"""
+
 async def setup_database():
     """Create all database tables and initial data"""
     
     print("🗄️  Setting up Adresur database...")
     print(f"📍 Connecting to database...")
     
-    # Read the SQL schema file
-    schema_file = Path(__file__).parent / "database_schema.sql"
-    
-    if not schema_file.exists():
-        print("❌ Error: database_schema.sql file not found!")
+    if not MIGRATIONS_DIR.exists():
+        print("❌ Error: migrations directory not found!")
         return False
     
     try:
-        with open(schema_file, 'r', encoding='utf-8') as f:
-            schema_sql = f.read()
-        
-        print(f"📖 Read schema file: {len(schema_sql)} characters")
+        migrations = discover()
+        print(f"📖 Found {len(migrations)} migrations")
         
         # Connect using transaction pooler URL if available, otherwise use individual components
         if settings.database_url:
@@ -61,11 +65,15 @@ async def setup_database():
         
         print("✅ Connected to database successfully!")
         
-        # Execute the schema SQL
-        print("🔨 Creating tables and indexes...")
-        await connection.execute(schema_sql)
+        # Apply pending migrations
+        print("🔨 Applying migrations...")
+        applied = await Migrator(connection, migrations).migrate()
+        for migration in applied:
+            print(f"   ✓ {migration.label}")
+        
+        await connection.execute(SAMPLE_USERS_SQL)
         
-        print("✅ Database schema created successfully!")
+        print("✅ Database schema is up to date!")
         
         # Verify tables were created
         print("🔍 Verifying tables...")
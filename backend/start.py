@@ -1,26 +1,46 @@
 #!/usr/bin/env python3
 """
 Startup script for Adresur Backend API
+
+Usage:
+    python start.py               # development server with auto-reload
+    python start.py --production  # multi-worker production server (see app/server.py)
 """
 
+import argparse
 import uvicorn
 import os
 from app.config import settings
 
 if __name__ == "__main__":
-    # Get port from environment or default to 8000
-    port = int(os.getenv("PORT", 8000))
-    
-    print("🚀 Starting Adresur Backend API...")
-    print(f"📍 Server will be available at: http://localhost:{port}")
-    print(f"📚 API Documentation: http://localhost:{port}/docs")
-    print(f"📖 ReDoc Documentation: http://localhost:{port}/redoc")
-    
-    # Run the application
-    uvicorn.run(
-        "app.main:app",
-        host="0.0.0.0",
-        port=port,
-        reload=True,
-        log_level="info"
-    ) 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Start the Adresur Backend API")
+    parser.add_argument(
+        "--production",
+        action="store_true",
+        help="Run multiple workers with uvloop/httptools and graceful shutdown"
+    )
+    args = parser.parse_args()
+
+    if args.production:
+        from app.server import run, worker_count
+
+        print("🚀 Starting Adresur Backend API (production)...")
+        print(f"📍 Binding {settings.server_host}:{settings.server_port} with {worker_count()} workers")
+        run()
+    else:
+        # Get port from environment or default to 8000
+        port = int(os.getenv("PORT", 8000))
+
+        print("🚀 Starting Adresur Backend API...")
+        print(f"📍 Server will be available at: http://localhost:{port}")
+        print(f"📚 API Documentation: http://localhost:{port}/docs")
+        print(f"📖 ReDoc Documentation: http://localhost:{port}/redoc")
+
+        # Run the application
+        uvicorn.run(
+            "app.main:app",
+            host="0.0.0.0",
+            port=port,
+            reload=True,
+            log_level="info"
+        )
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Admission control tests: FIFO slot handoff, queue limits, timeouts and cancellation in
+ClassGate, and shedding by pressure in AdmissionController.
+Runs without a server or database: python test_admission.py (or pytest).
+"""
+
+import asyncio
+import sys
+
+from app.utils.admission import SIGNAL_HALF_LIFE, AdmissionController, ClassGate, ClassPolicy, DecayingSignal
+from app.utils.routes import RouteClass
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+async def settle():
+    """Let started tasks run up to their next real wait"""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+def test_gate_hands_slots_to_waiters_in_order():
+    gate = ClassGate(concurrency=2, queue_size=10)
+
+    async def run():
+        assert await gate.acquire(1) and await gate.acquire(1)
+        admitted = []
+
+        async def request(name):
+            assert await gate.acquire(5)
+            admitted.append(name)
+
+        waiters = [asyncio.ensure_future(request(name)) for name in "abc"]
+        await settle()
+        assert gate.waiting == 3 and admitted == []
+        for expected in (["a"], ["a", "b"], ["a", "b", "c"]):
+            gate.release()
+            await settle()
+            assert admitted == expected
+            # The slot moved to the waiter; it was never free for a newcomer to take
+            assert gate.active == 2
+        await asyncio.gather(*waiters)
+        for _ in range(2):
+            gate.release()
+        assert gate.active == 0 and gate.waiting == 0
+
+    asyncio.run(run())
+
+def test_gate_newcomer_does_not_jump_the_queue():
+    gate = ClassGate(concurrency=1, queue_size=10)
+
+    async def run():
+        assert await gate.acquire(1)
+        waiter = asyncio.ensure_future(gate.acquire(5))
+        await settle()
+        gate.release()
+        # The slot is promised to the waiter even before it runs
+        late = asyncio.ensure_future(gate.acquire(5))
+        await settle()
+        assert await waiter
+        assert not late.done() and gate.waiting == 1
+        gate.release()
+        assert await late
+        gate.release()
+        assert gate.active == 0
+
+    asyncio.run(run())
+
+def test_gate_rejects_when_queue_full_or_no_wait():
+    gate = ClassGate(concurrency=1, queue_size=1)
+
+    async def run():
+        assert await gate.acquire(1)
+        assert not await gate.acquire(0)
+        queued = asyncio.ensure_future(gate.acquire(5))
+        await settle()
+        assert not await gate.acquire(5)
+        gate.release()
+        assert await queued
+
+    asyncio.run(run())
+
+def test_gate_timeout_leaves_the_queue():
+    gate = ClassGate(concurrency=1, queue_size=10)
+
+    async def run():
+        assert await gate.acquire(1)
+        assert not await gate.acquire(0.01)
+        assert gate.waiting == 0
+        gate.release()
+        assert gate.active == 0
+
+    asyncio.run(run())
+
+def test_gate_cancelled_waiter_leaves_the_queue():
+    gate = ClassGate(concurrency=1, queue_size=10)
+
+    async def run():
+        assert await gate.acquire(1)
+        first = asyncio.ensure_future(gate.acquire(5))
+        second = asyncio.ensure_future(gate.acquire(5))
+        await settle()
+        first.cancel()
+        await settle()
+        assert first.cancelled() and gate.waiting == 1
+        gate.release()
+        assert await second
+        gate.release()
+        assert gate.active == 0
+
+    asyncio.run(run())
+
+def test_gate_cancelled_after_handoff_passes_the_slot_on():
+    """A waiter cancelled after being handed a slot must not leak it"""
+    gate = ClassGate(concurrency=1, queue_size=10)
+
+    async def run():
+        assert await gate.acquire(1)
+        first = asyncio.ensure_future(gate.acquire(5))
+        second = asyncio.ensure_future(gate.acquire(5))
+        await settle()
+        gate.release()  # hands the slot to `first`...
+        first.cancel()  # ...which is cancelled before it resumes
+        result = (await asyncio.gather(first, return_exceptions=True))[0]
+        assert isinstance(result, asyncio.CancelledError)
+        assert await second
+        gate.release()
+        assert gate.active == 0 and gate.waiting == 0
+
+    asyncio.run(run())
+
+def test_decaying_signal():
+    clock = FakeClock()
+    signal = DecayingSignal(alpha=0.5, clock=clock)
+    signal.record(1.0)
+    assert signal.value == 0.5
+    signal.record(1.0)
+    assert signal.value == 0.75
+    clock.advance(SIGNAL_HALF_LIFE)
+    assert abs(signal.value - 0.375) < 1e-9
+
+def test_controller_sheds_by_pressure():
+    controller = AdmissionController(
+        {
+            RouteClass.ORDER_WRITE: ClassPolicy(1, None),
+            RouteClass.READ: ClassPolicy(10, 2.0),
+            RouteClass.PUBLIC_READ: ClassPolicy(10, 1.0),
+        },
+        queue_size=0,
+        queue_timeout=0,
+        max_loop_lag=0.1,
+        max_pool_wait=0.2,
+    )
+    clock = FakeClock()
+    controller.pool_wait = DecayingSignal(alpha=1.0, clock=clock)
+
+    async def run():
+        assert await controller.admit(RouteClass.PUBLIC_READ)
+        controller.release(RouteClass.PUBLIC_READ)
+
+        controller.record_pool_wait(0.3)  # pressure 1.5
+        assert not await controller.admit(RouteClass.PUBLIC_READ)
+        assert await controller.admit(RouteClass.READ)
+        controller.release(RouteClass.READ)
+
+        controller.record_pool_wait(1.0)  # pressure 5
+        assert not await controller.admit(RouteClass.READ)
+        # Order writes are never shed, only bounded by their slots
+        assert await controller.admit(RouteClass.ORDER_WRITE)
+        assert not await controller.admit(RouteClass.ORDER_WRITE)
+        controller.release(RouteClass.ORDER_WRITE)
+
+        # Once the load is gone the signal decays and browsing is admitted again
+        clock.advance(SIGNAL_HALF_LIFE * 4)
+        assert await controller.admit(RouteClass.PUBLIC_READ)
+        controller.release(RouteClass.PUBLIC_READ)
+
+        stats = controller.snapshot()["classes"]
+        assert stats["public_read"]["shed"] == 1 and stats["read"]["shed"] == 1
+        assert stats["order_write"]["rejected"] == 1
+
+    asyncio.run(run())
+
+def main():
+    tests = [value for name, value in globals().items() if name.startswith("test_") and callable(value)]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e!r}")
+    print(f"\n{len(tests) - failed}/{len(tests)} passed")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Read cache tests: LRU eviction and expiry, invalidation epochs, invalidation racing a
+load, and invalidation notifications with and without a shared tier.
+Runs without a server or database: python test_cache.py (or pytest).
+"""
+
+import asyncio
+import json
+import sys
+
+from app.utils.cache import CACHE_INVALIDATION_CHANNEL, Cache, LRUTier, clear_local_caches, handle_invalidation
+from app.utils.shared_store import LocalSharedStore
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+class RecordingConnection:
+    """Stands in for the writer's connection; records the notifications it would send"""
+
+    def __init__(self):
+        self.notifications = []
+
+    async def execute(self, query, channel, payload):
+        self.notifications.append((channel, json.loads(payload)))
+
+class Loader:
+    """Counts loads; each returns the current value of `source`"""
+
+    def __init__(self, source):
+        self.source = source
+        self.calls = 0
+        self.release = None
+
+    async def __call__(self):
+        self.calls += 1
+        value = self.source
+        if self.release is not None:
+            await self.release.wait()
+        return value
+
+async def settle():
+    """Let started tasks run up to their next real wait"""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+def test_lru_evicts_least_recently_used():
+    tier = LRUTier(max_entries=2, ttl=60, clock=FakeClock())
+    tier.set("a", 1)
+    tier.set("b", 2)
+    assert tier.get("a") == (True, 1)  # a is now the most recently used
+    tier.set("c", 3)
+    assert tier.get("b") == (False, None)
+    assert tier.get("a") == (True, 1)
+    assert tier.get("c") == (True, 3)
+    assert tier.stats["evictions"] == 1
+
+def test_lru_expiry():
+    clock = FakeClock()
+    tier = LRUTier(max_entries=10, ttl=5, clock=clock)
+    tier.set("a", 1)
+    clock.advance(4.9)
+    assert tier.get("a") == (True, 1)
+    clock.advance(0.1)
+    assert tier.get("a") == (False, None)
+    assert len(tier) == 0 and tier.stats["expirations"] == 1
+    # Setting again restarts the clock
+    tier.set("a", 2)
+    clock.advance(4)
+    assert tier.get("a") == (True, 2)
+
+def test_cache_loads_once_and_skips_none():
+    cache = Cache("test_load_once")
+
+    async def run():
+        loader = Loader("value")
+        assert await cache.get_or_load("k", loader) == "value"
+        assert await cache.get_or_load("k", loader) == "value"
+        assert loader.calls == 1
+        missing = Loader(None)
+        assert await cache.get_or_load("missing", missing) is None
+        assert await cache.get_or_load("missing", missing) is None
+        assert missing.calls == 2
+
+    asyncio.run(run())
+
+def test_concurrent_misses_share_one_load():
+    cache = Cache("test_coalesce")
+
+    async def run():
+        loader = Loader("value")
+        loader.release = asyncio.Event()
+        readers = [asyncio.ensure_future(cache.get_or_load("k", loader)) for _ in range(5)]
+        await settle()
+        loader.release.set()
+        assert await asyncio.gather(*readers) == ["value"] * 5
+        assert loader.calls == 1
+
+    asyncio.run(run())
+
+def test_invalidation_during_load_is_not_cached():
+    """A value loaded before an invalidation must not be stored after it"""
+    cache = Cache("test_race")
+
+    async def run():
+        loader = Loader("old")
+        loader.release = asyncio.Event()
+        reader = asyncio.ensure_future(cache.get_or_load("k", loader))
+        await settle()
+        assert loader.calls == 1
+        # The write commits and its invalidation arrives while the read is still loading
+        loader.source = "new"
+        cache.drop_local("k")
+        loader.release.set()
+        assert await reader == "old"
+        assert cache.local.get("k") == (False, None)
+        loader.release = None
+        assert await cache.get_or_load("k", loader) == "new"
+        assert await cache.get_or_load("k", loader) == "new"
+        assert loader.calls == 2
+
+    asyncio.run(run())
+
+def test_reader_after_invalidation_does_not_join_older_load():
+    cache = Cache("test_race_join")
+
+    async def run():
+        loader = Loader("old")
+        loader.release = asyncio.Event()
+        first = asyncio.ensure_future(cache.get_or_load("k", loader))
+        await settle()
+        loader.source = "new"
+        cache.drop_local("k")
+        second = asyncio.ensure_future(cache.get_or_load("k", loader))
+        await settle()
+        loader.release.set()
+        assert await first == "old"
+        assert await second == "new"
+        assert loader.calls == 2
+        assert cache.local.get("k") == (True, "new")
+
+    asyncio.run(run())
+
+def test_invalidate_notifies_in_chunks():
+    cache = Cache("test_notify")
+    conn = RecordingConnection()
+
+    async def run():
+        await cache.get_or_load(1, Loader("a"))
+        await cache.invalidate(conn, *range(150))
+        assert cache.local.get(1) == (False, None)
+        assert [channel for channel, _ in conn.notifications] == [CACHE_INVALIDATION_CHANNEL] * 2
+        assert conn.notifications[0][1] == {"cache": "test_notify", "keys": list(range(100))}
+        assert conn.notifications[1][1]["keys"] == list(range(100, 150))
+
+    asyncio.run(run())
+
+def test_handle_invalidation():
+    cache = Cache("test_handle")
+
+    async def run():
+        await cache.get_or_load("a", Loader(1))
+        await cache.get_or_load("b", Loader(2))
+        handle_invalidation(json.dumps({"cache": "test_handle", "keys": ["a"]}))
+        assert cache.local.get("a") == (False, None)
+        assert cache.local.get("b") == (True, 2)
+        # Notifications for caches this worker does not have are ignored
+        handle_invalidation(json.dumps({"cache": "no_such_cache", "keys": ["b"]}))
+        assert cache.local.get("b") == (True, 2)
+        clear_local_caches()
+        assert len(cache.local) == 0
+
+    asyncio.run(run())
+
+def test_shared_tier():
+    store = LocalSharedStore(clock=FakeClock())
+    writer = Cache("test_shared", shared=store)
+    # Another worker's copy of the same cache (name registration is per process; keep the writer's)
+    reader = Cache("test_shared_reader", shared=store)
+    reader.name = "test_shared"
+
+    async def run():
+        assert await writer.get_or_load("k", Loader({"v": 1})) == {"v": 1}
+        loader = Loader({"v": 2})
+        assert await reader.get_or_load("k", loader) == {"v": 1}
+        assert loader.calls == 0 and reader.stats["shared_hits"] == 1
+        # The notification also clears the shared copy, in case a reader refilled it before commit
+        handle_invalidation(json.dumps({"cache": "test_shared", "keys": ["k"]}))
+        await settle()
+        assert await store.get("cache:test_shared:k") is None
+        assert await writer.get_or_load("k", loader) == {"v": 2}
+
+    asyncio.run(run())
+
+def main():
+    tests = [value for name, value in globals().items() if name.startswith("test_") and callable(value)]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e!r}")
+    print(f"\n{len(tests) - failed}/{len(tests)} passed")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
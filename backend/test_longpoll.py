@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Long-poll tests: event-id cursors across workers, parked polls, resyncs, retention and
+buffer limits in UpdateWaiters.
+Runs without a server or database: python test_longpoll.py (or pytest).
+"""
+
+import asyncio
+import json
+import sys
+
+from app.utils.longpoll import TooManyWaiters, UpdateWaiters
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+async def settle():
+    """Let started tasks run up to their next real wait"""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+def order(order_id):
+    return {"type": "order", "order_id": order_id}
+
+def make_waiters(**kwargs):
+    options = {"retention": 120, "max_events_per_user": 50, "max_waiters": 10}
+    options.update(kwargs)
+    return UpdateWaiters(**options)
+
+def test_first_poll_starts_from_now():
+    waiters = make_waiters()
+
+    async def run():
+        assert await waiters.wait(1, None, 0) == ([], False, None)
+        waiters.publish([1], order(1), 101)
+        # Without a cursor only what happens after the poll counts
+        assert await waiters.wait(1, None, 0) == ([], False, 101)
+        waiters.publish([1], order(2), 102)
+        waiters.publish([2], order(3), 103)
+        assert await waiters.wait(1, 101, 0) == ([order(2)], False, 103)
+        assert await waiters.wait(1, 103, 0) == ([], False, 103)
+
+    asyncio.run(run())
+
+def test_cursor_works_on_another_worker():
+    """Ids are not in commit order; both workers see the same delivery order"""
+    a, b = make_waiters(), make_waiters()
+
+    async def run():
+        for waiters in (a, b):
+            waiters.publish([1], order(1), 101)
+            waiters.publish([2], order(2), 103)
+        _, _, cursor = await a.wait(1, 101, 0)
+        assert cursor == 103
+        for waiters in (a, b):
+            waiters.publish([1], order(3), 102)
+        # 102 was delivered after 103, so it is new to a client holding cursor 103
+        assert await b.wait(1, cursor, 0) == ([order(3)], False, 102)
+
+    asyncio.run(run())
+
+def test_lagging_worker_waits_for_the_cursor():
+    a, b = make_waiters(), make_waiters()
+
+    async def run():
+        a.publish([1], order(1), 101)
+        a.publish([1], order(2), 102)
+        events, _, cursor = await a.wait(1, 101, 0)
+        assert events == [order(2)] and cursor == 102
+
+        async def deliver():
+            await asyncio.sleep(0.01)
+            b.publish([1], order(1), 101)
+            b.publish([1], order(2), 102)
+            b.publish([1], order(3), 104)
+
+        delivery = asyncio.ensure_future(deliver())
+        assert await b.wait(1, cursor, 1) == ([order(3)], False, 104)
+        await delivery
+
+    asyncio.run(run())
+
+def test_unknown_cursor_resyncs():
+    waiters = make_waiters()
+
+    async def run():
+        waiters.publish([1], order(1), 101)
+        assert await waiters.wait(1, 999, 0.01) == ([], True, 101)
+
+    asyncio.run(run())
+
+def test_parked_poll_is_woken():
+    waiters = make_waiters()
+
+    async def run():
+        waiters.publish([1], order(1), 101)
+        poll = asyncio.ensure_future(waiters.wait(1, 101, 5))
+        await settle()
+        waiters.publish([2], order(2), 102)
+        await settle()
+        assert not poll.done()
+        waiters.publish([1], order(3), 103)
+        assert await poll == ([order(3)], False, 103)
+        # A timed-out poll returns nothing, and the same cursor
+        assert await waiters.wait(1, 103, 0.01) == ([], False, 103)
+        assert waiters.stats["woken"] == 1 and waiters.stats["timeouts"] == 1
+
+    asyncio.run(run())
+
+def test_resync_reaches_parked_and_later_polls():
+    waiters = make_waiters()
+
+    async def run():
+        waiters.publish([1], order(1), 101)
+        poll = asyncio.ensure_future(waiters.wait(1, 101, 5))
+        await settle()
+        waiters.resync()
+        assert await poll == ([], True, None)
+        # Cursors from before the listener reconnected resync too
+        assert await waiters.wait(1, 101, 0) == ([], True, None)
+        # The client reloads and polls without a cursor
+        assert await waiters.wait(1, None, 0) == ([], False, None)
+        waiters.publish([1], order(2), 102)
+        assert await waiters.wait(1, None, 0) == ([], False, 102)
+
+    asyncio.run(run())
+
+def test_retention_expires_old_cursors():
+    clock = FakeClock()
+    waiters = make_waiters(retention=60, clock=clock)
+
+    async def run():
+        waiters.publish([1], order(1), 101)
+        clock.advance(30)
+        waiters.publish([2], order(2), 102)
+        assert await waiters.wait(1, 101, 0) == ([], False, 102)
+        clock.advance(45)
+        waiters.publish([2], order(3), 103)
+        # 101 is past retention; 102 is not
+        assert await waiters.wait(1, 101, 0.01) == ([], True, 103)
+        assert await waiters.wait(2, 102, 0) == ([order(3)], False, 103)
+        # On a quiet system the latest event is every client's cursor, so it is kept
+        clock.advance(3600)
+        waiters.publish([], order(4), 104)
+        assert await waiters.wait(2, 104, 0) == ([], False, 104)
+
+    asyncio.run(run())
+
+def test_full_buffer_resyncs():
+    waiters = make_waiters(max_events_per_user=3)
+
+    async def run():
+        waiters.publish([1], order(0), 100)
+        for event_id in range(101, 105):
+            waiters.publish([1], order(event_id), event_id)
+        # Four events after cursor 100 but only three kept: one was dropped
+        assert await waiters.wait(1, 100, 0) == ([], True, 104)
+        assert await waiters.wait(1, 101, 0) == ([order(102), order(103), order(104)], False, 104)
+
+    asyncio.run(run())
+
+def test_too_many_waiters():
+    waiters = make_waiters(max_waiters=1)
+
+    async def run():
+        parked = asyncio.ensure_future(waiters.wait(1, None, 5))
+        await settle()
+        try:
+            await waiters.wait(2, None, 5)
+            assert False, "expected TooManyWaiters"
+        except TooManyWaiters:
+            pass
+        # A poll with events waiting returns without parking
+        waiters.publish([1], order(1), 101)
+        assert (await parked)[0] == [order(1)]
+
+    asyncio.run(run())
+
+def test_notification_payloads():
+    waiters = make_waiters()
+
+    async def run():
+        waiters.handle_order_change(json.dumps({
+            "event_id": 7, "order_id": 5, "batch_order_id": None, "buyer_id": 1, "cook_id": 3,
+            "cook_user_id": 2, "status": "ready", "version": 4, "updated_at": "2026-10-19T10:00:00+00:00",
+        }))
+        waiters.handle_message(json.dumps({
+            "event_id": 8, "message_id": 9, "order_id": 5, "sender_id": 2, "user_ids": [1, 2],
+            "created_at": "2026-10-19T10:01:00+00:00",
+        }))
+        events, resync, cursor = await waiters.wait(1, 7, 0)
+        assert not resync and cursor == 8
+        assert events == [{
+            "type": "message", "message_id": 9, "order_id": 5, "sender_id": 2,
+            "created_at": "2026-10-19T10:01:00+00:00",
+        }]
+        # The cook's user gets order changes too
+        assert (await waiters.wait(2, None, 0))[2] == 8
+
+    asyncio.run(run())
+
+def main():
+    tests = [value for name, value in globals().items() if name.startswith("test_") and callable(value)]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e!r}")
+    print(f"\n{len(tests) - failed}/{len(tests)} passed")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Migration runner tests: statement splitting (quotes, dollar-quoted bodies, comments),
+header directives, and that every file in migrations/ loads.
+Runs without a server or database: python test_migrator.py (or pytest).
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+from app.migrator import MigrationError, discover, load_migration, split_statements
+
+FUNCTION = """
+CREATE OR REPLACE FUNCTION touch()
+    RETURNS TRIGGER AS $$
+BEGIN
+    -- a comment; inside the body
+    NEW.updated_at = NOW();
+    RETURN NEW;
+END;
+$$ language 'plpgsql'"""
+
+def test_split_plain_statements():
+    assert split_statements("SELECT 1; SELECT 2;\n\nSELECT 3") == ["SELECT 1", "SELECT 2", "SELECT 3"]
+    assert split_statements(" ;; \n") == []
+
+def test_split_keeps_dollar_quoted_bodies_whole():
+    assert split_statements(FUNCTION + ";\nSELECT 1;") == [FUNCTION.strip(), "SELECT 1"]
+    tagged = "DO $body$ BEGIN PERFORM 'x'; EXECUTE $$SELECT 1; SELECT 2$$; END $body$"
+    assert split_statements(tagged + "; SELECT 3") == [tagged, "SELECT 3"]
+
+def test_split_positional_parameters_are_not_dollar_quotes():
+    assert split_statements("SELECT $1, $2; SELECT 3") == ["SELECT $1, $2", "SELECT 3"]
+
+def test_split_dollar_in_identifiers_is_not_a_quote():
+    assert split_statements("SELECT a$b$c FROM t; SELECT 2") == ["SELECT a$b$c FROM t", "SELECT 2"]
+
+def test_split_ignores_semicolons_in_comments():
+    sql = """
+-- migrate: lock-timeout 5s
+-- Header comment; with a semicolon and a quote: don't
+CREATE TABLE a (id INT); /* block; comment */ CREATE TABLE b (id INT);
+-- trailing comment only
+"""
+    assert split_statements(sql) == [
+        "-- migrate: lock-timeout 5s\n-- Header comment; with a semicolon and a quote: don't\nCREATE TABLE a (id INT)",
+        "/* block; comment */ CREATE TABLE b (id INT)",
+    ]
+
+def test_split_nested_block_comments():
+    sql = "/* outer /* inner */ still a comment; */ SELECT 1; SELECT 2"
+    assert split_statements(sql) == ["/* outer /* inner */ still a comment; */ SELECT 1", "SELECT 2"]
+
+def test_split_quoted_strings_and_identifiers():
+    sql = """INSERT INTO "odd;name" VALUES ('a;b', 'it''s; fine'); SELECT ';'"""
+    assert split_statements(sql) == ["""INSERT INTO "odd;name" VALUES ('a;b', 'it''s; fine')""", "SELECT ';'"]
+
+def test_split_escape_strings():
+    sql = r"SELECT E'it\'s; escaped', e'\\'; SELECT 2"
+    assert split_statements(sql) == [r"SELECT E'it\'s; escaped', e'\\'", "SELECT 2"]
+
+def write_migration(directory: Path, name: str, sql: str) -> Path:
+    path = directory / name
+    path.write_text(sql, encoding="utf-8")
+    return path
+
+def test_directives():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_migration(
+            Path(tmp), "0001_indexes.sql",
+            "-- migrate: no-transaction\n-- migrate: lock-timeout 2s\nCREATE INDEX CONCURRENTLY IF NOT EXISTS i ON t(a);\n"
+        )
+        migration = load_migration(path)
+        assert not migration.transactional and migration.lock_timeout == "2s"
+        assert migration.statements == [
+            "-- migrate: no-transaction\n-- migrate: lock-timeout 2s\nCREATE INDEX CONCURRENTLY IF NOT EXISTS i ON t(a)"
+        ]
+
+def test_rejects_concurrently_in_a_transaction():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_migration(Path(tmp), "0002_index.sql", "CREATE INDEX CONCURRENTLY i ON t(a);\n")
+        try:
+            load_migration(path)
+            assert False, "expected MigrationError"
+        except MigrationError as e:
+            assert "no-transaction" in str(e)
+        # Mentioning it in a comment is fine
+        path = write_migration(Path(tmp), "0003_index.sql", "-- not CONCURRENTLY: the table is small\nCREATE INDEX i ON t(a);\n")
+        assert load_migration(path).transactional
+
+def test_rejects_bad_names_and_directives():
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, sql in (("1_short.sql", "SELECT 1;"), ("0004_unknown.sql", "-- migrate: fast\nSELECT 1;")):
+            try:
+                load_migration(write_migration(Path(tmp), name, sql))
+                assert False, f"expected MigrationError for {name}"
+            except MigrationError:
+                pass
+
+def test_repository_migrations_load():
+    migrations = discover()
+    assert [migration.version for migration in migrations] == sorted(migration.version for migration in migrations)
+    for migration in migrations:
+        assert migration.statements, migration.label
+        for statement in migration.statements:
+            # A split inside a function body leaves an unbalanced $$
+            assert statement.count("$$") % 2 == 0, f"{migration.label}: {statement[:60]}"
+
+def main():
+    tests = [value for name, value in globals().items() if name.startswith("test_") and callable(value)]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e!r}")
+    print(f"\n{len(tests) - failed}/{len(tests)} passed")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
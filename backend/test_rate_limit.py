@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Rate limiting tests: token bucket refill and burst, the in-process and shared-store
+backends, refunds when a later limit rejects, and the client address behind proxies.
+Runs without a server or database: python test_rate_limit.py (or pytest).
+"""
+
+import asyncio
+import sys
+
+from app.config import settings
+from app.utils.auth import create_access_token
+from app.utils.rate_limit import InMemoryBackend, Limit, RateLimitMiddleware, SharedBackend, client_ip
+from app.utils.shared_store import LocalSharedStore, bucket_ttl, refill_bucket
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+# 60/minute = 1 token per second, bursts of 5
+LIMIT = Limit("test", "user", 60, 5)
+
+def test_refill_bucket():
+    """Refill is proportional to elapsed time and capped at capacity"""
+    assert refill_bucket(5, 0, 0, 1.0, 5, 1) == (True, 4, 0.0)
+    # Empty: the wait is the missing tokens over the rate
+    assert refill_bucket(0, 0, 0, 2.0, 5, 1) == (False, 0, 0.5)
+    # Half a second at 1/s refills half a token
+    assert refill_bucket(0.5, 0, 0.5, 1.0, 5, 1) == (True, 0.0, 0.0)
+    # A long idle period does not bank more than a burst
+    assert refill_bucket(0, 0, 3600, 1.0, 5, 1) == (True, 4, 0.0)
+    # A clock going backwards does not drain the bucket
+    assert refill_bucket(2, 10, 5, 1.0, 5, 1) == (True, 1, 0.0)
+
+def test_refill_bucket_refund():
+    """A negative cost gives tokens back, never beyond the burst"""
+    assert refill_bucket(3, 0, 0, 1.0, 5, -1) == (True, 4, 0.0)
+    assert refill_bucket(5, 0, 0, 1.0, 5, -1) == (True, 5, 0.0)
+    assert refill_bucket(4.5, 0, 1, 1.0, 5, -1) == (True, 5, 0.0)
+
+def test_in_memory_burst_and_refill():
+    clock = FakeClock()
+    backend = InMemoryBackend(clock=clock)
+
+    async def run():
+        results = [await backend.take("k", LIMIT) for _ in range(6)]
+        assert [allowed for allowed, _ in results] == [True] * 5 + [False]
+        assert results[-1][1] == 1.0
+        clock.advance(1.0)
+        assert (await backend.take("k", LIMIT))[0]
+        assert not (await backend.take("k", LIMIT))[0]
+        # Other keys have their own bucket
+        assert (await backend.take("other", LIMIT))[0]
+
+    asyncio.run(run())
+
+def test_in_memory_evicts_least_recently_used():
+    clock = FakeClock()
+    backend = InMemoryBackend(max_keys=2, clock=clock)
+
+    async def run():
+        for _ in range(5):
+            await backend.take("a", LIMIT)
+        await backend.take("b", LIMIT)
+        await backend.take("a", LIMIT)  # a is now the most recently used
+        await backend.take("c", LIMIT)
+        assert list(backend._buckets) == ["a", "c"]
+        # A forgotten bucket starts full again
+        await backend.take("b", LIMIT)
+        assert backend._buckets["b"][0] == LIMIT.burst - 1
+
+    asyncio.run(run())
+
+def test_local_shared_store_take_tokens():
+    clock = FakeClock()
+    store = LocalSharedStore(clock=clock)
+
+    async def run():
+        results = [await store.take_tokens("k", 1.0, 5) for _ in range(6)]
+        assert [allowed for allowed, _ in results] == [True] * 5 + [False]
+        assert results[-1][1] == 1.0
+        clock.advance(2.0)
+        assert [(await store.take_tokens("k", 1.0, 5))[0] for _ in range(3)] == [True, True, False]
+        # Untouched past its TTL the bucket is dropped, and starts full
+        clock.advance(bucket_ttl(1.0, 5) + 1)
+        assert [(await store.take_tokens("k", 1.0, 5))[0] for _ in range(6)] == [True] * 5 + [False]
+
+    asyncio.run(run())
+
+def test_shared_backend_refund():
+    clock = FakeClock()
+    backend = SharedBackend(LocalSharedStore(clock=clock))
+
+    async def run():
+        for _ in range(5):
+            await backend.take("k", LIMIT)
+        assert not (await backend.take("k", LIMIT))[0]
+        await backend.refund("k", LIMIT)
+        assert (await backend.take("k", LIMIT))[0]
+
+    asyncio.run(run())
+
+def test_rejection_refunds_earlier_limits():
+    """A request rejected by its IP limit does not use up the user's bucket"""
+    clock = FakeClock()
+    backend = InMemoryBackend(clock=clock)
+    user_limit = Limit("user", "user", 60, 5)
+    ip_limit = Limit("ip", "ip", 60, 1)
+    middleware = RateLimitMiddleware(app=None, backend=backend)
+    token = create_access_token({"sub": "buyer@example.com"})
+    scope = {"type": "http", "headers": [(b"authorization", f"Bearer {token}".encode())], "client": ("10.0.0.1", 1234)}
+
+    async def run():
+        assert await middleware.check(scope, [user_limit, ip_limit]) is None
+        assert await middleware.check(scope, [user_limit, ip_limit]) == 1.0
+        assert await middleware.check(scope, [user_limit, ip_limit]) is not None
+        # One request got through; the two rejected ones were refunded
+        assert backend._buckets["rl:user:user:buyer@example.com"][0] == user_limit.burst - 1
+
+    asyncio.run(run())
+
+def test_client_ip_behind_proxies():
+    def scope(*forwarded):
+        return {"headers": [(b"x-forwarded-for", value.encode()) for value in forwarded], "client": ("10.0.0.9", 1)}
+
+    trust, hops = settings.trust_proxy_headers, settings.trusted_proxy_hops
+    try:
+        settings.trust_proxy_headers = False
+        assert client_ip(scope("1.2.3.4")) == "10.0.0.9"
+
+        settings.trust_proxy_headers = True
+        settings.trusted_proxy_hops = 1
+        # The client wrote the left entries; the proxy appended the right one
+        assert client_ip(scope("6.6.6.6, 1.2.3.4")) == "1.2.3.4"
+        assert client_ip(scope("6.6.6.6", "1.2.3.4")) == "1.2.3.4"
+        assert client_ip(scope()) == "10.0.0.9"
+
+        settings.trusted_proxy_hops = 2
+        assert client_ip(scope("6.6.6.6, 1.2.3.4, 10.0.0.2")) == "1.2.3.4"
+        # Fewer entries than hops: the leftmost is the best we have
+        assert client_ip(scope("1.2.3.4")) == "1.2.3.4"
+    finally:
+        settings.trust_proxy_headers, settings.trusted_proxy_hops = trust, hops
+
+def main():
+    tests = [value for name, value in globals().items() if name.startswith("test_") and callable(value)]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e!r}")
+    print(f"\n{len(tests) - failed}/{len(tests)} passed")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
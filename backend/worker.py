@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Background job worker for Adresur
+
+Runs app.jobs.JobWorker outside the API process. Start as many as needed; they share
+the jobs table safely. SIGTERM/SIGINT stop claiming new jobs and let running ones finish.
+
+Usage:
+    python worker.py
+    python worker.py --concurrency 8 --kinds orders.placed jobs.purge_finished
+"""
+
+import argparse
+import asyncio
+import logging
+import signal
+import sys
+
+from app.config import settings
+from app.database import init_db_pool, close_db_pool, get_db_pool
+from app.jobs import JOB_HANDLERS, JobRuntime, JobWorker
+from app import tasks  # noqa: F401  (registers job handlers)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("worker")
+
+async def run_worker(args: argparse.Namespace) -> bool:
+    await init_db_pool()
+    pool = get_db_pool()
+    if pool is None:
+        print("❌ Could not connect to the database")
+        return False
+
+    runtime = JobRuntime(JobWorker(
+        pool,
+        concurrency=args.concurrency,
+        batch_size=args.batch_size,
+        kinds=args.kinds
+    )).start()
+    print(f"👷 Worker running with handlers: {', '.join(sorted(JOB_HANDLERS))}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    await stop.wait()
+    print("⏹️  Stopping worker, waiting for running jobs...")
+    await runtime.stop(timeout=settings.server_graceful_timeout)
+    await close_db_pool()
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Run Adresur background jobs")
+    parser.add_argument("--concurrency", type=int, default=settings.jobs_concurrency)
+    parser.add_argument("--batch-size", type=int, default=settings.jobs_batch_size)
+    parser.add_argument("--kinds", nargs="*", default=None, help="Only run these job kinds")
+    args = parser.parse_args()
+
+    success = asyncio.run(run_worker(args))
+    sys.exit(0 if success else 1)
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 'use client';
 
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { apiClient } from '@/lib/api';
 import { CookProfile, MenuItem } from '@/types/api';
 
@@ -20,6 +20,9 @@ export default function MenusTab() {
   const [showCart, setShowCart] = useState(false);
   const [showOrderDialog, setShowOrderDialog] = useState(false);
   const [selectedMenuItem, setSelectedMenuItem] = useState<MenuItem | null>(null);
+  // Placing the same cart again after a failure reuses its Idempotency-Key, so an order
+  // that did reach the server is not placed twice
+  const pendingCheckout = useRef<{ body: string; key: string } | null>(null);
 
   useEffect(() => {
     loadCooks();
@@ -106,13 +109,19 @@ export default function MenusTab() {
       special_instructions: item.specialInstructions || undefined
     }));
 
+    const body = JSON.stringify(orderItems);
+    if (pendingCheckout.current?.body !== body) {
+      pendingCheckout.current = { body, key: crypto.randomUUID() };
+    }
+
     try {
-      const response = await apiClient.createBatchOrder(orderItems);
+      const response = await apiClient.createBatchOrder(orderItems, pendingCheckout.current.key);
       
       if (response.error) {
         alert(`Failed to place order: ${response.error}`);
       } else {
         alert('🎉 Order placed successfully!');
+        pendingCheckout.current = null;
         setCart([]);
         setShowCart(false);
       }
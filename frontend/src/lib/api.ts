@@ -1,4 +1,4 @@
-import { LoginRequest, LoginResponse, User, CookProfile, MenuItem, Order, Message, ApiResponse } from '@/types/api';
+import { LoginRequest, LoginResponse, User, CookProfile, MenuItem, Order, BatchOrder, PrepSheet, Message, Conversation, UpdatePoll, SyncChanges, ApiResponse, BatchSubRequest, BatchSubResponse } from '@/types/api';
 
 const API_BASE_URL = 'http://localhost:8000';
 
@@ -66,6 +66,7 @@ class ApiClient {
       return {
         data,
         status: response.status,
+        nextCursor: response.headers.get('X-Next-Cursor') ?? undefined,
       };
     } catch (error) {
       return {
@@ -157,35 +158,63 @@ class ApiClient {
   }
 
   // Orders
-  async getOrders(asCook: boolean = false): Promise<ApiResponse<any[]>> {
-    return this.request<any[]>(`/orders/?as_cook=${asCook}`);
+  async getOrders(asCook: boolean = false, includeArchived: boolean = false): Promise<ApiResponse<any[]>> {
+    return this.request<any[]>(`/orders/?as_cook=${asCook}&include_archived=${includeArchived}`);
   }
 
   async getOrder(id: number): Promise<ApiResponse<Order>> {
     return this.request<Order>(`/orders/${id}`);
   }
 
-  async createOrder(order: { menu_item_id: number; quantity?: number; special_instructions?: string }): Promise<ApiResponse<Order>> {
+  // date is YYYY-MM-DD (UTC); defaults to today on the server
+  async getPrepSheet(date?: string): Promise<ApiResponse<PrepSheet>> {
+    return this.request<PrepSheet>(`/orders/prep-sheet${date ? `?date=${date}` : ''}`);
+  }
+
+  // Pass the previous response's nextCursor to get the following page
+  async getBatchOrders(cursor?: string, limit: number = 20): Promise<ApiResponse<BatchOrder[]>> {
+    const params = new URLSearchParams({ limit: String(limit) });
+    if (cursor) params.set('cursor', cursor);
+    return this.request<BatchOrder[]>(`/orders/batches?${params}`);
+  }
+
+  async getBatchOrder(id: number): Promise<ApiResponse<BatchOrder>> {
+    return this.request<BatchOrder>(`/orders/batches/${id}`);
+  }
+
+  // Pass the same idempotencyKey when retrying so the server places the order only once
+  async createOrder(order: { menu_item_id: number; quantity?: number; special_instructions?: string }, idempotencyKey?: string): Promise<ApiResponse<Order>> {
     return this.request<Order>('/orders/', {
       method: 'POST',
       body: JSON.stringify(order),
+      headers: idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : {},
     });
   }
 
-  async createBatchOrder(items: { menu_item_id: number; quantity?: number; special_instructions?: string }[]): Promise<ApiResponse<Order[]>> {
+  async createBatchOrder(items: { menu_item_id: number; quantity?: number; special_instructions?: string }[], idempotencyKey?: string): Promise<ApiResponse<Order[]>> {
     return this.request<Order[]>('/orders/batch', {
       method: 'POST',
       body: JSON.stringify({ items }),
+      headers: idempotencyKey ? { 'Idempotency-Key': idempotencyKey } : {},
     });
   }
 
-  async updateOrder(id: number, order: { status?: string; special_instructions?: string }): Promise<ApiResponse<Order>> {
+  // Pass the version last read to get a 409 instead of overwriting someone else's change
+  async updateOrder(id: number, order: { status?: string; special_instructions?: string; version?: number }): Promise<ApiResponse<Order>> {
     return this.request<Order>(`/orders/${id}`, {
       method: 'PUT',
       body: JSON.stringify(order),
     });
   }
 
+  // Returns only the orders that were moved; others are not the cook's or cannot make the transition
+  async updateOrderStatuses(status: Order['status'], target: { order_ids: number[] } | { batch_order_id: number }): Promise<ApiResponse<Order[]>> {
+    return this.request<Order[]>('/orders/status', {
+      method: 'PATCH',
+      body: JSON.stringify({ status, ...target }),
+    });
+  }
+
   async deleteOrder(id: number): Promise<ApiResponse<void>> {
     return this.request<void>(`/orders/${id}`, {
       method: 'DELETE',
@@ -193,8 +222,27 @@ class ApiClient {
   }
 
   // Messages
-  async getMessages(orderId: number): Promise<ApiResponse<Message[]>> {
-    return this.request<Message[]>(`/messages/order/${orderId}`);
+  // Latest page by default; pass the newest id you have as `after` to fetch only newer messages
+  async getMessages(orderId: number, options: { after?: number; before?: number; limit?: number } = {}): Promise<ApiResponse<Message[]>> {
+    const params = new URLSearchParams();
+    if (options.after !== undefined) params.set('after', String(options.after));
+    if (options.before !== undefined) params.set('before', String(options.before));
+    if (options.limit !== undefined) params.set('limit', String(options.limit));
+    const query = params.toString();
+    return this.request<Message[]>(`/messages/order/${orderId}${query ? `?${query}` : ''}`);
+  }
+
+  async getInbox(cursor?: string, limit: number = 20): Promise<ApiResponse<Conversation[]>> {
+    const params = new URLSearchParams({ limit: String(limit) });
+    if (cursor) params.set('cursor', cursor);
+    return this.request<Conversation[]>(`/messages/inbox?${params}`);
+  }
+
+  async markConversationRead(orderId: number, lastReadMessageId?: number): Promise<ApiResponse<Conversation>> {
+    return this.request<Conversation>(`/messages/order/${orderId}/read`, {
+      method: 'POST',
+      body: JSON.stringify({ last_read_message_id: lastReadMessageId ?? null }),
+    });
   }
 
   async createMessage(message: { order_id: number; content: string }): Promise<ApiResponse<Message>> {
@@ -204,6 +252,29 @@ class ApiClient {
     });
   }
 
+  // Long-poll: resolves when something changes for the user, or after `timeout` seconds with no events
+  async pollUpdates(since?: string, timeout?: number): Promise<ApiResponse<UpdatePoll>> {
+    const params = new URLSearchParams();
+    if (since) params.set('since', since);
+    if (timeout !== undefined) params.set('timeout', String(timeout));
+    const query = params.toString();
+    return this.request<UpdatePoll>(`/updates/poll${query ? `?${query}` : ''}`);
+  }
+
+  // Without `since`: just a token to start from. With it: what changed since that token.
+  async sync(since?: string): Promise<ApiResponse<SyncChanges>> {
+    return this.request<SyncChanges>(since ? `/sync?since=${encodeURIComponent(since)}` : '/sync');
+  }
+
+  // Several GET requests in one round trip (e.g. everything a dashboard needs on load)
+  async batch(requests: BatchSubRequest[]): Promise<ApiResponse<BatchSubResponse[]>> {
+    const response = await this.request<{ responses: BatchSubResponse[] }>('/batch', {
+      method: 'POST',
+      body: JSON.stringify({ requests }),
+    });
+    return { data: response.data?.responses, error: response.error, status: response.status };
+  }
+
   // Health check
   async healthCheck(): Promise<ApiResponse<{ status: string }>> {
     return this.request<{ status: string }>('/health');
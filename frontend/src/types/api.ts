@@ -36,6 +36,7 @@ export interface MenuItem {
   price: number;
   photo_url?: string;
   is_available: boolean;
+  daily_capacity?: number | null;
   created_at: string;
   updated_at: string;
 }
@@ -51,6 +52,33 @@ export interface Order {
   special_instructions?: string;
   created_at: string;
   updated_at: string;
+  archived?: boolean;
+  version?: number;
+}
+
+export interface BatchOrder {
+  id: number;
+  buyer_id: number;
+  total_price: number;
+  status: Order['status'];
+  created_at: string;
+  updated_at: string;
+  orders: (Order & { batch_order_id: number; menuItem: Pick<MenuItem, 'id' | 'title' | 'description' | 'price' | 'photo_url'> })[];
+}
+
+type OpenOrderStatus = 'pending' | 'preparing' | 'ready';
+
+export interface PrepSheet {
+  date: string;
+  cook_id: number;
+  totals: Record<OpenOrderStatus, number>;
+  items: {
+    menu_item_id: number;
+    title: string;
+    total_quantity: number;
+    by_status: Record<OpenOrderStatus, number>;
+    special_instructions: { text: string; quantity: number; orders: number }[];
+  }[];
 }
 
 export interface Message {
@@ -61,8 +89,51 @@ export interface Message {
   created_at: string;
 }
 
+export interface Conversation {
+  order_id: number;
+  last_message_id: number;
+  last_sender_id?: number | null;
+  last_message_preview: string;
+  last_activity_at: string;
+  last_read_message_id: number;
+  unread_count: number;
+}
+
+export interface BatchSubRequest {
+  id?: string;
+  path: string;
+}
+
+export interface BatchSubResponse {
+  id: string | null;
+  status: number;
+  headers: Record<string, string>;
+  body: any;
+}
+
 export interface ApiResponse<T> {
   data?: T;
   error?: string;
   status: number;
-} 
\ No newline at end of file
+  nextCursor?: string;
+} 
+
+export type UpdateEvent =
+  | { type: 'order'; order_id: number; batch_order_id?: number | null; status: Order['status']; version: number; updated_at: string }
+  | { type: 'message'; message_id: number; order_id: number; sender_id: number; created_at: string };
+
+export interface UpdatePoll {
+  events: UpdateEvent[];
+  resync: boolean;
+  cursor: string;
+}
+
+export interface SyncChanges {
+  orders: Order[];
+  batch_orders: BatchOrder[];
+  menu_items: MenuItem[];
+  messages: Message[];
+  deleted: Partial<Record<'order' | 'batch_order' | 'menu_item' | 'message', number[]>>;
+  resync: boolean;
+  token: string;
+}